@@ -1,5 +1,9 @@
-from .graph import respond
-
-__all__ = ["respond"]
+__all__ = ["respond", "respond_stream"]
 
 
+def __getattr__(name):
+    # 按需导入图：单独使用 date_parser 等模块（如单元测试）时不加载 LLM、数据库等依赖
+    if name in __all__:
+        from . import graph
+        return getattr(graph, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import calendar
+import re
+from datetime import date, timedelta
+from typing import Callable, List, Optional, Tuple
+
+DateRange = Tuple[date, date]
+
+_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_WEEKDAYS = {"一": 0, "二": 1, "三": 2, "四": 3, "五": 4, "六": 5, "日": 6, "天": 6, "末": 5}
+
+_NUM = r"[0-9零〇一二两三四五六七八九十]+"
+# 月份名：不含"两"（"两月"是时长而不是二月）
+_MONTH = r"(?:1[0-2]|0?[1-9]|十[一二]?|[一二三四五六七八九])"
+_WEEK = r"(?:周|星期|礼拜)"
+_DAY_OF_WEEK = r"[一二三四五六日天末]"
+_WEEKS_AGO = {"上上": 2, "上上个": 2, "上": 1, "上个": 1, "上一": 1, "这": 0, "这个": 0, "本": 0}
+
+
+def parse_number(text: str) -> Optional[int]:
+    """解析阿拉伯数字或不超过九十九的中文数字（十一、二十、三十一……）"""
+    if text.isdigit():
+        return int(text)
+    if "十" in text:
+        tens, _, ones = text.partition("十")
+        value = (_DIGITS.get(tens, 0) if tens else 1) * 10
+        if ones:
+            if ones not in _DIGITS:
+                return None
+            value += _DIGITS[ones]
+        return value
+    if len(text) == 1 and text in _DIGITS:
+        return _DIGITS[text]
+    return None
+
+
+def _month_range(year: int, month: int) -> DateRange:
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _shift_month(d: date, months: int) -> Tuple[int, int]:
+    index = d.year * 12 + d.month - 1 + months
+    return index // 12, index % 12 + 1
+
+
+def _resolve_year(today: date, month: int, day: int = 1) -> int:
+    """未写年份的月/日：还没到的日期指去年"""
+    return today.year if (month, day) <= (today.month, today.day) else today.year - 1
+
+
+def _weekday_in_week(today: date, weeks_ago: int, weekday: int) -> date:
+    monday = today - timedelta(days=today.weekday() + 7 * weeks_ago)
+    return monday + timedelta(days=weekday)
+
+
+def _weekday_range(today: date, weeks_ago: int, token: str) -> DateRange:
+    day = _weekday_in_week(today, weeks_ago, _WEEKDAYS[token])
+    if token == "末":
+        return day, day + timedelta(days=1)
+    return day, day
+
+
+def _recent_weekday(today: date, token: str) -> DateRange:
+    """不带"上/这"的周X：本周还没到就指上周"""
+    start, end = _weekday_range(today, 0, token)
+    if start > today:
+        return _weekday_range(today, 1, token)
+    return start, end
+
+
+def _weekday_span(today: date, m: re.Match) -> DateRange:
+    """周X到周Y：后半段没有写"上/这"时与前半段同一周"""
+    which = m.group("which")
+    if which is None:
+        # 与单独的"周X"一致：本周还没到就指上周
+        weeks_ago = 1 if _weekday_in_week(today, 0, _WEEKDAYS[m.group("a")]) > today else 0
+    else:
+        weeks_ago = _WEEKS_AGO[which]
+    return _weekday_range(today, weeks_ago, m.group("a"))[0], _weekday_range(today, weeks_ago, m.group("b"))[1]
+
+
+def _explicit_date(today: date, m: re.Match) -> Optional[DateRange]:
+    year = parse_number(m.group("year")) if m.group("year") else None
+    month = parse_number(m.group("month"))
+    day = parse_number(m.group("day")) if m.group("day") else None
+    if not month or not 1 <= month <= 12:
+        return None
+    if year is None:
+        year = _resolve_year(today, month, day or 1)
+    if day is None:
+        return _month_range(year, month)
+    try:
+        d = date(year, month, day)
+    except ValueError:
+        return None
+    return d, d
+
+
+def _relative_year(today: date, m: re.Match) -> Optional[DateRange]:
+    year = today.year - {"今": 0, "去": 1, "前": 2}[m.group("which")]
+    month = parse_number(m.group("month")) if m.group("month") else None
+    if month is None:
+        return date(year, 1, 1), date(year, 12, 31)
+    if not 1 <= month <= 12:
+        return None
+    return _month_range(year, month)
+
+
+def _last_n(today: date, m: re.Match) -> Optional[DateRange]:
+    n = parse_number(m.group("n"))
+    if not n:
+        return None
+    unit = m.group("unit")
+    days = n * {"天": 1, "日": 1, "周": 7, "星期": 7, "个星期": 7, "个月": 30, "月": 30, "年": 365}[unit]
+    return today - timedelta(days=days), today
+
+
+def _n_ago(today: date, m: re.Match) -> Optional[DateRange]:
+    n = parse_number(m.group("n"))
+    if not n:
+        return None
+    d = today - timedelta(days=n)
+    return d, d
+
+
+# 按从具体到宽泛的顺序匹配；先匹配的规则占用的文本不再参与后面的规则
+_RULES: List[Tuple[re.Pattern, Callable[[date, re.Match], Optional[DateRange]]]] = [
+    (
+        re.compile(
+            rf"(?P<which>上上个?|上个?|上一|这个?|本)?{_WEEK}(?P<a>{_DAY_OF_WEEK})"
+            rf"(?:到|至|~|-)(?:{_WEEK})?(?P<b>{_DAY_OF_WEEK})"
+        ),
+        _weekday_span,
+    ),
+    (re.compile(rf"(?P<which>[今去前])年的?(?:(?P<month>{_MONTH})月)?"), _relative_year),
+    # 前面是"近/过去/每"或数字时是时长/频率（最近两月、每月），后面跟"X次"时是频率（一月一次）
+    (
+        re.compile(
+            rf"(?<![近去每前0-9零〇一二两三四五六七八九十])(?:(?P<year>\d{{4}})年)?(?P<month>{_MONTH})月"
+            rf"(?!{_NUM}?次)(?:(?P<day>{_NUM})[日号])?"
+        ),
+        _explicit_date,
+    ),
+    (re.compile(rf"上上{_WEEK}(?P<d>[一二三四五六日天末])"), lambda t, m: _weekday_range(t, 2, m.group("d"))),
+    (re.compile(rf"(?:上个?|上一){_WEEK}(?P<d>[一二三四五六日天末])"), lambda t, m: _weekday_range(t, 1, m.group("d"))),
+    (re.compile(rf"(?:这个?|本){_WEEK}(?P<d>[一二三四五六日天末])"), lambda t, m: _weekday_range(t, 0, m.group("d"))),
+    (re.compile(rf"(?<![上这本个每]){_WEEK}(?P<d>[一二三四五六日天末])"), lambda t, m: _recent_weekday(t, m.group("d"))),
+    (re.compile(rf"(?:最近|过去|近|前)(?P<n>{_NUM})(?P<unit>个星期|星期|个月|月|天|日|周|年)"), _last_n),
+    (re.compile(rf"(?P<n>{_NUM})天(?:以)?前"), _n_ago),
+    (re.compile(r"大前天"), lambda t, m: (t - timedelta(days=3), t - timedelta(days=3))),
+    (re.compile(r"前天"), lambda t, m: (t - timedelta(days=2), t - timedelta(days=2))),
+    (re.compile(r"昨[天日晚]"), lambda t, m: (t - timedelta(days=1), t - timedelta(days=1))),
+    (re.compile(r"今[天日早晚]"), lambda t, m: (t, t)),
+    (re.compile(rf"上上个?{_WEEK}"), lambda t, m: (_weekday_in_week(t, 2, 0), _weekday_in_week(t, 2, 6))),
+    (re.compile(rf"(?:上个?|上一){_WEEK}"), lambda t, m: (_weekday_in_week(t, 1, 0), _weekday_in_week(t, 1, 6))),
+    (re.compile(rf"(?:这个?|本){_WEEK}"), lambda t, m: (_weekday_in_week(t, 0, 0), t)),
+    (re.compile(r"上上个月"), lambda t, m: _month_range(*_shift_month(t, -2))),
+    (re.compile(r"上个?月"), lambda t, m: _month_range(*_shift_month(t, -1))),
+    (re.compile(r"(?:这个|本)月"), lambda t, m: (t.replace(day=1), t)),
+    (re.compile(r"(?:最近|过去|近)(?:一|1)?(?:周|星期)"), lambda t, m: (t - timedelta(days=7), t)),
+    (re.compile(r"(?:最近|过去|近)半个?月"), lambda t, m: (t - timedelta(days=15), t)),
+    (re.compile(r"(?:最近|过去|近)(?:一|1)?个月"), lambda t, m: (t - timedelta(days=30), t)),
+    (re.compile(r"(?:最近|过去|近)半年"), lambda t, m: (t - timedelta(days=182), t)),
+]
+
+
+def parse_date_range(query: str, today: Optional[date] = None) -> Optional[Tuple[str, str]]:
+    """从问题中解析中文日期表达，返回 (start_date, end_date)；无法识别时返回 None
+
+    支持：今天/昨天/前天、N天前、前N天/最近N周/近N个月、本周/上周/上周X/周X、周X到周Y、
+    本月/上个月、X月/X月X日/YYYY年X月X日、今年/去年/去年X月、最近一周/一个月/半年。
+    问题中有多个日期表达（"这个月和上个月比"、"从上周到今天"）时返回覆盖全部表达的时间范围。
+    结束日期不超过今天（不会有未来的记录）。
+    """
+    today = today or date.today()
+    text = (query or "").replace(" ", "")
+    consumed: List[Tuple[int, int]] = []
+    ranges: List[DateRange] = []
+    for pattern, handler in _RULES:
+        for m in pattern.finditer(text):
+            if any(m.start() < end and start < m.end() for start, end in consumed):
+                continue
+            parsed = handler(today, m)
+            if not parsed:
+                continue
+            start, end = parsed[0], min(parsed[1], today)
+            if start > end:
+                continue
+            consumed.append(m.span())
+            ranges.append((start, end))
+    if not ranges:
+        return None
+    start = min(r[0] for r in ranges)
+    end = max(r[1] for r in ranges)
+    return start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
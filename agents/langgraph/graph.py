@@ -1,10 +1,16 @@
 
-from typing import Any, Dict
-from langgraph.graph import StateGraph, END
+import asyncio
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+from langgraph.graph import StateGraph, START, END
 from sqlalchemy.ext.asyncio import AsyncSession
+from agents.langgraph.date_parser import parse_date_range
+from agents.langgraph.intent import rule_intent
 from agents.langgraph.state import AgentState
 from agents.langgraph.nodes import (
     classify_intent_node,
+    speculate_node,
     time_range_node,
     prefilter_node,
     need_rag,
@@ -13,23 +19,37 @@ from agents.langgraph.nodes import (
     generate_no_rag_node,
     generate_with_history_node,
 )
-from functools import partial
+from config import settings
+from service.answer_cache import answer_cache
+from service.embedding_batcher import generate_vectors_async
+from utils.logger import logger
+from utils.tracing import LLMTracingCallback, Trace, start_trace, trace_span, traced_node
 
-def build_graph(session: AsyncSession):
+
+def build_graph():
+    """构建并编译 agent 图；图与请求无关，数据库会话在调用时通过 config 传入"""
     g = StateGraph(AgentState)
 
     # 核心节点
-    g.add_node("classify", classify_intent_node)
-    g.add_node("time_range", time_range_node)
-    g.add_node("prefilter", partial(prefilter_node, session=session))
-    g.add_node("retrieve", partial(retrieve_node, session=session))
-    g.add_node("embed", embed_node)
-    g.add_node("generate_no_rag", generate_no_rag_node)
-    g.add_node("generate_with_history", generate_with_history_node)
+    # 每个节点包一层追踪：记录墙钟时间、数据库时间与 LLM 调用
+    nodes = {
+        "classify": classify_intent_node,
+        "speculate": speculate_node,
+        "time_range": time_range_node,
+        "prefilter": prefilter_node,
+        "retrieve": retrieve_node,
+        "embed": embed_node,
+        "generate_no_rag": generate_no_rag_node,
+        "generate_with_history": generate_with_history_node,
+    }
+    for name, fn in nodes.items():
+        g.add_node(name, traced_node(name, fn))
 
     # 主干流转
-    g.set_entry_point("classify")
-    g.add_edge("classify", "time_range")
+    # 查询向量与意图无关：与意图分类并行推测计算，两者都完成后再确定时间范围
+    g.add_edge(START, "classify")
+    g.add_edge(START, "speculate")
+    g.add_edge(["classify", "speculate"], "time_range")
     g.add_edge("time_range", "prefilter")
 
     # 分支：是否需要检索
@@ -53,10 +73,248 @@ def build_graph(session: AsyncSession):
     return g.compile()
 
 
-async def respond(user_id: int, user_query: str,session: AsyncSession) -> Dict[str, Any]:
-    app = build_graph(session)
+# 启动时编译一次，所有请求共用
+agent_graph = build_graph()
+
+
+def run_config(session: AsyncSession, callbacks: Optional[List[Any]] = None) -> Dict[str, Any]:
+    config: Dict[str, Any] = {"configurable": {"session": session}}
+    if callbacks:
+        config["callbacks"] = callbacks
+    return config
+
+
+def _answer_scope(user_query: str) -> Tuple[Any, ...]:
+    """回答缓存的精确匹配部分：问题解析出的日期范围与关键词意图"""
+    rule = rule_intent(user_query)
+    return parse_date_range(user_query), rule["label"] if rule else None
+
+
+async def _lookup_answer(user_id: int, user_query: str) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+    """查询回答缓存，返回 (缓存的回答, 查询向量)
+
+    查询向量经 embedding 缓存与进行中请求合并，与图里推测预取节点的 embedding 只计算一次。
+    缓存只是加速手段，查询失败时按未命中处理。
+    """
+    with trace_span("answer_cache", kind="cache") as span:
+        try:
+            query_vector = await generate_vectors_async(user_query)
+        except Exception as e:
+            logger.warning(f"回答缓存查询失败: {e}")
+            return None, None
+        cached = answer_cache.lookup(user_id, query_vector, _answer_scope(user_query))
+        span.attrs["hit"] = cached is not None
+    return cached, query_vector
+
+
+def _start_lookup(user_id: int, user_query: str) -> Tuple[Optional[asyncio.Task], int]:
+    """在图开始执行前启动回答缓存查询，返回 (查询任务, 执行前的数据版本)
+
+    查询与图并行：未命中时不再把 embedding 串行地放在意图分类之前。
+    """
+    if not settings.answer_cache_enabled:
+        return None, 0
+    version = answer_cache.version(user_id)
+    return asyncio.ensure_future(_lookup_answer(user_id, user_query)), version
+
+
+async def _cancel(task: asyncio.Task) -> None:
+    """缓存命中后取消已经开始执行的图"""
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+def _store_answer(
+    user_id: int,
+    user_query: str,
+    query_vector: Optional[List[float]],
+    result: Dict[str, Any],
+    version: int,
+    usage: UsageMetadataCallbackHandler,
+) -> None:
+    # 低置信度（包括解析失败）的回答不缓存，下次重新生成
+    if not settings.answer_cache_enabled or result.get("data", {}).get("confidence") == "低":
+        return
+    tokens = sum(u.get("total_tokens", 0) for u in usage.usage_metadata.values())
+    answer_cache.store(user_id, user_query, query_vector, result, version, tokens, _answer_scope(user_query))
+
+
+async def _respond(user_id: int, user_query: str, session: AsyncSession) -> Dict[str, Any]:
+    lookup, version = _start_lookup(user_id, user_query)
+    usage = UsageMetadataCallbackHandler()
     initial: AgentState = {"user_id": user_id, "query": user_query}
-    final_state: AgentState = await app.ainvoke(initial)
-    return final_state.get("result", {})
+    run = asyncio.ensure_future(agent_graph.ainvoke(
+        initial, config=run_config(session, [usage, LLMTracingCallback()])
+    ))
+    query_vector = None
+    if lookup is not None:
+        cached, query_vector = await lookup
+        if cached is not None:
+            await _cancel(run)
+            return cached
+    final_state: AgentState = await run
+    result = final_state.get("result", {})
+    _store_answer(user_id, user_query, query_vector, result, version, usage)
+    return result
+
+
+def _with_debug(result: Dict[str, Any], trace: Trace) -> Dict[str, Any]:
+    # 返回副本：缓存中的回答对象不能带上某一次请求的追踪
+    return {**result, "debug": trace.to_dict()}
+
+
+async def respond(user_id: int, user_query: str, session: AsyncSession, debug: bool = False) -> Dict[str, Any]:
+    """执行 agent；debug=True 时在结果中附加本次请求各节点/检索的耗时与 LLM 用量"""
+    with start_trace() as trace:
+        result = await _respond(user_id, user_query, session)
+    return _with_debug(result, trace) if debug else result
+
+
+# 只把生成回答节点的 LLM token 推给客户端（意图分类、相关性判断的输出不是回答）
+STREAMED_NODES = {"generate_no_rag", "generate_with_history"}
+_JSON_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+
+
+class AnswerFieldStream:
+    """生成节点按提示输出 JSON：从流式片段中增量取出 answer 字段的文本（处理转义），其余字段不下发"""
+
+    _KEY = re.compile(r'"answer"\s*:\s*"')
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos: Optional[int] = None  # answer 字符串值在 buffer 中已解析到的位置；None 表示尚未出现
+        self._done = False
+
+    def _unicode_escape(self, i: int) -> Tuple[Optional[str], int]:
+        """解析 buffer[i] 处的 \\uXXXX（含代理对）；片段不完整时返回 (None, i)"""
+        buf = self._buffer
+        if i + 6 > len(buf):
+            return None, i
+        code = int(buf[i + 2:i + 6], 16)
+        if 0xD800 <= code < 0xDC00:
+            if i + 12 > len(buf):
+                return None, i
+            if buf[i + 6:i + 8] == "\\u":
+                low = int(buf[i + 8:i + 12], 16)
+                return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)), i + 12
+        return chr(code), i + 6
+
+    def feed(self, chunk: str) -> str:
+        """送入一段模型输出，返回其中新出现的回答文本"""
+        if self._done:
+            return ""
+        self._buffer += chunk
+        if self._pos is None:
+            match = self._KEY.search(self._buffer)
+            if match is None:
+                return ""
+            self._pos = match.end()
+        buf, i, out = self._buffer, self._pos, []
+        while i < len(buf):
+            c = buf[i]
+            if c == '"':
+                self._done = True
+                break
+            if c != "\\":
+                out.append(c)
+                i += 1
+                continue
+            if i + 1 >= len(buf):
+                break  # 转义序列被切在两个片段之间，等下一段
+            if buf[i + 1] == "u":
+                try:
+                    char, i = self._unicode_escape(i)
+                except ValueError:
+                    char, i = buf[i + 1], i + 2
+                if char is None:
+                    break
+                out.append(char)
+                continue
+            out.append(_JSON_ESCAPES.get(buf[i + 1], buf[i + 1]))
+            i += 2
+        self._pos = i
+        return "".join(out)
+
+
+# 进度事件中不下发的状态字段（向量、推测预取的中间结果、最终结果）
+_PROGRESS_HIDDEN = {"query_vector", "result"}
+
+
+def _progress_detail(update: Dict[str, Any]) -> Dict[str, Any]:
+    """节点进度摘要：列表只给数量，标量原样给出"""
+    detail: Dict[str, Any] = {}
+    for key, value in (update or {}).items():
+        if key in _PROGRESS_HIDDEN or key.startswith("speculative_"):
+            continue
+        if isinstance(value, list):
+            detail[f"{key}_count"] = len(value)
+        elif value is None or isinstance(value, (str, int, float, bool)):
+            detail[key] = value
+    return detail
+
+
+async def respond_stream(
+    user_id: int, user_query: str, session: AsyncSession, debug: bool = False
+) -> AsyncIterator[Dict[str, Any]]:
+    """流式执行 agent，依次产出事件 {"event": ..., "data": ...}：
+
+    - progress：每个节点完成时的进度摘要
+    - token：生成节点回答文本的增量，即模型输出的 JSON 中 answer 字段的内容（其余字段只在 result 中给出）
+    - result：与 respond 返回值相同的结构化结果，总是最后一个事件
+
+    生成调用由 LLM 调度层合并到相同提示的进行中调用、或直接由 LLM 回答缓存返回时，
+    没有逐 token 输出，不会产生 token 事件，客户端只收到 result。
+    """
+    with start_trace() as trace:
+        lookup, version = _start_lookup(user_id, user_query)
+        usage = UsageMetadataCallbackHandler()
+        initial: AgentState = {"user_id": user_id, "query": user_query}
+        # 图在后台任务中执行、事件经队列转发，回答缓存查询与图并行
+        events: asyncio.Queue = asyncio.Queue()
 
+        async def produce() -> None:
+            try:
+                async for item in agent_graph.astream(
+                    initial, config=run_config(session, [usage, LLMTracingCallback()]),
+                    stream_mode=["updates", "messages"],
+                ):
+                    await events.put(item)
+            except Exception as e:
+                await events.put(e)
+                return
+            await events.put(None)
 
+        producer = asyncio.ensure_future(produce())
+        try:
+            query_vector = None
+            if lookup is not None:
+                cached, query_vector = await lookup
+                if cached is not None:
+                    await _cancel(producer)
+                    yield {"event": "progress", "data": {"node": "answer_cache"}}
+                    yield {"event": "result", "data": _with_debug(cached, trace) if debug else cached}
+                    return
+            result: Dict[str, Any] = {}
+            answer_streams: Dict[str, AnswerFieldStream] = {}
+            while (item := await events.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                mode, chunk = item
+                if mode == "updates":
+                    for node, update in chunk.items():
+                        if update and "result" in update:
+                            result = update["result"]
+                        yield {"event": "progress", "data": {"node": node, **_progress_detail(update)}}
+                else:
+                    message, metadata = chunk
+                    node = metadata.get("langgraph_node")
+                    if node in STREAMED_NODES and message.content:
+                        text = answer_streams.setdefault(node, AnswerFieldStream()).feed(message.content)
+                        if text:
+                            yield {"event": "token", "data": {"node": node, "text": text}}
+            _store_answer(user_id, user_query, query_vector, result, version, usage)
+            yield {"event": "result", "data": _with_debug(result, trace) if debug else result}
+        finally:
+            # 客户端断开或出错时停止后台执行的图
+            if not producer.done():
+                await _cancel(producer)
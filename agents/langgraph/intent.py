@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from service.embedding_batcher import generate_vectors_async
+from utils.logger import logger
+
+INTENT_LABELS = ("today_summary", "recent_summary", "cross_days_trend", "general_qa")
+
+# 关键词规则：只命中一个意图时给出该意图，置信度为规则的固定值。
+# 置信度低于 INTENT_LOCAL_THRESHOLD 的默认值 0.8：关键词只作为参考，单凭它不会跳过中心分类和 LLM
+KEYWORD_RULES: List[Tuple[str, Tuple[str, ...], float]] = [
+    ("today_summary", ("今天", "今日", "今早", "今晚", "今天上午", "今天下午", "刚刚"), 0.75),
+    ("recent_summary", ("最近几天", "前几天", "过去几天", "这几天", "上周", "这周", "本周", "近一周", "过去一周", "7天"), 0.75),
+    ("cross_days_trend", ("趋势", "走势", "长期", "一个月", "这个月", "几个月", "几周", "变化", "多日", "跨日"), 0.75),
+]
+
+# 比较 / 区间线索：出现时"今天""上周"只是比较的一端（如"今天和上周比心情怎么样"），
+# 不能据此判为单日或近期总结，只保留趋势规则
+COMPARISON_CUES = ("比", "相比", "对比", "以来", "之间", "跟以前", "和以前")
+
+# 带标注的示例问题，用 bge 向量求各意图的中心；可由 INTENT_EXAMPLES_PATH 追加
+DEFAULT_EXAMPLES: Dict[str, List[str]] = {
+    "today_summary": [
+        "今天的心情记录是什么", "帮我总结一下今天", "今天做了哪些事", "今天有什么建议",
+        "今日的工作完成得怎么样", "今早记了什么", "今天的反思", "今天过得好吗",
+    ],
+    "recent_summary": [
+        "最近心情怎么样", "前几天我在忙什么", "上周的工作总结", "我因为什么生气的那一天是哪一天",
+        "过去几天睡得好吗", "最近有没有运动", "这周学了什么", "最近压力大吗",
+    ],
+    "cross_days_trend": [
+        "最近一个月我体重变化趋势", "这几周情绪有什么变化", "我的生产力长期走势", "这个月和上个月比怎么样",
+        "最近一段时间的睡眠趋势", "多日以来学习时间的变化", "分析一下这段时间的运动频率", "心情评分的整体趋势",
+    ],
+    "general_qa": [
+        "谁写下了这条备注", "内容里有没有提到旅行", "我什么时候第一次去健身房", "我写过关于读书的记录吗",
+        "我一共记录了多少天", "有没有提到过我的猫", "我喜欢吃什么", "我设定过哪些目标",
+    ],
+}
+
+# 余弦相似度差异很小，softmax 前放大
+CENTROID_TEMPERATURE = 0.05
+
+
+def load_examples(path: Optional[str] = None) -> Dict[str, List[str]]:
+    examples = {label: list(queries) for label, queries in DEFAULT_EXAMPLES.items()}
+    path = path if path is not None else settings.intent_examples_path
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for label, queries in json.load(f).items():
+                if label in INTENT_LABELS:
+                    examples[label].extend(queries)
+        logger.info(f"已加载意图示例: {path}")
+    return examples
+
+
+def rule_intent(query: str) -> Optional[Dict[str, Any]]:
+    """关键词规则：只有恰好命中一个意图、且没有比较线索与之冲突时才给出结果"""
+    t = (query or "").lower()
+    hits = [(label, confidence) for label, keywords, confidence in KEYWORD_RULES if any(k in t for k in keywords)]
+    if any(cue in t for cue in COMPARISON_CUES):
+        hits = [(label, confidence) for label, confidence in hits if label == "cross_days_trend"]
+    if len(hits) != 1:
+        return None
+    label, confidence = hits[0]
+    return {"label": label, "confidence": confidence, "source": "rule"}
+
+
+class IntentCentroids:
+    """示例问题向量的各意图中心，按余弦相似度做最近中心分类"""
+
+    def __init__(self, examples: Dict[str, List[str]]):
+        self.examples = examples
+        self.labels: List[str] = []
+        self.matrix: Optional[np.ndarray] = None
+        self._lock = asyncio.Lock()
+
+    async def ensure_built(self) -> bool:
+        """计算各意图中心；应用启动时调用一次，之后的调用直接返回"""
+        if self.matrix is not None:
+            return True
+        async with self._lock:
+            if self.matrix is not None:
+                return True
+            labels, centroids = [], []
+            for label, queries in self.examples.items():
+                vectors = await asyncio.gather(*(generate_vectors_async(q) for q in queries))
+                vectors = [v for v in vectors if v is not None]
+                if not vectors:
+                    continue
+                centroid = np.mean(np.asarray(vectors, dtype=np.float32), axis=0)
+                labels.append(label)
+                centroids.append(centroid / np.linalg.norm(centroid))
+            if not centroids:
+                return False
+            self.labels = labels
+            self.matrix = np.vstack(centroids)
+            logger.info(f"意图中心构建完成: {len(labels)} 类")
+        return True
+
+    def predict(self, vector: List[float]) -> Dict[str, Any]:
+        sims = self.matrix @ np.asarray(vector, dtype=np.float32)
+        probs = np.exp((sims - sims.max()) / CENTROID_TEMPERATURE)
+        probs /= probs.sum()
+        best = int(np.argmax(probs))
+        return {
+            "label": self.labels[best],
+            "confidence": float(probs[best]),
+            "similarity": float(sims[best]),
+            "source": "centroid",
+        }
+
+
+intent_centroids = IntentCentroids(load_examples())
+
+
+async def predict_intent(query: str) -> Optional[Dict[str, Any]]:
+    """本地意图预测：关键词规则优先，其次最近中心；返回 {label, confidence, source}"""
+    rule = rule_intent(query)
+    if rule and rule["confidence"] >= settings.intent_local_threshold:
+        return rule
+    try:
+        # 正常情况下中心已在启动时建好；启动时构建失败的话在这里重试
+        if not await intent_centroids.ensure_built():
+            return rule
+        vector = await generate_vectors_async(query)
+    except Exception as e:
+        logger.warning(f"本地意图分类失败: {e}")
+        return rule
+    if vector is None:
+        return rule
+    prediction = intent_centroids.predict(vector)
+    if rule and rule["label"] == prediction["label"]:
+        # 规则与中心一致时取两者中较高的置信度
+        prediction["confidence"] = max(prediction["confidence"], rule["confidence"])
+        prediction["source"] = "rule+centroid"
+    return prediction
@@ -1,19 +1,57 @@
 from __future__ import annotations
 
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Optional
 
+from langchain_core.messages import AIMessage, BaseMessage
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from config import settings
+from service.context_packer import count_tokens
+from service.llm_client import llm_client_factory
+from service.llm_dispatcher import Priority, llm_dispatcher, prompt_key
+
+LLM_TEMPERATURE = 0.7
+# 生成回答的 token 数估计，用于 token 限流
+ESTIMATED_COMPLETION_TOKENS = 500
 
 
 def get_llm() -> ChatOpenAI:
-    return ChatOpenAI(
-        api_key=settings.llm_api_key,
-        base_url=settings.llm_base_url,
-        model=settings.llm_model_name,
-        temperature=0.7,
+    """共用连接池的 ChatOpenAI，不再每次调用新建 HTTP 客户端"""
+    return llm_client_factory.chat_model(temperature=LLM_TEMPERATURE)
+
+
+async def invoke_llm(
+    prompt: ChatPromptTemplate,
+    inputs: Dict[str, Any],
+    priority: int = Priority.INTERACTIVE,
+    cache_ttl: Optional[float] = None,
+    bypass_cache: bool = False,
+    cacheable: Optional[Callable[[str], bool]] = None,
+) -> BaseMessage:
+    """渲染提示后经调度层调用 LLM（并发上限、限流、重试、相同提示合并）
+
+    给出 cache_ttl 时使用回答缓存，命中时返回只含文本的 AIMessage。
+    """
+    messages = prompt.format_messages(**inputs)
+    text = "\n".join(f"{m.type}: {m.content}" for m in messages)
+    llm = get_llm()
+    run_kwargs = {
+        "model": settings.llm_model_name,
+        "key": prompt_key(settings.llm_model_name, LLM_TEMPERATURE, text),
+        "estimated_tokens": count_tokens(text) + ESTIMATED_COMPLETION_TOKENS,
+        "priority": priority,
+    }
+    if cache_ttl is None:
+        return await llm_dispatcher.run(lambda: llm.ainvoke(messages), **run_kwargs)
+
+    async def call():
+        resp = await llm.ainvoke(messages)
+        return resp.content, (resp.usage_metadata or {}).get("total_tokens", 0)
+
+    content = await llm_dispatcher.run_cached(
+        call, cache_ttl=cache_ttl, bypass_cache=bypass_cache, cacheable=cacheable, **run_kwargs
     )
+    return AIMessage(content=content)
 
 
 def build_prompt_no_rag() -> ChatPromptTemplate:
@@ -138,3 +176,10 @@ def build_relevance_check_prompt() -> ChatPromptTemplate:
 
 请判断这些记录是否足以回答用户的问题。""")
     ])
+
+
+# 提示模板与请求无关，导入时构建一次，各节点直接复用
+PROMPT_NO_RAG = build_prompt_no_rag()
+PROMPT_WITH_HISTORY = build_prompt_with_history()
+PROMPT_INTENT = build_prompt_intent()
+PROMPT_RELEVANCE_CHECK = build_relevance_check_prompt()
@@ -6,10 +6,19 @@ import asyncio
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, desc, text, func, cast,literal_column
 from utils.logger import logger
-from models.daily_record import DailyRecord
-from service.embedding import generate_vectors
+from utils.tracing import trace_span
+from config import settings
+from models.daily_record import DailyRecord, VECTOR_DIM
+from service.embedding_batcher import generate_vectors_async
+from service.context_packer import pack_records
+from service.text_search import to_search_query
+from service.user_vector_index import user_vector_index
 from agents.langgraph.state import AgentState
-from agents.langgraph.llm import get_llm, build_prompt_no_rag, build_prompt_with_history, build_prompt_intent,build_relevance_check_prompt
+from agents.langgraph.relevance import local_relevance_check
+from agents.langgraph.intent import INTENT_LABELS, predict_intent, rule_intent
+from agents.langgraph.date_parser import parse_date_range
+from agents.langgraph.llm import invoke_llm, PROMPT_NO_RAG, PROMPT_WITH_HISTORY, PROMPT_INTENT, PROMPT_RELEVANCE_CHECK
+from langchain_core.runnables import RunnableConfig
 from langchain_core.prompts import ChatPromptTemplate
 from sqlalchemy.sql import text as sql_text
 
@@ -24,16 +33,32 @@ def _classify_intent(text: str) -> str:
     return "general_qa"
 
 
-async def classify_intent_node(state: AgentState) -> dict:
-    llm = get_llm()
-    prompt = build_prompt_intent()
-    chain = prompt | llm
-    resp = await chain.ainvoke({"query": state.get("query", "")})
+async def llm_classify_intent(query: str) -> str:
+    # 同一问题的分类结果不变：走回答缓存，只缓存合法标签
+    resp = await invoke_llm(
+        PROMPT_INTENT,
+        {"query": query},
+        cache_ttl=settings.llm_cache_intent_ttl_seconds,
+        cacheable=lambda text: text.strip().lower() in INTENT_LABELS,
+    )
     label = (resp.content or "").strip().lower()
     logger.info(f"Intent classification result: {label}")
-    if label not in {"today_summary", "recent_summary", "cross_days_trend", "general_qa"}:
-        label = _classify_intent(state.get("query", ""))
-    return {"intent": label}
+    if label not in INTENT_LABELS:
+        label = _classify_intent(query)
+    return label
+
+
+async def classify_intent_node(state: AgentState) -> dict:
+    query = state.get("query", "")
+    if settings.intent_local_enabled:
+        prediction = await predict_intent(query)
+        if prediction and prediction["confidence"] >= settings.intent_local_threshold:
+            logger.info(
+                f"本地意图分类: {prediction['label']} "
+                f"(置信度 {prediction['confidence']:.2f}, 来源 {prediction['source']})"
+            )
+            return {"intent": prediction["label"]}
+    return {"intent": await llm_classify_intent(query)}
 
 
 def _parse_time_range(intent: str) -> Tuple[Optional[str], Optional[str]]:
@@ -82,8 +107,13 @@ def _get_retrieval_config(intent: str) -> Dict[str, Any]:
 
 
 async def time_range_node(state: AgentState) -> dict:
-    """确定初始时间范围"""
-    start_date, end_date = _parse_time_range(state.get("intent", ""))
+    """确定初始时间范围：问题中有明确的日期表达时按其精确设置，否则按意图取默认时间窗"""
+    parsed = parse_date_range(state.get("query", ""))
+    if parsed:
+        start_date, end_date = parsed
+        logger.info(f"从问题中解析到时间范围: {start_date} ~ {end_date}")
+    else:
+        start_date, end_date = _parse_time_range(state.get("intent", ""))
     return {
         "start_date": start_date,
         "end_date": end_date,
@@ -92,48 +122,133 @@ async def time_range_node(state: AgentState) -> dict:
     }
 
 
-async def prefilter_node(state: AgentState, session: AsyncSession) -> dict:
-    user_id = state["user_id"]
+def _session(config: RunnableConfig) -> AsyncSession:
+    """图只编译一次，请求级的数据库会话通过运行配置传入"""
+    return config["configurable"]["session"]
+
+
+PREFILTER_LIMIT = 200
+# 走检索分支的意图
+RAG_INTENTS = {"recent_summary", "cross_days_trend"}
+# RAG 分支各意图初始时间窗中最宽的一个，推测预取按它取候选
+SPECULATIVE_INTENT = "cross_days_trend"
+
+
+# RAG 分支只用到候选的日期、正文、心情与反思
+CANDIDATE_COLUMNS = (
+    DailyRecord.id,
+    DailyRecord.user_id,
+    DailyRecord.record_date,
+    DailyRecord.content,
+    DailyRecord.mood_score,
+    DailyRecord.reflections,
+)
+# 非 RAG 分支只基于最新一条记录作答，需要它的全部活动字段
+DETAIL_COLUMNS = CANDIDATE_COLUMNS + (
+    DailyRecord.work_activities,
+    DailyRecord.personal_activities,
+    DailyRecord.learning_activities,
+    DailyRecord.health_activities,
+    DailyRecord.goals_achieved,
+    DailyRecord.challenges_faced,
+)
+
+
+async def _prefilter_candidates(
+    session: AsyncSession,
+    user_id: int,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    limit: int = PREFILTER_LIMIT,
+    detail: bool = False,
+) -> List[Dict[str, Any]]:
+    """按日期倒序取候选，只查询需要的列并直接构造字典（不实例化 ORM 对象）"""
     conditions = [DailyRecord.user_id == user_id]
-    if state.get("start_date"):
-        conditions.append(DailyRecord.record_date >= state["start_date"]) 
-    if state.get("end_date"):
-        conditions.append(DailyRecord.record_date <= state["end_date"]) 
+    if start_date:
+        conditions.append(DailyRecord.record_date >= start_date)
+    if end_date:
+        conditions.append(DailyRecord.record_date <= end_date)
 
     stmt = (
-        select(DailyRecord)
+        select(*(DETAIL_COLUMNS if detail else CANDIDATE_COLUMNS))
         .where(and_(*conditions))
         .order_by(desc(DailyRecord.record_date))
-        .limit(200)
+        .limit(limit)
     )
     result = await session.execute(stmt)
-    rows = list(result.scalars().all())
-    
-    logger.info(f"预过滤获取到 {len(rows)} 条候选记录")
-    
-    candidates = [
-        {
-            "id": r.id,
-            "user_id": r.user_id,
-            "record_date": r.record_date,
-            "content": r.content,
-            "mood_score": r.mood_score,
-            "reflections": r.reflections,
-            "work_activities": r.work_activities,
-            "personal_activities": r.personal_activities,
-            "learning_activities": r.learning_activities,
-            "health_activities": r.health_activities,
-            "goals_achieved": r.goals_achieved,
-            "challenges_faced": r.challenges_faced,
-        }
-        for r in rows
-    ]
+    return [dict(r._mapping) for r in result]
+
+
+async def speculate_node(state: AgentState, config: RunnableConfig) -> dict:
+    """与意图分类并行：预先计算查询向量并预取 RAG 最宽时间窗的候选
+
+    结果只在走 RAG 分支时被 prefilter/embed 节点采用。推测每次都要一次预取查询和一次 embedding，
+    只在关键词规则判为 RAG 意图时执行；其余问题多半走非 RAG 分支，不为它们付出这部分开销。
+    """
+    if not settings.agent_speculative_prefetch:
+        return {}
+    rule = rule_intent(state.get("query", ""))
+    if rule is None or rule["label"] not in RAG_INTENTS:
+        return {}
+    session = _session(config)
+    start_date, end_date = _parse_time_range(SPECULATIVE_INTENT)
+    try:
+        # 向量计算不占用数据库会话，与预取查询并发执行
+        vector, candidates = await asyncio.gather(
+            generate_vectors_async(state.get("query", "")),
+            _prefilter_candidates(session, state["user_id"], start_date, end_date),
+        )
+    except Exception as e:
+        logger.warning(f"推测预取失败，回退到顺序执行: {e}")
+        return {}
+    return {
+        "speculative_vector": vector,
+        "speculative_candidates": candidates,
+        "speculative_start_date": start_date,
+        "speculative_end_date": end_date,
+    }
+
+
+def _speculative_candidates(state: AgentState) -> Optional[List[Dict[str, Any]]]:
+    """推测预取的候选覆盖当前时间窗时，在内存中过滤出当前时间窗的候选
 
+    两个时间窗终点相同且预取窗口起点更早时，预取结果（按日期倒序取前 N 条）
+    过滤后即等于直接查询当前时间窗的结果。
+    """
+    candidates = state.get("speculative_candidates")
+    if candidates is None or not need_rag(state):
+        return None
+    start_date, end_date = state.get("start_date"), state.get("end_date")
+    spec_start = state.get("speculative_start_date")
+    if end_date != state.get("speculative_end_date"):
+        return None
+    if spec_start and (not start_date or start_date < spec_start):
+        return None
+    return [c for c in candidates if not start_date or c["record_date"] >= start_date]
+
+
+async def prefilter_node(state: AgentState, config: RunnableConfig) -> dict:
+    candidates = _speculative_candidates(state)
+    if candidates is not None:
+        logger.info(f"预过滤使用推测预取结果: {len(candidates)} 条候选记录")
+        return {"candidates": candidates}
+
+    if need_rag(state):
+        candidates = await _prefilter_candidates(
+            _session(config), state["user_id"], state.get("start_date"), state.get("end_date")
+        )
+    else:
+        # generate_no_rag 只使用最新一条记录
+        candidates = await _prefilter_candidates(
+            _session(config), state["user_id"], state.get("start_date"), state.get("end_date"),
+            limit=1, detail=True,
+        )
+    logger.info(f"预过滤获取到 {len(candidates)} 条候选记录")
     return {"candidates": candidates}
 
 
 def need_rag(state: AgentState) -> bool:
-    return state.get("intent") in {"recent_summary", "cross_days_trend"}
+    return state.get("intent") in RAG_INTENTS
 
 
 def _validate_and_fix_response(data: Dict[str, Any]) -> Dict[str, Any]:
@@ -199,7 +314,9 @@ def _parse_json_response(raw_response: str) -> Dict[str, Any]:
 
 
 async def embed_node(state: AgentState) -> dict:
-    qv = generate_vectors(state.get("query", ""))
+    qv = state.get("speculative_vector")
+    if qv is None:
+        qv = await generate_vectors_async(state.get("query", ""))
     return {"query_vector": qv}
 
 async def llm_check_relevance(query: str, records: List[Dict]) -> Dict[str, Any]:
@@ -218,12 +335,8 @@ async def llm_check_relevance(query: str, records: List[Dict]) -> Dict[str, Any]
         for r in records[:5]  # 只取前5条
     ])
     
-    llm = get_llm()
-    prompt = build_relevance_check_prompt()
-    chain = prompt | llm
-    
     try:
-        resp = await chain.ainvoke({
+        resp = await invoke_llm(PROMPT_RELEVANCE_CHECK, {
             "query": query,
             "records_summary": records_summary
         })
@@ -253,56 +366,179 @@ async def llm_check_relevance(query: str, records: List[Dict]) -> Dict[str, Any]
         }
 
 
-async def rerank_and_fetch(
-    session: AsyncSession,
-    vector_results: List[Dict],
-    fts_results: List[Dict],
-    top_k: int,
-) -> List[Dict]:
-    """使用RRF重排序并获取记录"""
-    k = 60
-    ranked_list: Dict[int, float] = {}
-    
-    for i, doc in enumerate(vector_results):
-        doc_id = doc["id"]
-        if doc_id not in ranked_list:
-            ranked_list[doc_id] = 0.0
-        ranked_list[doc_id] += 1 / (k + i)
-
-    for i, doc in enumerate(fts_results):
-        doc_id = doc["id"]
-        if doc_id not in ranked_list:
-            ranked_list[doc_id] = 0.0
-        ranked_list[doc_id] += 1 / (k + i)
-
-    sorted_docs = sorted(ranked_list.items(), key=lambda x: x[1], reverse=True)
-    top_ids = [doc_id for doc_id, score in sorted_docs[:top_k]]
-
-    if not top_ids:
-        return []
-
-    sql = text("""
-        SELECT id, user_id, record_date, content, mood_score, reflections
+def _vector_search_sql(where_sql: str) -> str:
+    """向量检索SQL：紧凑存储模式下先用半精度/二值索引取候选，再按全精度余弦精确重排"""
+    mode = settings.vector_storage_mode
+    if mode == "full":
+        return f"""
+            SELECT id, (1 - (vector <=> (:qv)::vector)) AS similarity
+            FROM daily_records
+            WHERE {where_sql}
+            ORDER BY vector <=> (:qv)::vector
+            LIMIT :top_k
+        """
+    if mode == "binary":
+        candidate_filter = "vector_bits IS NOT NULL"
+        candidate_order = f"vector_bits <~> binary_quantize((:qv)::vector)::bit({VECTOR_DIM})"
+    else:  # halfvec
+        candidate_filter = "vector_half IS NOT NULL"
+        candidate_order = f"vector_half <=> (:qv)::halfvec({VECTOR_DIM})"
+    return f"""
+        SELECT id, (1 - (vector <=> (:qv)::vector)) AS similarity
+        FROM (
+            SELECT id, vector
+            FROM daily_records
+            WHERE {where_sql} AND {candidate_filter}
+            ORDER BY {candidate_order}
+            LIMIT :candidates
+        ) AS candidates
+        ORDER BY vector <=> (:qv)::vector
+        LIMIT :top_k
+    """
+
+
+RRF_K = 60
+
+
+def _fts_search_sql(where_sql: str) -> str:
+    """FTS检索SQL：使用写入时生成的 search_vector 列（GIN 索引）"""
+    return f"""
+        SELECT id, ts_rank_cd(search_vector, to_tsquery('simple', :query)) AS rank
         FROM daily_records
-        WHERE id = ANY(:ids)
-    """)
-    
-    result = await session.execute(sql, {"ids": top_ids})
-    rows = result.fetchall()
-    row_map = {row.id: row for row in rows}
-    ordered_rows = [row_map[doc_id] for doc_id in top_ids if doc_id in row_map]
+        WHERE search_vector @@ to_tsquery('simple', :query)
+        AND {where_sql}
+        ORDER BY rank DESC
+        LIMIT :top_k
+    """
 
-    return [
-        {
-            "id": r.id,
-            "user_id": r.user_id,
-            "record_date": r.record_date,
-            "content": r.content,
-            "mood_score": r.mood_score,
-            "reflections": r.reflections,
-        }
-        for r in ordered_rows
-    ]
+
+def _ranked_hits_ctes(where_sql: str, with_fts: bool, memory_vectors: bool = False) -> str:
+    """向量 top-k 与 FTS top-k 两个 CTE（各自带组内排名）
+
+    memory_vectors 为 True 时向量结果来自进程内索引，以数组参数传入，不再扫描向量列。
+    """
+    if with_fts:
+        fts_cte = f"""
+        fts_hits AS (
+            SELECT id, rank AS fts_score, ROW_NUMBER() OVER (ORDER BY rank DESC) AS rn
+            FROM ({_fts_search_sql(where_sql)}) AS f
+        )"""
+    else:
+        fts_cte = """
+        fts_hits AS (
+            SELECT NULL::integer AS id, NULL::real AS fts_score, NULL::bigint AS rn
+            WHERE false
+        )"""
+    if memory_vectors:
+        vector_cte = """
+        vector_hits AS (
+            SELECT v.id, v.similarity, v.rn
+            FROM unnest(CAST(:vector_ids AS integer[]), CAST(:vector_sims AS double precision[]))
+                 WITH ORDINALITY AS v(id, similarity, rn)
+        ),"""
+    else:
+        vector_cte = f"""
+        vector_hits AS (
+            SELECT id, similarity, ROW_NUMBER() OVER (ORDER BY similarity DESC) AS rn
+            FROM ({_vector_search_sql(where_sql + " AND vector IS NOT NULL")}) AS v
+        ),"""
+    return vector_cte + fts_cte
+
+
+def _hybrid_search_sql(where_sql: str, with_fts: bool, memory_vectors: bool = False) -> str:
+    """混合检索SQL：向量 top-k、FTS top-k、RRF 融合与取行合并为一条语句"""
+    return f"""
+        WITH {_ranked_hits_ctes(where_sql, with_fts, memory_vectors)},
+        fused AS (
+            SELECT COALESCE(v.id, f.id) AS id,
+                   COALESCE(1.0 / (:rrf_k + v.rn - 1), 0) + COALESCE(1.0 / (:rrf_k + f.rn - 1), 0) AS rrf_score,
+                   v.similarity,
+                   f.fts_score,
+                   LEAST(v.rn, f.rn) AS best_rn
+            FROM vector_hits v
+            FULL OUTER JOIN fts_hits f ON v.id = f.id
+        )
+        SELECT d.id, d.user_id, d.record_date, d.content, d.mood_score, d.reflections,
+               fused.rrf_score, fused.similarity, fused.fts_score
+        FROM fused
+        JOIN daily_records d ON d.id = fused.id
+        ORDER BY fused.rrf_score DESC, fused.best_rn
+        LIMIT :top_k
+    """
+
+
+def _ranked_candidates_sql(where_sql: str, with_fts: bool, memory_vectors: bool = False) -> str:
+    """只取两路各自排序的候选及分数，不做融合（融合在内存中按时间窗完成）"""
+    return f"""
+        WITH {_ranked_hits_ctes(where_sql, with_fts, memory_vectors)}
+        SELECT d.id, d.user_id, d.record_date, d.content, d.mood_score, d.reflections,
+               v.similarity, f.fts_score
+        FROM vector_hits v
+        FULL OUTER JOIN fts_hits f ON v.id = f.id
+        JOIN daily_records d ON d.id = COALESCE(v.id, f.id)
+    """
+
+
+def _search_params(
+    qv: List[float],
+    query: str,
+    user_id: int,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    top_k: int,
+) -> Tuple[str, Dict[str, Any], bool]:
+    """构建检索的 WHERE 条件与参数，返回 (where_sql, params, with_fts)"""
+    filters = ["user_id = :user_id"]
+    params: Dict[str, Any] = {
+        "user_id": user_id,
+        "top_k": top_k,
+        "qv": "[" + ",".join(map(str, qv)) + "]",
+    }
+    if start_date:
+        filters.append("record_date >= :start_date")
+        params["start_date"] = start_date
+    if end_date:
+        filters.append("record_date <= :end_date")
+        params["end_date"] = end_date
+    if settings.vector_storage_mode != "full":
+        params["candidates"] = top_k * settings.vector_candidate_multiplier
+
+    fts_query = to_search_query(query)
+    if fts_query:
+        params["query"] = fts_query
+    return " AND ".join(filters), params, bool(fts_query)
+
+
+async def _apply_memory_vector_hits(
+    session: AsyncSession,
+    params: Dict[str, Any],
+    qv: List[float],
+    user_id: int,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    top_k: int,
+) -> bool:
+    """热用户的向量检索走进程内索引，结果写入 params；返回是否使用了内存索引"""
+    if not settings.user_vector_index_enabled:
+        return False
+    index = await user_vector_index.get(session, user_id)
+    if index is None:
+        return False
+    hits = index.search(qv, start_date, end_date, top_k)
+    params["vector_ids"] = [record_id for record_id, _ in hits]
+    params["vector_sims"] = [similarity for _, similarity in hits]
+    return True
+
+
+def _record_row(r) -> Dict[str, Any]:
+    return {
+        "id": r.id,
+        "user_id": r.user_id,
+        "record_date": r.record_date,
+        "content": r.content,
+        "mood_score": r.mood_score,
+        "reflections": r.reflections,
+    }
 
 
 async def _search_in_time_range(
@@ -314,91 +550,189 @@ async def _search_in_time_range(
     end_date: Optional[str],
     top_k: int = 10
 ) -> List[Dict]:
-    """在指定时间范围内执行混合搜索"""
-    vector_str = "[" + ",".join(map(str, qv)) + "]"
-    
-    # 向量搜索
-    vs_filters = ["user_id = :user_id", "vector IS NOT NULL"]
-    if start_date:
-        vs_filters.append("record_date >= :start_date")
-    if end_date:
-        vs_filters.append("record_date <= :end_date")
-    vs_where_sql = " AND ".join(vs_filters)
+    """在指定时间范围内执行混合搜索（单次数据库往返，返回带融合分数的记录）"""
+    where_sql, params, with_fts = _search_params(qv, query, user_id, start_date, end_date, top_k)
+    params["rrf_k"] = RRF_K
 
-    # FTS搜索
-    fts_filters = ["user_id = :user_id"]
-    if start_date:
-        fts_filters.append("record_date >= :start_date")
-    if end_date:
-        fts_filters.append("record_date <= :end_date")
-    fts_where_sql = " AND ".join(fts_filters)
+    with trace_span("search_in_time_range", kind="search", start_date=start_date, end_date=end_date) as span:
+        try:
+            memory_vectors = await _apply_memory_vector_hits(session, params, qv, user_id, start_date, end_date, top_k)
+            result = await session.execute(text(_hybrid_search_sql(where_sql, with_fts, memory_vectors)), params)
+            rows = result.fetchall()
+        except Exception as e:
+            logger.error(f"搜索失败: {e}", exc_info=True)
+            return []
+        span.attrs["rows"] = len(rows)
 
-    base_params = {"user_id": user_id, "top_k": top_k}
-    if start_date:
-        base_params["start_date"] = start_date
-    if end_date:
-        base_params["end_date"] = end_date
+    return [
+        {
+            **_record_row(r),
+            "score": float(r.rrf_score),
+            "similarity": float(r.similarity) if r.similarity is not None else None,
+            "fts_score": float(r.fts_score) if r.fts_score is not None else None,
+        }
+        for r in rows
+    ]
 
-    vector_sql = f"""
-        SELECT id, (1 - (vector <=> (:qv)::vector)) AS similarity
-        FROM daily_records
-        WHERE {vs_where_sql}
-        ORDER BY vector <=> (:qv)::vector
-        LIMIT :top_k
+
+class RankedCandidates:
+    """最宽时间窗内一次取回的两路排序候选，较窄的时间窗在内存中过滤后按 RRF 融合
+
+    各路候选按分数降序取了前 limit 条：若某路被截断，且窗口内该路不足 top_k 条，
+    则无法保证与直接查询一致，返回 None 由调用方回退到数据库查询。
     """
-    vector_params = {"qv": vector_str, **base_params}
 
-    # 处理FTS查询
-    query_words = (query or "").split()
-    if not query_words:
-        fts_rows = []
+    def __init__(self, rows: List[Dict[str, Any]], limit: int):
+        self.vector_hits = sorted(
+            [r for r in rows if r["similarity"] is not None], key=lambda r: r["similarity"], reverse=True
+        )
+        self.fts_hits = sorted(
+            [r for r in rows if r["fts_score"] is not None], key=lambda r: r["fts_score"], reverse=True
+        )
+        self.vector_truncated = len(self.vector_hits) >= limit
+        self.fts_truncated = len(self.fts_hits) >= limit
+
+    @staticmethod
+    def _in_window(r: Dict[str, Any], start_date: Optional[str], end_date: Optional[str]) -> bool:
+        return (not start_date or r["record_date"] >= start_date) and (not end_date or r["record_date"] <= end_date)
+
+    def search(self, start_date: Optional[str], end_date: Optional[str], top_k: int = 10) -> Optional[List[Dict]]:
+        vector_hits = [r for r in self.vector_hits if self._in_window(r, start_date, end_date)][:top_k]
+        fts_hits = [r for r in self.fts_hits if self._in_window(r, start_date, end_date)][:top_k]
+        if (self.vector_truncated and len(vector_hits) < top_k) or (self.fts_truncated and len(fts_hits) < top_k):
+            return None
+
+        fused: Dict[int, Dict[str, Any]] = {}
+        for hits in (vector_hits, fts_hits):
+            for i, r in enumerate(hits):
+                entry = fused.setdefault(r["id"], {**r, "score": 0.0, "best_rn": i})
+                entry["score"] += 1 / (RRF_K + i)
+                entry["best_rn"] = min(entry["best_rn"], i)
+        ranked = sorted(fused.values(), key=lambda r: (-r["score"], r["best_rn"]))[:top_k]
+        for r in ranked:
+            r.pop("best_rn")
+        return ranked
+
+
+async def _fetch_ranked_candidates(
+    session: AsyncSession,
+    qv: List[float],
+    query: str,
+    user_id: int,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    limit: int,
+) -> Optional[RankedCandidates]:
+    """一次取回最宽时间窗内的两路排序候选"""
+    where_sql, params, with_fts = _search_params(qv, query, user_id, start_date, end_date, limit)
+    with trace_span("fetch_ranked_candidates", kind="search", start_date=start_date, end_date=end_date) as span:
         try:
-            vector_result = await session.execute(text(vector_sql), vector_params)
-            vector_rows = [{"id": r.id, "score": r.similarity} for r in vector_result.fetchall()]
+            memory_vectors = await _apply_memory_vector_hits(session, params, qv, user_id, start_date, end_date, limit)
+            result = await session.execute(text(_ranked_candidates_sql(where_sql, with_fts, memory_vectors)), params)
+            rows = result.fetchall()
         except Exception as e:
-            logger.error(f"向量搜索失败: {e}")
-            vector_rows = []
-        return await rerank_and_fetch(session, vector_rows, fts_rows, top_k)
-    
-    fts_query_str = " | ".join(query_words)
-    fts_sql = f"""
-        SELECT id, ts_rank_cd(to_tsvector('simple', content || ' ' || reflections), to_tsquery('simple', :query)) as rank
-        FROM daily_records
-        WHERE to_tsvector('simple', content || ' ' || reflections) @@ to_tsquery('simple', :query)
-        AND {fts_where_sql}
-        ORDER BY rank DESC
-        LIMIT :top_k
+            logger.error(f"候选检索失败: {e}", exc_info=True)
+            return None
+        span.attrs["rows"] = len(rows)
+    return RankedCandidates(
+        [
+            {
+                **_record_row(r),
+                "similarity": float(r.similarity) if r.similarity is not None else None,
+                "fts_score": float(r.fts_score) if r.fts_score is not None else None,
+            }
+            for r in rows
+        ],
+        limit,
+    )
+
+
+def _expansion_windows(
+    original_start: Optional[str], original_end: Optional[str], config: Dict[str, Any]
+) -> List[Tuple[Optional[str], Optional[str]]]:
+    """按 retrieve_node 的扩展规则，列出各次尝试依次检索的时间窗（由窄到宽）"""
+    windows = [(original_start, original_end)]
+    if not original_start:
+        return windows
+    steps = config["time_expansion_steps"]
+    for attempt in range(1, config["max_attempts"]):
+        if attempt >= len(steps):
+            break
+        new_start = date.fromisoformat(original_start) - timedelta(days=steps[attempt - 1])
+        if (date.today() - new_start).days > config["max_time_range"]:
+            break
+        windows.append((new_start.strftime("%Y-%m-%d"), original_end))
+    return windows
+
+
+async def _judge_windows_in_memory(
+    ranked_candidates: RankedCandidates,
+    windows: List[Tuple[Optional[str], Optional[str]]],
+    query: str,
+    intent: str,
+    min_results_for_llm: int,
+) -> Optional[Tuple[List[Dict], Optional[str], List[Dict[str, Any]], Optional[Dict[str, Any]]]]:
+    """在内存中由窄到宽评估各时间窗，判断规则与迭代检索相同，只是不再逐窗查询数据库
+
+    结果数不足的时间窗直接跳过；其余时间窗先做本地判断，模糊区间时调用 LLM（每个时间窗最多一次），
+    判定不相关（无论本地还是 LLM）时继续下一个时间窗，因此 search_logs 与迭代检索一致。
+    返回 (检索结果, 最后评估的窗口起始日期, search_logs, 可回答时的相关性判断)；
+    候选被截断无法在内存中评估时返回 None。
     """
-    fts_params = {"query": fts_query_str, **base_params}
+    search_logs: List[Dict[str, Any]] = []
+    retrieved: List[Dict] = []
+    current_start = windows[0][0]
+    for attempt, (start_date, end_date) in enumerate(windows, 1):
+        window_hits = ranked_candidates.search(start_date, end_date)
+        if window_hits is None:
+            return None
+        retrieved, current_start = window_hits, start_date
+        log_entry = {
+            "attempt": attempt,
+            "start_date": start_date,
+            "end_date": end_date,
+            "results_count": len(retrieved),
+        }
+        search_logs.append(log_entry)
+        if len(retrieved) < min_results_for_llm:
+            log_entry["decision"] = "too_few_results"
+            log_entry["llm_used"] = False
+            continue
 
-    try:
-        vector_result, fts_result = await asyncio.gather(
-            session.execute(text(vector_sql), vector_params),
-            session.execute(text(fts_sql), fts_params),
-            return_exceptions=True
-        )
-        
-        vector_rows = []
-        fts_rows = []
-        
-        if not isinstance(vector_result, Exception):
-            vector_rows = [{"id": r.id, "score": r.similarity} for r in vector_result.fetchall()]
+        relevance = local_relevance_check(retrieved, intent) if settings.relevance_gate_enabled else None
+        if relevance is None:
+            logger.info(f"选定时间窗 {start_date} ~ {end_date}，调用LLM判断相关性")
+            relevance = await llm_check_relevance(query, retrieved)
+            log_entry["llm_used"] = True
         else:
-            logger.error(f"向量搜索失败: {vector_result}")
-        
-        if not isinstance(fts_result, Exception):
-            fts_rows = [{"id": r.id, "score": r.rank} for r in fts_result.fetchall()]
-        else:
-            logger.error(f"FTS搜索失败: {fts_result}")
-        
-        return await rerank_and_fetch(session, vector_rows, fts_rows, top_k)
-        
-    except Exception as e:
-        logger.error(f"搜索失败: {e}", exc_info=True)
-        return []
+            log_entry["llm_used"] = False
+            log_entry["relevance_source"] = "local"
+        log_entry["llm_decision"] = relevance
+        if relevance.get("can_answer"):
+            return retrieved, current_start, search_logs, relevance
+        logger.info(f"时间窗 {start_date} ~ {end_date} 不相关，继续下一个时间窗")
+    return retrieved, current_start, search_logs, None
+
+
+def _accepted_retrieval(
+    retrieved: List[Dict],
+    current_start: Optional[str],
+    original_start: Optional[str],
+    search_logs: List[Dict[str, Any]],
+    relevance: Dict[str, Any],
+) -> dict:
+    return {
+        "retrieved": retrieved,
+        "search_expanded": current_start != original_start,
+        "expanded_start_date": current_start if current_start != original_start else None,
+        "original_start_date": original_start,
+        "search_logs": search_logs,
+        "llm_confidence": relevance.get("confidence", "中"),
+        "llm_reason": relevance.get("reason", "")
+    }
 
 
-async def retrieve_node(state: dict, session: AsyncSession) -> dict:
+async def retrieve_node(state: dict, config: RunnableConfig) -> dict:
     """
     混合检索策略：规则过滤 + LLM判断
     
@@ -408,6 +742,7 @@ async def retrieve_node(state: dict, session: AsyncSession) -> dict:
     3. 动态扩展：如果LLM认为不相关，扩大时间范围重试
     4. 上限保护：最多尝试N次，避免无限循环
     """
+    session = _session(config)
     qv = state.get("query_vector")
     query = state.get("query")
     user_id = state["user_id"]
@@ -419,11 +754,11 @@ async def retrieve_node(state: dict, session: AsyncSession) -> dict:
         return {"retrieved": retrieved}
 
     # 获取配置
-    config = _get_retrieval_config(intent)
-    min_results_for_llm = config["min_results_for_llm_check"]
-    expansion_steps = config["time_expansion_steps"]
-    max_attempts = config["max_attempts"]
-    max_time_range = config["max_time_range"]
+    retrieval_config = _get_retrieval_config(intent)
+    min_results_for_llm = retrieval_config["min_results_for_llm_check"]
+    expansion_steps = retrieval_config["time_expansion_steps"]
+    max_attempts = retrieval_config["max_attempts"]
+    max_time_range = retrieval_config["max_time_range"]
     
     original_start = state.get("original_start_date")
     original_end = state.get("original_end_date")
@@ -432,7 +767,23 @@ async def retrieve_node(state: dict, session: AsyncSession) -> dict:
     
     search_logs = []
     attempts = 0
-    
+
+    # 单次取回模式：按最宽时间窗取一次候选，各时间窗在内存中过滤融合，只对选定的时间窗调用LLM判断
+    judged = None
+    if settings.retrieval_expansion_mode == "single_fetch" and original_start and max_attempts > 1:
+        windows = _expansion_windows(original_start, original_end, retrieval_config)
+        ranked_candidates = await _fetch_ranked_candidates(
+            session, qv, query, user_id, windows[-1][0], original_end, settings.retrieval_candidate_limit,
+        )
+        if ranked_candidates is not None:
+            judged = await _judge_windows_in_memory(ranked_candidates, windows, query, intent, min_results_for_llm)
+    if judged is not None:
+        retrieved, current_start, search_logs, relevance = judged
+        if relevance and relevance.get("can_answer"):
+            return _accepted_retrieval(retrieved, current_start, original_start, search_logs, relevance)
+        # 所有时间窗都已评估且不可回答：与迭代检索走到最后一样，直接进入兜底
+        attempts = max_attempts
+
     # 迭代检索 + LLM判断
     while attempts < max_attempts:
         attempts += 1
@@ -479,11 +830,15 @@ async def retrieve_node(state: dict, session: AsyncSession) -> dict:
             
             continue
         
-        # === LLM判断相关性 ===
-        logger.info("结果数足够，调用LLM判断相关性")
-        relevance = await llm_check_relevance(query, retrieved)
-        
-        log_entry["llm_used"] = True
+        # === 本地相似度判断，模糊区间再调用LLM判断相关性 ===
+        relevance = local_relevance_check(retrieved, intent) if settings.relevance_gate_enabled else None
+        if relevance is None:
+            logger.info("结果数足够，调用LLM判断相关性")
+            relevance = await llm_check_relevance(query, retrieved)
+            log_entry["llm_used"] = True
+        else:
+            log_entry["llm_used"] = False
+            log_entry["relevance_source"] = "local"
         log_entry["llm_decision"] = relevance
         search_logs.append(log_entry)
         
@@ -493,15 +848,7 @@ async def retrieve_node(state: dict, session: AsyncSession) -> dict:
         
         # 如果LLM认为可以回答，返回结果
         if relevance.get("can_answer"):
-            return {
-                "retrieved": retrieved,
-                "search_expanded": current_start != original_start,
-                "expanded_start_date": current_start if current_start != original_start else None,
-                "original_start_date": original_start,
-                "search_logs": search_logs,
-                "llm_confidence": relevance.get("confidence", "中"),
-                "llm_reason": relevance.get("reason", "")
-            }
+            return _accepted_retrieval(retrieved, current_start, original_start, search_logs, relevance)
         
         # LLM认为不能回答，扩展时间范围
         logger.info("LLM认为结果不相关，扩展时间范围")
@@ -606,10 +953,7 @@ async def generate_no_rag_node(state: AgentState) -> dict:
         "goals_achieved": latest.get("goals_achieved"),
         "challenges_faced": latest.get("challenges_faced"),
     }
-    llm = get_llm()
-    prompt = build_prompt_no_rag()
-    chain = prompt | llm
-    resp = await chain.ainvoke(payload)
+    resp = await invoke_llm(PROMPT_NO_RAG, payload)
     
     parsed_data = _parse_json_response(resp.content)
     parsed_data = _add_retrieval_context(parsed_data, state)
@@ -622,24 +966,15 @@ async def generate_no_rag_node(state: AgentState) -> dict:
     }
 
 
+def _history_line(r: Dict[str, Any]) -> str:
+    return f"{r.get('record_date')}: {r.get('content') or ''}"
+
+
 async def generate_with_history_node(state: AgentState) -> dict:
     records = state.get("retrieved") or state.get("candidates") or []
-    simplified = [
-        {
-            "record_date": r.get("record_date"),
-            "content": r.get("content"),
-            "mood_score": r.get("mood_score"),
-            "reflections": r.get("reflections"),
-        }
-        for r in records
-    ]
-    history = "\n".join(
-        [f"{r.get('record_date')}: {r.get('content')[:200] if r.get('content') else ''}" for r in simplified]
-    )
-    llm = get_llm()
-    prompt = build_prompt_with_history()
-    chain = prompt | llm
-    resp = await chain.ainvoke({"query": state.get("query", ""), "history": history})
+    packed = pack_records(records, settings.context_budget_rag_tokens, _history_line)
+    history = "\n".join(_history_line(r) for r in packed)
+    resp = await invoke_llm(PROMPT_WITH_HISTORY, {"query": state.get("query", ""), "history": history})
     
     parsed_data = _parse_json_response(resp.content)
     parsed_data = _add_retrieval_context(parsed_data, state)
@@ -0,0 +1,76 @@
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from utils.logger import logger
+
+# 各意图的默认阈值（bge-small-zh 余弦相似度），可由 scripts.calibrate_relevance_gate 校准后覆盖。
+# 校准文件还可给出 min_count：结果数少于它时不在本地判定可回答，交给 LLM。
+# 默认不设：检索节点只在结果数达到 min_results_for_llm_check 后才做相关性判断，更低的下限没有意义
+DEFAULT_THRESHOLDS: Dict[str, Dict[str, float]] = {
+    "today_summary": {"accept": 0.45, "reject": 0.25, "margin_accept": 0.40, "min_margin": 0.08, "high": 0.60},
+    "recent_summary": {"accept": 0.50, "reject": 0.30, "margin_accept": 0.45, "min_margin": 0.08, "high": 0.65},
+    "cross_days_trend": {"accept": 0.50, "reject": 0.30, "margin_accept": 0.45, "min_margin": 0.08, "high": 0.65},
+    "general_qa": {"accept": 0.60, "reject": 0.35, "margin_accept": 0.55, "min_margin": 0.10, "high": 0.70},
+}
+
+
+def load_thresholds(path: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """加载阈值：默认值 + 校准文件（按意图覆盖）"""
+    thresholds = {intent: dict(t) for intent, t in DEFAULT_THRESHOLDS.items()}
+    path = path if path is not None else settings.relevance_thresholds_path
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for intent, t in json.load(f).items():
+                thresholds.setdefault(intent, {}).update(t)
+        logger.info(f"已加载相关性阈值: {path}")
+    return thresholds
+
+
+THRESHOLDS = load_thresholds()
+
+
+def relevance_features(records: List[Dict[str, Any]]) -> Dict[str, float]:
+    """从检索结果中提取打分特征：top-1 相似度、与第二名的差距、结果数"""
+    similarities = sorted(
+        (r["similarity"] for r in records if r.get("similarity") is not None), reverse=True
+    )
+    top1 = similarities[0] if similarities else 0.0
+    top2 = similarities[1] if len(similarities) > 1 else 0.0
+    return {
+        "top1": top1,
+        "margin": top1 - top2,
+        "count": len(records),
+        "scored": len(similarities),
+    }
+
+
+def decide(features: Dict[str, float], t: Dict[str, float]) -> Optional[Dict[str, Any]]:
+    """按阈值判定，返回与 llm_check_relevance 相同结构的结果；处于模糊区间时返回 None"""
+    if not features["scored"]:
+        return None
+    top1, margin = features["top1"], features["margin"]
+    if top1 < t["reject"]:
+        return {
+            "can_answer": False,
+            "confidence": "低",
+            "reason": f"本地判定：最高相似度 {top1:.2f} 低于阈值 {t['reject']:.2f}",
+            "missing_info": "需要与问题更相关的记录",
+        }
+    if features["count"] < t.get("min_count", 0):
+        return None
+    if top1 >= t["accept"] or (top1 >= t["margin_accept"] and margin >= t["min_margin"]):
+        return {
+            "can_answer": True,
+            "confidence": "高" if top1 >= t["high"] else "中",
+            "reason": f"本地判定：最高相似度 {top1:.2f}，领先 {margin:.2f}，共 {int(features['count'])} 条",
+            "missing_info": "",
+        }
+    return None
+
+
+def local_relevance_check(records: List[Dict[str, Any]], intent: str) -> Optional[Dict[str, Any]]:
+    """本地相关性判断：置信时直接返回结果，模糊区间返回 None 交给 LLM 判断"""
+    t = THRESHOLDS.get(intent) or THRESHOLDS["general_qa"]
+    return decide(relevance_features(records), t)
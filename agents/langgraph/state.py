@@ -19,4 +19,8 @@ class AgentState(TypedDict, total=False):
     llm_confidence: Optional[str]
     llm_reason: Optional[str]
     max_attempts_reached: bool
+    speculative_vector: Optional[List[float]]
+    speculative_candidates: Optional[List[Dict[str, Any]]]
+    speculative_start_date: Optional[str]
+    speculative_end_date: Optional[str]
 
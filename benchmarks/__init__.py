@@ -0,0 +1 @@
+"""检索链路基准测试：合成日记语料生成、装载到 Postgres/pgvector，并测量各索引配置下的延迟与召回率"""
@@ -0,0 +1,138 @@
+"""合成多用户日记语料
+
+每条记录属于一个主题：正文由主题模板拼出，向量为主题中心加高斯噪声后归一化，
+因此向量检索与全文检索都有可衡量的"正确答案"。按用户流式生成，千万级规模也不会一次性占满内存。
+"""
+import random
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+from models.daily_record import VECTOR_DIM
+
+TOPICS = {
+    "工作": ["写周报", "开项目评审会", "修复线上问题", "和同事对需求", "整理技术文档"],
+    "学习": ["读技术书籍", "学习英语单词", "看公开课视频", "刷算法题", "写读书笔记"],
+    "运动": ["晨跑五公里", "去健身房练腿", "游泳一小时", "骑车上班", "做拉伸瑜伽"],
+    "家庭": ["陪父母吃饭", "带孩子去公园", "给家里打电话", "打扫房间", "和伴侣散步"],
+    "情绪": ["心情有点低落", "感觉很焦虑", "今天特别开心", "压力比较大", "内心很平静"],
+    "睡眠": ["失眠到凌晨", "睡了一个好觉", "午睡半小时", "早起看日出", "熬夜追剧"],
+    "娱乐": ["看了一部电影", "和朋友打游戏", "去听演唱会", "逛街买衣服", "玩桌游"],
+    "饮食": ["自己做晚饭", "吃火锅", "尝试轻断食", "喝了太多咖啡", "吃了很多零食"],
+}
+TOPIC_NAMES = list(TOPICS)
+
+
+@dataclass
+class SyntheticRecord:
+    id: int
+    user_id: int
+    record_date: str
+    topic: str
+    content: str
+    reflections: Optional[str]
+    mood_score: int
+
+
+@dataclass
+class SyntheticQuery:
+    user_id: int
+    topic: str
+    query: str
+    vector: List[float]
+    start_date: Optional[str]
+    end_date: Optional[str]
+
+
+class CorpusGenerator:
+    """按固定随机种子生成可复现的语料与查询"""
+
+    def __init__(
+        self,
+        num_records: int,
+        num_users: int,
+        days: int = 730,
+        noise: float = 0.6,
+        seed: int = 42,
+        end_date: Optional[date] = None,
+    ):
+        self.num_records = num_records
+        self.num_users = num_users
+        self.days = days
+        self.noise = noise
+        self.seed = seed
+        self.end_date = end_date or date.today()
+        rng = np.random.default_rng(seed)
+        centroids = rng.normal(size=(len(TOPIC_NAMES), VECTOR_DIM)).astype(np.float32)
+        self.centroids = centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+
+    def _user_sizes(self) -> List[int]:
+        """记录数按用户长尾分布（少数重度用户、多数轻度用户）"""
+        rng = np.random.default_rng(self.seed + 1)
+        weights = rng.pareto(1.5, size=self.num_users) + 1
+        sizes = np.floor(weights / weights.sum() * self.num_records).astype(int)
+        sizes[: self.num_records - sizes.sum()] += 1
+        return sizes.tolist()
+
+    def _vectors(self, rng: np.random.Generator, topic_ids: np.ndarray) -> np.ndarray:
+        noise = rng.normal(scale=self.noise / np.sqrt(VECTOR_DIM), size=(len(topic_ids), VECTOR_DIM))
+        vectors = self.centroids[topic_ids] + noise.astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def records(self, chunk_size: int = 10000) -> Iterator[tuple]:
+        """流式产出 (records, vectors) 分块"""
+        rng = np.random.default_rng(self.seed + 2)
+        text_rng = random.Random(self.seed + 3)
+        next_id = 1
+        chunk: List[SyntheticRecord] = []
+        topic_ids: List[int] = []
+        for user_index, size in enumerate(self._user_sizes()):
+            if size == 0:
+                continue
+            user_id = user_index + 1
+            # 每个用户有自己的活跃区间，记录日期在区间内随机分布（允许同一天多条）
+            active_days = text_rng.randint(min(30, self.days), self.days)
+            start = self.end_date - timedelta(days=active_days)
+            for _ in range(size):
+                topic_id = text_rng.randrange(len(TOPIC_NAMES))
+                topic = TOPIC_NAMES[topic_id]
+                activities = text_rng.sample(TOPICS[topic], 2)
+                other = TOPICS[TOPIC_NAMES[text_rng.randrange(len(TOPIC_NAMES))]]
+                chunk.append(SyntheticRecord(
+                    id=next_id,
+                    user_id=user_id,
+                    record_date=(start + timedelta(days=text_rng.randint(0, active_days))).strftime("%Y-%m-%d"),
+                    topic=topic,
+                    content=f"今天{activities[0]}，后来{activities[1]}，顺便{text_rng.choice(other)}。",
+                    reflections=f"关于{topic}的一点感想" if text_rng.random() < 0.5 else None,
+                    mood_score=text_rng.randint(1, 10),
+                ))
+                topic_ids.append(topic_id)
+                next_id += 1
+                if len(chunk) >= chunk_size:
+                    yield chunk, self._vectors(rng, np.asarray(topic_ids))
+                    chunk, topic_ids = [], []
+        if chunk:
+            yield chunk, self._vectors(rng, np.asarray(topic_ids))
+
+    def queries(self, count: int) -> List[SyntheticQuery]:
+        rng = np.random.default_rng(self.seed + 4)
+        text_rng = random.Random(self.seed + 5)
+        sizes = self._user_sizes()
+        users = [i + 1 for i, size in enumerate(sizes) if size > 0]
+        windows = [7, 30, 90, 365, None]
+        queries = []
+        for _ in range(count):
+            topic_id = text_rng.randrange(len(TOPIC_NAMES))
+            window = text_rng.choice(windows)
+            queries.append(SyntheticQuery(
+                user_id=text_rng.choice(users),
+                topic=TOPIC_NAMES[topic_id],
+                query=f"最近{text_rng.choice(TOPICS[TOPIC_NAMES[topic_id]])}的情况",
+                vector=self._vectors(rng, np.asarray([topic_id]))[0].tolist(),
+                start_date=(self.end_date - timedelta(days=window)).strftime("%Y-%m-%d") if window else None,
+                end_date=self.end_date.strftime("%Y-%m-%d"),
+            ))
+        return queries
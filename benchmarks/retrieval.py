@@ -0,0 +1,362 @@
+"""检索基准测试：合成语料装载 + 各索引配置下向量 / FTS / 融合检索的延迟与 recall@k
+
+用法：
+    python -m benchmarks.retrieval load --database-url postgresql+asyncpg://.../bench --records 100000 --users 500
+    python -m benchmarks.retrieval run  --database-url postgresql+asyncpg://.../bench --records 100000 --users 500 \\
+        --queries 200 --output bench_retrieval.json
+    python -m benchmarks.retrieval run ... --configs my_configs.json --baseline bench_retrieval.json
+
+会清空目标库的 users / daily_records，请使用独立的基准库。
+load 与 run 的 --records/--users/--seed 需一致，查询集才会落在装载的语料上。
+
+召回率以 "exact" 配置（无向量索引，全精度精确排序）的结果为基准；
+检索 SQL 直接复用 agents.langgraph.nodes 中线上使用的构造函数。
+"""
+import argparse
+import asyncio
+import json
+import math
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from agents.langgraph.nodes import (
+    RRF_K,
+    _fts_search_sql,
+    _hybrid_search_sql,
+    _search_params,
+    _vector_search_sql,
+)
+from benchmarks.corpus import CorpusGenerator, SyntheticQuery
+from config import settings
+from models._base import Base
+from models.daily_record import COMPACT_STORAGE, VECTOR_DIM
+from service.text_search import to_search_document
+from utils.logger import logger
+
+MODES = ("vector", "fts", "fused")
+
+# 表上可能存在的全部向量索引：装载前删除，每个配置只保留自己需要的那一个
+VECTOR_INDEX_NAMES = (
+    "idx_daily_records_vector",
+    "idx_daily_records_vector_hnsw",
+    "idx_daily_records_vector_ivfflat",
+    "idx_daily_records_vector_half",
+    "idx_daily_records_vector_bits",
+)
+
+STORAGE_COLUMNS = {
+    "full": ("vector", "vector_cosine_ops"),
+    **{mode: (storage.column, storage.ops) for mode, storage in COMPACT_STORAGE.items()},
+}
+
+
+def default_configs(num_records: int) -> List[Dict[str, Any]]:
+    """默认索引配置网格：exact 必须排第一，作为召回率基准"""
+    lists = max(1, int(math.sqrt(num_records)))
+    hnsw_build = {"m": settings.hnsw_m, "ef_construction": settings.hnsw_ef_construction}
+    configs = [{"name": "exact", "type": "none", "storage": "full"}]
+    for ef_search in (40, 100, 200):
+        configs.append({
+            "name": f"hnsw_ef{ef_search}", "type": "hnsw", "storage": "full", "build": hnsw_build,
+            "search": {"hnsw.ef_search": ef_search, "hnsw.iterative_scan": "relaxed_order"},
+        })
+    for probes in sorted({1, min(10, lists), max(1, int(math.sqrt(lists)))}):
+        configs.append({
+            "name": f"ivfflat_p{probes}", "type": "ivfflat", "storage": "full", "build": {"lists": lists},
+            "search": {"ivfflat.probes": probes, "ivfflat.iterative_scan": "relaxed_order"},
+        })
+    for storage in ("halfvec", "binary"):
+        configs.append({
+            "name": f"hnsw_{storage}", "type": "hnsw", "storage": storage, "build": hnsw_build,
+            "search": {"hnsw.ef_search": settings.hnsw_ef_search, "hnsw.iterative_scan": "relaxed_order"},
+        })
+    return configs
+
+
+async def _asyncpg_connection(conn: AsyncConnection):
+    from pgvector.asyncpg import register_vector
+
+    raw = await conn.get_raw_connection()
+    driver_conn = raw.driver_connection
+    await register_vector(driver_conn)
+    return driver_conn
+
+
+async def load_corpus(engine, corpus: CorpusGenerator, chunk_size: int = 10000) -> Dict[str, Any]:
+    """清空并装载合成语料：COPY 到临时表，再一条 INSERT ... SELECT 派生紧凑列和 search_vector"""
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await conn.run_sync(Base.metadata.create_all)
+        # 模型只声明当前存储模式的紧凑列；基准要比较所有模式，两种紧凑列都补上
+        for storage in COMPACT_STORAGE.values():
+            await conn.execute(text(f"ALTER TABLE daily_records ADD COLUMN IF NOT EXISTS {storage.column} {storage.sql_type}"))
+        await conn.execute(text("TRUNCATE users, daily_records RESTART IDENTITY CASCADE"))
+        for name in VECTOR_INDEX_NAMES:
+            await conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        await conn.execute(text("DROP TABLE IF EXISTS bench_staging"))
+        await conn.execute(text(f"""
+            CREATE UNLOGGED TABLE bench_staging (
+                id integer, user_id integer, record_date varchar(10), content text,
+                mood_score integer, reflections text, vector vector({VECTOR_DIM}), doc text
+            )
+        """))
+
+    loaded = 0
+    async with engine.begin() as conn:
+        driver_conn = await _asyncpg_connection(conn)
+        await driver_conn.copy_records_to_table(
+            "users",
+            records=[(i + 1, f"bench_user_{i + 1}") for i in range(corpus.num_users)],
+            columns=["id", "username"],
+        )
+        for records, vectors in corpus.records(chunk_size):
+            rows = [
+                (r.id, r.user_id, r.record_date, r.content, r.mood_score, r.reflections,
+                 vectors[i], to_search_document(r.content, r.reflections))
+                for i, r in enumerate(records)
+            ]
+            await driver_conn.copy_records_to_table("bench_staging", records=rows)
+            await conn.execute(text(f"""
+                INSERT INTO daily_records
+                    (id, user_id, record_date, content, mood_score, reflections,
+                     vector, vector_half, vector_bits, search_vector, created_at, updated_at)
+                SELECT id, user_id, record_date, content, mood_score, reflections,
+                       vector, vector::halfvec({VECTOR_DIM}), binary_quantize(vector)::bit({VECTOR_DIM}),
+                       to_tsvector('simple', doc), now(), now()
+                FROM bench_staging
+            """))
+            await conn.execute(text("TRUNCATE bench_staging"))
+            loaded += len(rows)
+            logger.info(f"已装载 {loaded}/{corpus.num_records} 条记录")
+        await conn.execute(text("DROP TABLE bench_staging"))
+        await conn.execute(text("SELECT setval(pg_get_serial_sequence('users', 'id'), (SELECT max(id) FROM users))"))
+        await conn.execute(text(
+            "SELECT setval(pg_get_serial_sequence('daily_records', 'id'), (SELECT max(id) FROM daily_records))"
+        ))
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM ANALYZE daily_records"))
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"装载完成: {loaded} 条, 耗时 {elapsed:.1f}s")
+    return {"records": loaded, "seconds": round(elapsed, 2)}
+
+
+async def build_index(engine, config: Dict[str, Any]) -> float:
+    """删除现有向量索引并按配置重建，返回建索引耗时（秒）"""
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        for name in VECTOR_INDEX_NAMES:
+            await conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        if config["type"] != "none":
+            column, ops = STORAGE_COLUMNS[config["storage"]]
+            # 紧凑存储只有 HNSW 索引（与 models.daily_record 一致）
+            using = config["type"] if config["storage"] == "full" else "hnsw"
+            name = f"idx_daily_records_vector_{using}" if column == "vector" else f"idx_daily_records_{column}"
+            build = ", ".join(f"{k} = {int(v)}" for k, v in (config.get("build") or {}).items())
+            with_sql = f" WITH ({build})" if build else ""
+            await conn.execute(text(f"CREATE INDEX {name} ON daily_records USING {using} ({column} {ops}){with_sql}"))
+        await conn.execute(text("ANALYZE daily_records"))
+    return time.perf_counter() - started
+
+
+def _mode_sql(mode: str, where_sql: str, with_fts: bool) -> Optional[str]:
+    if mode == "vector":
+        return _vector_search_sql(where_sql + " AND vector IS NOT NULL")
+    if mode == "fts":
+        return _fts_search_sql(where_sql) if with_fts else None
+    return _hybrid_search_sql(where_sql, with_fts)
+
+
+async def _run_mode(
+    conn: AsyncConnection, mode: str, queries: List[SyntheticQuery], top_k: int, warmup: int
+) -> tuple:
+    """执行一组查询，返回 (每条查询的 id 列表, 延迟毫秒列表)"""
+    ids: List[Optional[List[int]]] = []
+    latencies: List[float] = []
+    for i, q in enumerate(queries):
+        where_sql, params, with_fts = _search_params(q.vector, q.query, q.user_id, q.start_date, q.end_date, top_k)
+        params["rrf_k"] = RRF_K
+        sql = _mode_sql(mode, where_sql, with_fts)
+        if sql is None:
+            ids.append(None)
+            continue
+        statement = text(sql)
+        if i < warmup:
+            await conn.execute(statement, params)
+        started = time.perf_counter()
+        result = await conn.execute(statement, params)
+        rows = result.fetchall()
+        latencies.append((time.perf_counter() - started) * 1000)
+        ids.append([r.id for r in rows])
+    return ids, latencies
+
+
+def _recall(results: List[Optional[List[int]]], truth: List[Optional[List[int]]]) -> Optional[float]:
+    scores = [
+        len(set(got) & set(expected)) / len(expected)
+        for got, expected in zip(results, truth)
+        if got is not None and expected
+    ]
+    return round(float(np.mean(scores)), 4) if scores else None
+
+
+def _latency_summary(latencies: List[float]) -> Dict[str, Any]:
+    if not latencies:
+        return {"count": 0}
+    values = np.asarray(latencies)
+    return {
+        "count": len(latencies),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+async def run_benchmark(
+    engine,
+    queries: List[SyntheticQuery],
+    configs: List[Dict[str, Any]],
+    top_k: int,
+    warmup: int,
+) -> List[Dict[str, Any]]:
+    if configs[0]["type"] != "none" or configs[0].get("storage", "full") != "full":
+        raise ValueError("第一个配置必须是无索引、全精度的 exact 配置（召回率基准）")
+
+    original_storage = settings.vector_storage_mode
+    truth: Dict[str, List[Optional[List[int]]]] = {}
+    results = []
+    built_key = None
+    try:
+        for config in configs:
+            key = (config["type"], config.get("storage", "full"), json.dumps(config.get("build"), sort_keys=True))
+            build_seconds = None
+            if key != built_key:
+                build_seconds = round(await build_index(engine, config), 2)
+                built_key = key
+            # SQL 构造函数按 vector_storage_mode 选择检索列
+            settings.vector_storage_mode = config.get("storage", "full")
+            async with engine.connect() as conn:
+                for name, value in (config.get("search") or {}).items():
+                    await conn.execute(text(f"SET {name} = '{value}'"))
+                for mode in MODES:
+                    ids, latencies = await _run_mode(conn, mode, queries, top_k, warmup)
+                    if config is configs[0]:
+                        truth[mode] = ids
+                    entry = {
+                        "config": config["name"],
+                        "mode": mode,
+                        "index_build_seconds": build_seconds,
+                        **_latency_summary(latencies),
+                        f"recall_at_{top_k}": _recall(ids, truth[mode]),
+                    }
+                    results.append(entry)
+                    logger.info(
+                        f"[{config['name']}/{mode}] p50={entry.get('p50_ms')}ms p95={entry.get('p95_ms')}ms "
+                        f"recall@{top_k}={entry[f'recall_at_{top_k}']}"
+                    )
+    finally:
+        settings.vector_storage_mode = original_storage
+    return results
+
+
+def compare_with_baseline(results: List[Dict[str, Any]], baseline: Dict[str, Any], top_k: int) -> List[Dict[str, Any]]:
+    """与历史结果对比，返回 p95 变慢超过 20% 或召回率下降的条目"""
+    recall_key = f"recall_at_{top_k}"
+    previous = {(r["config"], r["mode"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for r in results:
+        old = previous.get((r["config"], r["mode"]))
+        if not old or not r.get("count") or not old.get("count"):
+            continue
+        slower = r["p95_ms"] > old["p95_ms"] * 1.2
+        worse_recall = (
+            r.get(recall_key) is not None and old.get(recall_key) is not None
+            and r[recall_key] < old[recall_key] - 0.01
+        )
+        if slower or worse_recall:
+            regressions.append({
+                "config": r["config"],
+                "mode": r["mode"],
+                "p95_ms": [old["p95_ms"], r["p95_ms"]],
+                recall_key: [old.get(recall_key), r.get(recall_key)],
+            })
+    return regressions
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args):
+    engine = create_async_engine(args.database_url)
+    corpus = CorpusGenerator(args.records, args.users, days=args.days, seed=args.seed)
+    meta = {
+        "records": args.records,
+        "users": args.users,
+        "days": args.days,
+        "seed": args.seed,
+        "git_revision": _git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+    try:
+        if args.command == "load":
+            meta["load"] = await load_corpus(engine, corpus, args.chunk_size)
+            print(json.dumps(meta, ensure_ascii=False, indent=2))
+            return
+
+        if args.configs:
+            with open(args.configs, "r", encoding="utf-8") as f:
+                configs = json.load(f)
+        else:
+            configs = default_configs(args.records)
+        queries = corpus.queries(args.queries)
+        meta.update({"queries": len(queries), "top_k": args.top_k})
+        report = {
+            "meta": meta,
+            "results": await run_benchmark(engine, queries, configs, args.top_k, args.warmup),
+        }
+        if args.baseline:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                report["regressions"] = compare_with_baseline(report["results"], json.load(f), args.top_k)
+            for r in report["regressions"]:
+                logger.warning(f"性能回退: {r}")
+
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(output)
+        print(output)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="检索基准测试（合成语料）")
+    parser.add_argument("command", choices=["load", "run"])
+    parser.add_argument("--database-url", required=True, help="基准库连接串（会清空 users/daily_records）")
+    parser.add_argument("--records", type=int, default=100_000, help="语料规模，1k ~ 10M")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--days", type=int, default=730, help="记录日期分布的最大天数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=10, help="前 N 条查询先预热执行一次")
+    parser.add_argument("--configs", default=None, help="索引配置 JSON 文件，默认使用内置网格")
+    parser.add_argument("--baseline", default=None, help="上一次的结果 JSON，用于标出回退")
+    parser.add_argument("--output", default=None)
+    asyncio.run(main(parser.parse_args()))
@@ -6,7 +6,85 @@ class Settings(BaseSettings):
     llm_api_key: str
     llm_base_url: str
     llm_model_name: str
+    # LLM HTTP 连接池：所有 LLM 调用共用 keep-alive 连接，服务端支持时使用 HTTP/2
+    llm_http2: bool = True
+    llm_max_connections: int = 20
+    llm_max_keepalive_connections: int = 10
+    llm_keepalive_expiry_seconds: float = 60.0
+    llm_timeout_seconds: float = 60.0
+    llm_connect_timeout_seconds: float = 5.0
+    # LLM 调度：并发上限、按模型的每分钟请求数 / token 数限流（0 表示不限）、重试退避
+    llm_max_concurrency: int = 8
+    llm_max_concurrency_per_model: int = 4
+    llm_requests_per_minute: float = 0
+    llm_tokens_per_minute: float = 0
+    llm_max_retries: int = 3
+    llm_retry_base_delay_seconds: float = 1.0
+    llm_retry_max_delay_seconds: float = 20.0
+    # LLM 回答缓存：内存 LRU + 可选 SQLite 磁盘层；只用于内容抽取、记录总结与意图分类
+    llm_cache_enabled: bool = True
+    llm_cache_size: int = 2000
+    llm_cache_path: str = ""  # 为空时不启用磁盘缓存
+    llm_cache_analyze_ttl_seconds: float = 604800
+    llm_cache_summary_ttl_seconds: float = 86400
+    llm_cache_intent_ttl_seconds: float = 86400
     sqlite_url: str
     postgres_url: str
-settings = Settings()
 
+    # Embedding 模型配置
+    embedding_model_name: str = "BAAI/bge-small-zh-v1.5"
+    embedding_warmup: bool = True
+    embedding_backend: str = "torch"  # torch | torch_int8 | onnx
+    embedding_onnx_file: str = ""  # 如 onnx/model_qint8_avx512_vnni.onnx，为空时使用 onnx/model.onnx
+    embedding_batch_max_size: int = 32
+    embedding_batch_max_wait_ms: float = 5.0
+    embedding_executor: str = "thread"  # thread | process
+    embedding_executor_workers: int = 1
+    embedding_torch_threads: int = 0  # 0 表示使用 torch 默认值
+    embedding_cache_size: int = 10000
+    embedding_cache_path: str = ""  # 为空时不启用磁盘缓存
+    # 向量存储：full 只用全精度列；halfvec / binary 先用紧凑列预筛候选，再用全精度向量精确重排
+    vector_storage_mode: str = "full"
+    vector_candidate_multiplier: int = 10
+    # 向量索引：ivfflat | hnsw；iterative_scan: relaxed_order | strict_order | off
+    # iterative_scan 作为连接参数下发，需要 pgvector >= 0.8，旧版本不支持该参数，因此默认关闭
+    vector_index_type: str = "hnsw"
+    vector_iterative_scan: str = "off"
+    hnsw_m: int = 16
+    hnsw_ef_construction: int = 64
+    hnsw_ef_search: int = 100
+    ivfflat_lists: int = 100
+    ivfflat_probes: int = 10
+    # 检索时间窗扩展：single_fetch 按最宽时间窗取一次候选后在内存中逐级过滤；iterative 每次扩展都查询数据库
+    retrieval_expansion_mode: str = "single_fetch"
+    retrieval_candidate_limit: int = 200
+    # 意图分类的同时预先计算查询向量、预取 RAG 最宽时间窗的候选，只在走 RAG 分支时使用。
+    # 每次推测多一次预取查询和一次 embedding，因此只对关键词规则判为 RAG 意图的问题执行
+    agent_speculative_prefetch: bool = True
+    # 进程内按用户的向量索引：记录数不超过上限的用户向量检索不再访问 pgvector
+    user_vector_index_enabled: bool = False
+    user_vector_index_budget_mb: int = 256
+    user_vector_index_max_records: int = 20000
+    user_vector_index_snapshot_dir: str = ""
+    # 上下文打包：各类提示中历史记录的 token 预算、单条记录上限、排序时新近程度的权重
+    context_budget_rag_tokens: int = 1500
+    context_budget_summary_tokens: int = 3000
+    context_record_max_tokens: int = 300
+    context_recency_weight: float = 0.3
+    # agent 回答语义缓存（进程内）：同一用户相似问题在数据未变化、TTL 内直接返回
+    answer_cache_enabled: bool = True
+    answer_cache_similarity: float = 0.95
+    answer_cache_ttl_seconds: float = 600
+    answer_cache_max_entries: int = 5000
+    answer_cache_max_entries_per_user: int = 50
+    # 本地意图分类：置信度达到阈值时不调用LLM
+    intent_local_enabled: bool = True
+    intent_local_threshold: float = 0.8
+    intent_examples_path: str = ""
+    # 本地相关性判断：只有处于模糊区间时才调用LLM判断
+    relevance_gate_enabled: bool = True
+    relevance_thresholds_path: str = ""
+    # 模型迁移期间的向量双写：新模型向量同时写入该列
+    embedding_dual_write_column: str = ""
+    embedding_dual_write_model: str = ""
+settings = Settings()
@@ -1,11 +1,61 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import and_, desc, select
+from sqlalchemy import and_, desc, func, select, text
+from sqlalchemy.orm import load_only
 from datetime import datetime, date, timezone
-from typing import List, Optional
+from typing import List, Optional, Sequence
 import json
+import re
+from config import settings
 from schemas.record import DailyRecordCreate, DailyRecordUpdate
 from models.daily_record import DailyRecord
-from service.embedding import generate_vectors
+from service.embedding_batcher import generate_vectors_async, generate_vectors_for_model
+from service.text_search import to_search_document
+from service.answer_cache import answer_cache
+from service.user_vector_index import user_vector_index
+
+# 列表接口只渲染这些列（向量列在模型上已延迟加载，这里再去掉各 JSON 活动列）
+LIST_COLUMNS = (
+    DailyRecord.id,
+    DailyRecord.user_id,
+    DailyRecord.record_date,
+    DailyRecord.content,
+    DailyRecord.mood_score,
+    DailyRecord.created_at,
+)
+
+_COLUMN_NAME = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+def checked_vector_column(column: str) -> str:
+    """校验向量列名（列名会直接拼入 SQL）"""
+    if not _COLUMN_NAME.match(column or ""):
+        raise ValueError(f"非法的向量列名: {column}")
+    return column
+
+
+def to_vector_literal(vector: List[float]) -> str:
+    """转换为 pgvector 文本格式"""
+    return "[" + ",".join(map(str, vector)) + "]"
+
+
+def _set_search_vector(db_record: DailyRecord) -> None:
+    """写入时生成全文检索向量（中文按二元组分词后交给 simple 配置）"""
+    db_record.search_vector = func.to_tsvector(
+        "simple", to_search_document(db_record.content, db_record.reflections)
+    )
+
+
+async def _dual_write_vector(db: AsyncSession, record_id: int, content: Optional[str]) -> None:
+    """模型迁移期间，把新模型的向量同时写入迁移列"""
+    column = settings.embedding_dual_write_column
+    if not column:
+        return
+    column = checked_vector_column(column)
+    vectors = await generate_vectors_for_model([content or ""], settings.embedding_dual_write_model or None)
+    await db.execute(
+        text(f"UPDATE daily_records SET {column} = CAST(:vector AS vector) WHERE id = :id"),
+        {"vector": to_vector_literal(vectors[0]) if vectors[0] else None, "id": record_id},
+    )
 
 class DailyRecordCRUD:
     @staticmethod
@@ -20,8 +70,10 @@ class DailyRecordCRUD:
             content=record.content,
             mood_score=record.mood_score,
             reflections=record.reflections,
-            vector=generate_vectors(record.content)
         )
+        vector = await generate_vectors_async(record.content)
+        db_record.set_vector(vector, settings.vector_storage_mode)
+        _set_search_vector(db_record)
         
         # 设置活动数据
         if record.work_activities:
@@ -38,23 +90,32 @@ class DailyRecordCRUD:
             db_record.challenges_faced = json.dumps(record.challenges_faced, ensure_ascii=False)
         
         db.add(db_record)
+        await db.flush()
+        await _dual_write_vector(db, db_record.id, db_record.content)
         await db.commit()
         await db.refresh(db_record)
+        user_vector_index.on_upsert(user_id, db_record.id, db_record.record_date, vector)
+        answer_cache.bump_version(user_id)
         return db_record
     
     @staticmethod
-    async def get_daily_record(db: AsyncSession, user_id: int, record_date: str) -> Optional[DailyRecord]:
-        result = await db.execute(
-            select(DailyRecord).filter(
-                and_(DailyRecord.user_id == user_id, DailyRecord.record_date == record_date)
-            )
+    async def get_daily_record(
+        db: AsyncSession, user_id: int, record_date: str, columns: Optional[Sequence] = None
+    ) -> Optional[DailyRecord]:
+        """columns 指定时只加载这些列（其余列访问会报错），默认加载除向量外的全部列"""
+        stmt = select(DailyRecord).filter(
+            and_(DailyRecord.user_id == user_id, DailyRecord.record_date == record_date)
         )
+        if columns:
+            stmt = stmt.options(load_only(*columns, raiseload=True))
+        result = await db.execute(stmt)
         return result.scalars().first()
     
     @staticmethod
     async def get_user_records(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 30) -> List[DailyRecord]:
         result = await db.execute(
-            select(DailyRecord).filter(DailyRecord.user_id == user_id)
+            select(DailyRecord).options(load_only(*LIST_COLUMNS, raiseload=True))
+            .filter(DailyRecord.user_id == user_id)
             .order_by(desc(DailyRecord.record_date)).offset(skip).limit(limit)
         )
         return result.scalars().all()
@@ -79,9 +140,20 @@ class DailyRecordCRUD:
             else:
                 setattr(db_record, field, value)
         
+        if "content" in update_data:
+            # 内容未变化时向量直接命中 embedding 缓存
+            vector = await generate_vectors_async(db_record.content)
+            db_record.set_vector(vector, settings.vector_storage_mode)
+            await _dual_write_vector(db, db_record.id, db_record.content)
+        if "content" in update_data or "reflections" in update_data:
+            _set_search_vector(db_record)
+
         db_record.updated_at = datetime.now(timezone.utc)
         await db.commit()
         await db.refresh(db_record)
+        if "content" in update_data:
+            user_vector_index.on_upsert(user_id, db_record.id, db_record.record_date, vector)
+        answer_cache.bump_version(user_id)
         return db_record
     
     @staticmethod
@@ -96,5 +168,7 @@ class DailyRecordCRUD:
         if db_record:
             await db.delete(db_record)
             await db.commit()
+            user_vector_index.on_delete(user_id, db_record.id)
+            answer_cache.bump_version(user_id)
             return True
         return False
\ No newline at end of file
@@ -7,29 +7,43 @@ from models.daily_record import DailyRecord
 from models.ai_data import AISummary
 from service.llm import ai_service
 from datetime import timedelta
+
+HISTORY_COLUMNS = (
+    DailyRecord.record_date,
+    DailyRecord.content,
+    DailyRecord.mood_score,
+    DailyRecord.reflections,
+    DailyRecord.work_activities,
+    DailyRecord.personal_activities,
+    DailyRecord.learning_activities,
+    DailyRecord.health_activities,
+    DailyRecord.goals_achieved,
+    DailyRecord.challenges_faced,
+)
+
+
 class AISummaryCRUD:
 
 
-    async def generate_ai_summary_task(db: AsyncSession, user_id: int, daily_record_id: int):
-        """生成AI总结的后台任务"""
+    async def generate_ai_summary_task(db: AsyncSession, user_id: int, daily_record_id: int, bypass_cache: bool = False):
+        """生成AI总结的后台任务；bypass_cache 为 True 时不使用缓存的 LLM 回答"""
         try:
             # 获取记录数据
             # 修改查询方式为异步
-            result = await db.execute(select(DailyRecord).filter(DailyRecord.id == daily_record_id))
-            record = result.scalars().first()
+            result = await db.execute(select(DailyRecord.record_date).filter(DailyRecord.id == daily_record_id))
+            current_date_str = result.scalar_one_or_none()
 
-            if not record:
+            if not current_date_str:
                 return
-            current_date_str = record.record_date
             current_date = datetime.strptime(current_date_str, '%Y-%m-%d').date()
             
             # 计算3天前的日期
             start_date = current_date - timedelta(days=3)
             start_date_str = start_date.strftime('%Y-%m-%d')
             
-            # 查询历史记录（字符串比较）
+            # 查询历史记录（字符串比较），只取生成总结用到的列
             result = await db.execute(
-                select(DailyRecord)
+                select(*HISTORY_COLUMNS)
                 .filter(
                     DailyRecord.user_id == user_id,
                     DailyRecord.record_date >= start_date_str,  # 字符串比较
@@ -37,7 +51,7 @@ class AISummaryCRUD:
                 )
                 .order_by(DailyRecord.record_date.asc())
             )
-            historical_records = result.scalars().all()
+            historical_records = result.all()
             records_data = []
             for record in historical_records:
                 record_data = {
@@ -57,7 +71,7 @@ class AISummaryCRUD:
 
             
             # 生成AI总结
-            summary_data = await ai_service.generate_daily_summary_with_history(records_data)
+            summary_data = await ai_service.generate_daily_summary_with_history(records_data, bypass_cache=bypass_cache)
             
 
             await AISummaryCRUD.create_ai_summary(db, user_id, daily_record_id, summary_data)
@@ -67,9 +81,8 @@ class AISummaryCRUD:
 
     @staticmethod
     async def create_ai_summary(db: AsyncSession, user_id: int, daily_record_id: int, summary_data: dict) -> AISummary:
-        result = await db.execute(select(DailyRecord).filter(DailyRecord.id == daily_record_id))
-        record = result.scalars().first()
-        if not record:
+        result = await db.execute(select(DailyRecord.id).filter(DailyRecord.id == daily_record_id))
+        if result.scalar_one_or_none() is None:
             raise ValueError("日记录不存在")
         
         # # 检查是否已存在AI总结
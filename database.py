@@ -1,23 +1,74 @@
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker 
 from models._base import Base
 from config import settings
 from models.ai_data import AISummary,AIAnalysisLog
-from models.daily_record import DailyRecord
+from models.daily_record import DailyRecord, compact_storage
 from models.task_template import TaskTemplate
 from models.user import User, UserSettings
+from utils.logger import logger
+from utils.tracing import instrument_engine
 
 
 
 
 DATABASE_URL = settings.postgres_url
-async_engine = create_async_engine(DATABASE_URL)
+
+
+def _vector_search_settings() -> dict:
+    """pgvector 查询参数，在建立连接时一次性设置，不占用每次查询的往返"""
+    if settings.vector_index_type == "hnsw":
+        server_settings = {"hnsw.ef_search": str(settings.hnsw_ef_search)}
+        if settings.vector_iterative_scan != "off":
+            # 迭代扫描：过滤后结果不足 top_k 时继续扫描索引，避免按用户/日期过滤后返回过少
+            server_settings["hnsw.iterative_scan"] = settings.vector_iterative_scan
+    else:
+        server_settings = {"ivfflat.probes": str(settings.ivfflat_probes)}
+        if settings.vector_iterative_scan != "off":
+            # ivfflat 只支持 relaxed_order
+            server_settings["ivfflat.iterative_scan"] = "relaxed_order"
+    return server_settings
+
+
+connect_args = {"server_settings": _vector_search_settings()} if DATABASE_URL.startswith("postgresql+asyncpg") else {}
+async_engine = create_async_engine(DATABASE_URL, connect_args=connect_args)
+# 每条语句的执行时间计入当前追踪 span（agent 节点 / 检索尝试）
+instrument_engine(async_engine.sync_engine)
 async_session_maker = sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
 
 
+async def _upgrade_daily_records(conn):
+    """create_all 不会修改已存在的表，这里补齐 daily_records 后加的列（只改元数据，不重写表）"""
+    # 紧凑列只在对应的存储模式下添加（halfvec 需要 pgvector >= 0.7），full 模式不依赖它们
+    storage = compact_storage()
+    if storage is not None:
+        await conn.execute(text(f"ALTER TABLE daily_records ADD COLUMN IF NOT EXISTS {storage.column} {storage.sql_type}"))
+    await conn.execute(text("ALTER TABLE daily_records ADD COLUMN IF NOT EXISTS search_vector tsvector"))
+
+
+async def _check_daily_record_indexes(conn):
+    """已有表上的索引不在启动时创建或切换（大表上会长时间锁表），缺少时提示运行管理脚本"""
+    result = await conn.execute(text("""
+        SELECT c.relname
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = 'daily_records'::regclass AND i.indisvalid
+    """))
+    existing = set(result.scalars().all())
+    missing = sorted(index.name for index in DailyRecord.__table__.indexes if index.name not in existing)
+    if missing:
+        logger.warning(
+            f"daily_records 缺少索引 {missing}，请运行 python -m scripts.manage_vector_indexes 并发创建"
+        )
+
+
 async def create_db_and_tables():
+    # 新建的表由 create_all 一并建好索引；已有表的索引变更交给 scripts.manage_vector_indexes
     async with async_engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await _upgrade_daily_records(conn)
+    async with async_engine.connect() as conn:
+        await _check_daily_record_indexes(conn)
 
 
 async def get_async_session():
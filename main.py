@@ -5,7 +5,11 @@ import uvicorn
 from database import create_db_and_tables
 from contextlib import asynccontextmanager
 from utils.logger import logger, InterceptHandler
-from service.embedding import load_model_sentence_transformers
+from service.embedding_batcher import embedding_batcher
+from service.user_vector_index import user_vector_index
+from service.llm_client import llm_client_factory
+from agents.langgraph.intent import intent_centroids
+from config import settings
 import logging
 
 @asynccontextmanager
@@ -17,8 +21,17 @@ async def lifespan(app: FastAPI):
     
     logger.info("🚀 Starting FastAPI application...")
     await create_db_and_tables()
-    load_model_sentence_transformers()
+    await embedding_batcher.start()
+    if settings.intent_local_enabled:
+        # 启动时预先计算意图中心，避免第一个请求承担几十次向量计算
+        try:
+            await intent_centroids.ensure_built()
+        except Exception as e:
+            logger.warning(f"意图中心构建失败，将在首次分类时重试: {e}")
     yield
+    await embedding_batcher.close()
+    await llm_client_factory.close()
+    user_vector_index.save_all()
     logger.info("🛑 Shutting down FastAPI application...")
 
 app=FastAPI(lifespan=lifespan)
@@ -1,11 +1,72 @@
 
 from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime, timezone
+from typing import NamedTuple, Optional
 import json
 from ._base import Base
-from pgvector.sqlalchemy import Vector
+from config import settings
+from pgvector.sqlalchemy import Vector, HALFVEC, BIT
 from sqlalchemy import Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+VECTOR_DIM = 512
+
+
+def binary_quantize(vector):
+    """二值量化：每一维按正负取 1/0，与 pgvector 的 binary_quantize 一致"""
+    return "".join("1" if x > 0 else "0" for x in vector)
+
+
+class CompactStorage(NamedTuple):
+    column: str
+    sql_type: str
+    ops: str
+    expression: str  # 由全精度向量派生紧凑值的 SQL，{v} 替换为全精度向量表达式
+
+
+# 紧凑存储模式（VECTOR_STORAGE_MODE）对应的列；full 模式不建任何紧凑列和索引
+COMPACT_STORAGE = {
+    "halfvec": CompactStorage("vector_half", f"halfvec({VECTOR_DIM})", "halfvec_cosine_ops", f"{{v}}::halfvec({VECTOR_DIM})"),
+    "binary": CompactStorage("vector_bits", f"bit({VECTOR_DIM})", "bit_hamming_ops", f"binary_quantize({{v}})::bit({VECTOR_DIM})"),
+}
+
+
+def compact_storage() -> Optional[CompactStorage]:
+    return COMPACT_STORAGE.get(settings.vector_storage_mode)
+
+
+def _compact_indexes():
+    storage = compact_storage()
+    if storage is None:
+        return []
+    return [Index(
+        f'idx_daily_records_{storage.column}',
+        storage.column,
+        postgresql_using='hnsw',
+        postgresql_ops={storage.column: storage.ops}
+    )]
+
+
+def _vector_index():
+    """全精度向量索引，类型由 VECTOR_INDEX_TYPE 决定；使用 cosine 算子类以匹配检索时的 <=>"""
+    if settings.vector_index_type == "hnsw":
+        return Index(
+            'idx_daily_records_vector_hnsw',
+            'vector',
+            postgresql_using='hnsw',
+            postgresql_with={'m': settings.hnsw_m, 'ef_construction': settings.hnsw_ef_construction},
+            postgresql_ops={'vector': 'vector_cosine_ops'}
+        )
+    return Index(
+        'idx_daily_records_vector_ivfflat',
+        'vector',
+        postgresql_using='ivfflat',
+        postgresql_with={'lists': settings.ivfflat_lists},
+        postgresql_ops={'vector': 'vector_cosine_ops'}
+    )
+
+
 class DailyRecord(Base):
     __tablename__ = 'daily_records'
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -24,14 +85,34 @@ class DailyRecord(Base):
     updated_at = Column(DateTime(timezone=True), default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc), comment='更新时间')
     user = relationship("User", back_populates="daily_records")
     ai_summary = relationship("AISummary", back_populates="daily_record", uselist=False, cascade="all, delete-orphan")
-    vector = Column(Vector(512), nullable=True, comment='向量嵌入')
-    __table_args__ = (Index(
-            'idx_daily_records_vector',
-            'vector',
-            postgresql_using='ivfflat'  # 或 'hnsw'
+    # 向量与检索列只在 SQL 中使用，ORM 读取时默认不加载（误访问直接报错，而不是隐式再查一次）
+    vector = deferred(Column(Vector(VECTOR_DIM), nullable=True, comment='向量嵌入'), raiseload=True)
+    # 紧凑存储（只在对应的 VECTOR_STORAGE_MODE 下建列）：候选预筛用紧凑索引，再用 vector 精确重排
+    if settings.vector_storage_mode == "halfvec":
+        vector_half = deferred(Column(HALFVEC(VECTOR_DIM), nullable=True, comment='半精度向量'), raiseload=True)
+    elif settings.vector_storage_mode == "binary":
+        vector_bits = deferred(Column(BIT(VECTOR_DIM), nullable=True, comment='二值量化向量'), raiseload=True)
+    # 全文检索文档：写入时由 content + reflections 分词（中文二元组）生成
+    search_vector = deferred(Column(TSVECTOR, nullable=True, comment='全文检索向量'), raiseload=True)
+    __table_args__ = (_vector_index(),
+        # 所有检索都先按用户和日期范围过滤
+        Index('idx_daily_records_user_date', 'user_id', 'record_date'),
+        *_compact_indexes(),
+        Index(
+            'idx_daily_records_search_vector',
+            'search_vector',
+            postgresql_using='gin'
         ),
         {'comment': '每日记录表'})
 
+    def set_vector(self, vector, storage_mode: str = "full"):
+        """写入向量，紧凑存储模式下同时写入对应的半精度或二值量化列"""
+        self.vector = vector
+        if storage_mode == "halfvec":
+            self.vector_half = vector
+        elif storage_mode == "binary":
+            self.vector_bits = binary_quantize(vector) if vector is not None else None
+
     def set_activities(self, category, activities_list):
         if hasattr(self, f'{category}_activities'):
             setattr(self, f'{category}_activities', json.dumps(activities_list, ensure_ascii=False))
@@ -0,0 +1,31 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from service.embedding_batcher import embedding_batcher
+from service.llm_cache import llm_cache
+from service.llm_dispatcher import llm_dispatcher
+from utils.tracing import metrics
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """agent 节点 / 检索耗时直方图与 LLM 调用计数（Prometheus 文本格式）"""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/metrics/llm-dispatch", response_model=dict)
+async def get_llm_dispatch_stats():
+    """LLM 调度层：调用、合并、重试与限流等待"""
+    return llm_dispatcher.stats()
+
+
+@router.get("/metrics/llm-cache", response_model=dict)
+async def get_llm_cache_stats():
+    """LLM 回答缓存命中情况与节省的 token 数"""
+    return llm_cache.stats()
+
+
+@router.get("/metrics/embedding", response_model=dict)
+async def get_embedding_stats():
+    """embedding 微批队列与已加载模型的加载耗时、内存占用"""
+    return {"batcher": embedding_batcher.stats(), "models": await embedding_batcher.model_stats()}
@@ -5,12 +5,15 @@ from typing import List, Optional
 from datetime import date, datetime
 import json
 from schemas.record import DailyRecordCreate,DailyRecordUpdate, DailyQuery
-from database import get_async_session
+from database import get_async_session, async_session_maker
 from crud.summary import AISummaryCRUD
 from crud.record import DailyRecordCRUD
+from models.daily_record import DailyRecord
 from crud.user import UserCRUD
 from service.llm import ai_service
-from agents.langgraph import respond 
+from service.answer_cache import answer_cache
+from agents.langgraph import respond, respond_stream
+from fastapi.responses import StreamingResponse
 from utils.logger import logger
 router = APIRouter()
 @router.post("/users/{user_id}/records/", response_model=dict)
@@ -134,12 +137,24 @@ async def delete_daily_record(user_id: int, record_date: str, db: Session = Depe
     return {"message": "记录删除成功"}
 
 
+TODAY_COLUMNS = (
+    DailyRecord.id,
+    DailyRecord.content,
+    DailyRecord.mood_score,
+    DailyRecord.work_activities,
+    DailyRecord.personal_activities,
+    DailyRecord.learning_activities,
+    DailyRecord.health_activities,
+    DailyRecord.created_at,
+)
+
+
 @router.get("/users/{user_id}/today", response_model=dict)
 async def get_today_info(user_id: int, db: Session = Depends(get_async_session)):
     """获取今日记录"""
     today = date.today().strftime('%Y-%m-%d')
     
-    record = await DailyRecordCRUD.get_daily_record(db, user_id, today)
+    record = await DailyRecordCRUD.get_daily_record(db, user_id, today, columns=TODAY_COLUMNS)
     record_data = None
     
     if record:
@@ -165,11 +180,44 @@ async def get_today_info(user_id: int, db: Session = Depends(get_async_session))
 async def ai_query(
     user_id: int,
     data: DailyQuery,
+    debug: bool = False,
     db: Session = Depends(get_async_session)
 ):
-    """RAG 智能体查询入口"""
+    """RAG 智能体查询入口；debug=true 时结果附带各节点耗时与 LLM 用量"""
     logger.info("开始查询")
-    result = await respond(user_id=user_id, user_query=data.query, session=db)
+    result = await respond(user_id=user_id, user_query=data.query, session=db, debug=debug)
     logger.info("查询成功")
     logger.info(f"查询结果： {result}")
-    return result
\ No newline at end of file
+    return result
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+@router.post("/ai/{user_id}/query/stream")
+async def ai_query_stream(user_id: int, data: DailyQuery, debug: bool = False):
+    """RAG 智能体查询（SSE 流式）：节点进度、回答 token，最后一个事件为结构化结果"""
+    async def event_source():
+        # 响应体在路由返回后才开始发送，会话在生成器内自行管理，不依赖 get_async_session 的生命周期
+        async with async_session_maker() as session:
+            try:
+                async for event in respond_stream(
+                    user_id=user_id, user_query=data.query, session=session, debug=debug
+                ):
+                    yield _sse(event["event"], event["data"])
+            except Exception as e:
+                logger.error(f"流式查询失败: {e}", exc_info=True)
+                yield _sse("error", {"detail": "查询失败"})
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/ai/answer-cache/stats", response_model=dict)
+async def answer_cache_stats():
+    """回答缓存命中情况与节省的 LLM token 数"""
+    return answer_cache.stats()
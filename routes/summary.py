@@ -8,6 +8,7 @@ import json
 from database import get_async_session
 from crud.summary import AISummaryCRUD
 from crud.record import DailyRecordCRUD
+from models.daily_record import DailyRecord
 
 
 router = APIRouter()
@@ -66,14 +67,15 @@ async def regenerate_ai_summary(
     user_id: int, 
     record_date: str, 
     background_tasks: BackgroundTasks,
+    refresh: bool = False,
     db: Session = Depends(get_async_session)
 ):
-    """重新生成AI总结"""
-    record = await DailyRecordCRUD.get_daily_record(db, user_id, record_date)
+    """重新生成AI总结；记录未变化时复用缓存的 LLM 回答，refresh=true 时强制重新调用"""
+    record = await DailyRecordCRUD.get_daily_record(db, user_id, record_date, columns=(DailyRecord.id,))
     if not record:
         raise HTTPException(status_code=404, detail="记录不存在")
     
-    background_tasks.add_task(AISummaryCRUD.generate_ai_summary_task, db, user_id, record.id)
+    background_tasks.add_task(AISummaryCRUD.generate_ai_summary_task, db, user_id, record.id, refresh)
     
     return {"message": "AI总结正在重新生成中..."}
 
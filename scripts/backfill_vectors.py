@@ -0,0 +1,206 @@
+"""daily_records 向量回填 / 重新嵌入任务
+
+用法：
+    python -m scripts.backfill_vectors                       # 只补齐 vector IS NULL 的记录
+    python -m scripts.backfill_vectors --all                 # 全量重新嵌入
+    python -m scripts.backfill_vectors --all --column vector_next --model BAAI/bge-base-zh-v1.5
+                                                             # 模型迁移：写入新列（配合 EMBEDDING_DUAL_WRITE_*）
+    python -m scripts.backfill_vectors --compact             # 为已有向量补齐紧凑存储列
+    python -m scripts.backfill_vectors --search              # 为已有记录生成全文检索列
+
+按 id 顺序用服务端游标流式读取，批量 encode、批量 UPDATE，每批提交后写检查点，
+中断后重新运行会从检查点继续。
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+from config import settings
+from crud.record import checked_vector_column, to_vector_literal
+from database import async_engine
+from models.daily_record import compact_storage
+from service.embedding import generate_vectors_batch, model_registry
+from service.text_search import to_search_document
+from utils.logger import logger
+
+
+def _load_checkpoint(path: str) -> Dict[str, Any]:
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def _save_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    if not path:
+        return
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+async def _ensure_column(column: str, dimension: int) -> None:
+    async with async_engine.begin() as conn:
+        await conn.execute(text(f"ALTER TABLE daily_records ADD COLUMN IF NOT EXISTS {column} vector({dimension})"))
+
+
+async def _write_batch(column: str, ids: List[int], vectors: List[Optional[List[float]]]) -> None:
+    """一条 UPDATE ... FROM unnest(...) 批量写回整批向量"""
+    pairs = [(i, to_vector_literal(v)) for i, v in zip(ids, vectors) if v is not None]
+    if not pairs:
+        return
+    assignments = [f"{column} = CAST(v.vector AS vector)"]
+    storage = compact_storage()
+    if column == "vector" and storage is not None:
+        # 紧凑存储模式下同步写入对应的紧凑列
+        assignments.append(f"{storage.column} = {storage.expression.format(v='CAST(v.vector AS vector)')}")
+    async with async_engine.begin() as conn:
+        await conn.execute(
+            text(f"""
+                UPDATE daily_records AS d
+                SET {', '.join(assignments)}
+                FROM unnest(CAST(:ids AS integer[]), CAST(:vectors AS text[])) AS v(id, vector)
+                WHERE d.id = v.id
+            """),
+            {"ids": [p[0] for p in pairs], "vectors": [p[1] for p in pairs]},
+        )
+
+
+async def backfill_vectors(
+    column: str = "vector",
+    model_name: Optional[str] = None,
+    only_missing: bool = True,
+    batch_size: int = 256,
+    checkpoint_path: str = "backfill_vectors.checkpoint.json",
+) -> Dict[str, Any]:
+    """回填/重新嵌入 daily_records 的向量列，可作为后台任务直接 await"""
+    column = checked_vector_column(column)
+    model = await asyncio.to_thread(model_registry.get, model_name)
+    if column != "vector":
+        await _ensure_column(column, model.get_sentence_embedding_dimension())
+
+    checkpoint = _load_checkpoint(checkpoint_path)
+    job = {"column": column, "model": model_name, "only_missing": only_missing}
+    if checkpoint.get("job") != job:
+        checkpoint = {"job": job, "last_id": 0, "processed": 0}
+    last_id = checkpoint["last_id"]
+    logger.info(f"开始回填向量: {job}，从 id > {last_id} 继续")
+
+    filters = ["id > :last_id"]
+    if only_missing:
+        filters.append(f"{column} IS NULL")
+    select_sql = text(
+        f"SELECT id, content FROM daily_records WHERE {' AND '.join(filters)} ORDER BY id"
+    ).execution_options(yield_per=batch_size)
+
+    start = time.perf_counter()
+    async with async_engine.connect() as conn:
+        result = await conn.stream(select_sql, {"last_id": last_id})
+        async for rows in result.partitions(batch_size):
+            ids = [r.id for r in rows]
+            vectors = await asyncio.to_thread(generate_vectors_batch, [r.content or "" for r in rows], model_name)
+            await _write_batch(column, ids, vectors)
+
+            checkpoint["last_id"] = ids[-1]
+            checkpoint["processed"] += len(ids)
+            _save_checkpoint(checkpoint_path, checkpoint)
+            elapsed = time.perf_counter() - start
+            logger.info(f"已处理 {checkpoint['processed']} 条 (last_id={ids[-1]})，累计耗时 {elapsed:.1f}s")
+
+    checkpoint["done"] = True
+    _save_checkpoint(checkpoint_path, checkpoint)
+    logger.info(f"向量回填完成，共处理 {checkpoint['processed']} 条")
+    return checkpoint
+
+
+async def sync_compact_vectors(batch_size: int = 5000) -> int:
+    """由已有的全精度向量派生当前紧凑存储模式的列（纯 SQL，按 id 分批）"""
+    storage = compact_storage()
+    if storage is None:
+        logger.warning("VECTOR_STORAGE_MODE=full，没有需要同步的紧凑列")
+        return 0
+    last_id, total = 0, 0
+    while True:
+        async with async_engine.begin() as conn:
+            result = await conn.execute(
+                text(f"""
+                    UPDATE daily_records
+                    SET {storage.column} = {storage.expression.format(v='vector')}
+                    WHERE id IN (
+                        SELECT id FROM daily_records
+                        WHERE id > :last_id AND vector IS NOT NULL AND {storage.column} IS NULL
+                        ORDER BY id
+                        LIMIT :batch_size
+                    )
+                    RETURNING id
+                """),
+                {"last_id": last_id, "batch_size": batch_size},
+            )
+            ids = [r.id for r in result.fetchall()]
+        if not ids:
+            break
+        last_id, total = max(ids), total + len(ids)
+        logger.info(f"紧凑向量已同步 {total} 条 (last_id={last_id})")
+    return total
+
+
+async def backfill_search_vectors(batch_size: int = 1000) -> int:
+    """为 search_vector 为空的记录生成全文检索向量（Python 分词，批量写回）"""
+    total = 0
+    select_sql = text(
+        "SELECT id, content, reflections FROM daily_records WHERE search_vector IS NULL ORDER BY id"
+    ).execution_options(yield_per=batch_size)
+    async with async_engine.connect() as conn:
+        result = await conn.stream(select_sql)
+        async for rows in result.partitions(batch_size):
+            async with async_engine.begin() as write_conn:
+                await write_conn.execute(
+                    text("""
+                        UPDATE daily_records AS d
+                        SET search_vector = to_tsvector('simple', v.doc)
+                        FROM unnest(CAST(:ids AS integer[]), CAST(:docs AS text[])) AS v(id, doc)
+                        WHERE d.id = v.id
+                    """),
+                    {
+                        "ids": [r.id for r in rows],
+                        "docs": [to_search_document(r.content, r.reflections) for r in rows],
+                    },
+                )
+            total += len(rows)
+            logger.info(f"全文检索向量已生成 {total} 条 (last_id={rows[-1].id})")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="daily_records 向量回填 / 重新嵌入")
+    parser.add_argument("--column", default="vector", help="写入的向量列，模型迁移时指定新列")
+    parser.add_argument("--model", default=None, help="embedding 模型，默认使用 EMBEDDING_MODEL_NAME")
+    parser.add_argument("--all", action="store_true", help="重新嵌入全部记录（默认只处理向量为空的记录）")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--checkpoint", default="backfill_vectors.checkpoint.json")
+    parser.add_argument("--compact", action="store_true", help="只由已有向量派生半精度/二值量化列")
+    parser.add_argument("--search", action="store_true", help="只为缺失的记录生成全文检索向量")
+    args = parser.parse_args()
+    if args.compact:
+        asyncio.run(sync_compact_vectors())
+        return
+    if args.search:
+        asyncio.run(backfill_search_vectors())
+        return
+    asyncio.run(backfill_vectors(
+        column=args.column,
+        model_name=args.model,
+        only_missing=not args.all,
+        batch_size=args.batch_size,
+        checkpoint_path=args.checkpoint,
+    ))
+
+
+if __name__ == "__main__":
+    main()
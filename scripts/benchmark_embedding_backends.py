@@ -0,0 +1,121 @@
+"""embedding 后端基准测试
+
+对比各后端（torch / torch_int8 / onnx）的单条延迟、批量吞吐、常驻内存，
+以及与 torch 基准向量的余弦一致性。每个后端在独立子进程中运行，内存互不干扰。
+
+用法：
+    python -m scripts.benchmark_embedding_backends --backends torch torch_int8 onnx --output bench.json
+
+onnx 后端需要额外安装 optimum[onnxruntime]（不在 requirements.txt 中），未安装时跳过该后端。
+"""
+import argparse
+import importlib.util
+import json
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+import numpy as np
+
+SAMPLE_TEXTS = [
+    "今天心情7分，上午写了一份报告，晚上和朋友去看电影。",
+    "早上跑步5公里，下午开了三个会，感觉有点累。",
+    "学习了LangGraph的状态图，写了一个检索增强的小demo。",
+    "和家人一起吃饭，聊了很多关于未来的计划。",
+    "项目上线出了点问题，加班到很晚才修复。",
+    "读完了《原则》的第二部分，准备整理读书笔记。",
+    "最近睡眠不太好，决定每天晚上11点前睡觉。",
+    "周末去爬山，天气很好，拍了很多照片。",
+]
+
+
+# 可选后端依赖的模块，requirements.txt 不包含
+OPTIONAL_BACKEND_MODULES = {"onnx": ("onnxruntime", "optimum")}
+
+
+def _missing_modules(backend: str) -> List[str]:
+    return [m for m in OPTIONAL_BACKEND_MODULES.get(backend, ()) if importlib.util.find_spec(m) is None]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def _run_backend(backend: str, texts: List[str], rounds: int, batch_size: int) -> Dict[str, Any]:
+    """在子进程中运行：加载后端、测延迟与吞吐、返回向量用于一致性比较"""
+    from service.embedding import _rss_mb, generate_vectors_batch, model_key, model_registry
+
+    model_registry.warmup(backend=backend)
+    model = model_registry.get(backend=backend)
+
+    latencies = []
+    for _ in range(rounds):
+        for t in texts:
+            start = time.perf_counter()
+            model.encode(t, normalize_embeddings=True)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    batch = (texts * (batch_size // len(texts) + 1))[:batch_size]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        model.encode(batch, batch_size=batch_size, normalize_embeddings=True)
+    throughput = batch_size * rounds / (time.perf_counter() - start)
+
+    return {
+        "backend": backend,
+        "load": model_registry.stats()[model_key(backend=backend)],
+        "latency_ms": {
+            "p50": round(statistics.median(latencies), 2),
+            "p95": round(_percentile(latencies, 0.95), 2),
+            "mean": round(statistics.mean(latencies), 2),
+        },
+        "throughput_per_s": round(throughput, 1),
+        "rss_mb": round(_rss_mb(), 1),
+        "vectors": generate_vectors_batch(texts, backend=backend),
+    }
+
+
+def run_benchmark(backends: List[str], rounds: int = 20, batch_size: int = 64) -> List[Dict[str, Any]]:
+    results = []
+    for backend in ["torch"] + [b for b in backends if b != "torch"]:
+        missing = _missing_modules(backend)
+        if missing:
+            print(f"跳过 {backend} 后端：缺少 {', '.join(missing)}，请先 pip install optimum[onnxruntime]")
+            continue
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            results.append(pool.submit(_run_backend, backend, SAMPLE_TEXTS, rounds, batch_size).result())
+
+    reference = np.asarray(results[0]["vectors"], dtype=np.float32)
+    for result in results:
+        vectors = np.asarray(result.pop("vectors"), dtype=np.float32)
+        result["dimension"] = int(vectors.shape[1])
+        # 向量已归一化，点积即余弦相似度
+        cosine = (vectors * reference).sum(axis=1)
+        result["cosine_vs_torch"] = {"mean": round(float(cosine.mean()), 5), "min": round(float(cosine.min()), 5)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="embedding 后端基准测试")
+    parser.add_argument("--backends", nargs="+", default=["torch", "torch_int8", "onnx"])
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--output", default=None, help="结果 JSON 输出路径")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.backends, args.rounds, args.batch_size)
+    for r in results:
+        print(
+            f"{r['backend']:<12} p50={r['latency_ms']['p50']}ms p95={r['latency_ms']['p95']}ms "
+            f"吞吐={r['throughput_per_s']}/s RSS={r['rss_mb']}MB "
+            f"cos(mean/min)={r['cosine_vs_torch']['mean']}/{r['cosine_vs_torch']['min']}"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""本地相关性判断阈值的离线校准
+
+两步：
+    # 1. 采集：对样本问题执行检索，记录打分特征与 LLM 判断结果
+    python -m scripts.calibrate_relevance_gate collect --queries queries.jsonl --output features.jsonl
+    # 2. 拟合：按意图网格搜索阈值，在与 LLM 一致率不低于目标的前提下最大化跳过 LLM 的比例
+    python -m scripts.calibrate_relevance_gate fit --features features.jsonl --output relevance_thresholds.json
+    # 评估当前阈值（默认值或 RELEVANCE_THRESHOLDS_PATH）
+    python -m scripts.calibrate_relevance_gate report --features features.jsonl
+
+queries.jsonl 每行: {"user_id": 1, "query": "最近心情怎么样", "intent": "recent_summary"}，intent 可省略（用规则分类）。
+"""
+import argparse
+import asyncio
+import json
+from collections import defaultdict
+from typing import Any, Dict, List
+
+from agents.langgraph.relevance import THRESHOLDS, decide, relevance_features
+
+
+def _load_jsonl(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def collect(queries_path: str, output_path: str) -> None:
+    from agents.langgraph.nodes import _classify_intent, _parse_time_range, _search_in_time_range, llm_check_relevance
+    from database import async_session_maker
+    from service.embedding_batcher import generate_vectors_async
+
+    samples = _load_jsonl(queries_path)
+    async with async_session_maker() as session:
+        with open(output_path, "w", encoding="utf-8") as out:
+            for sample in samples:
+                query = sample["query"]
+                intent = sample.get("intent") or _classify_intent(query)
+                start_date, end_date = _parse_time_range(intent)
+                qv = await generate_vectors_async(query)
+                records = await _search_in_time_range(session, qv, query, sample["user_id"], start_date, end_date)
+                if not records:
+                    continue
+                judged = await llm_check_relevance(query, records)
+                out.write(json.dumps({
+                    "query": query,
+                    "intent": intent,
+                    **relevance_features(records),
+                    "llm_can_answer": bool(judged.get("can_answer")),
+                }, ensure_ascii=False) + "\n")
+
+
+def evaluate(samples: List[Dict[str, Any]], thresholds: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
+    """统计本地判定覆盖率（跳过 LLM 的比例）与和 LLM 的一致率"""
+    by_intent: Dict[str, Dict[str, int]] = defaultdict(lambda: {"total": 0, "local": 0, "agree": 0})
+    for s in samples:
+        stats = by_intent[s["intent"]]
+        stats["total"] += 1
+        t = thresholds.get(s["intent"]) or thresholds["general_qa"]
+        decision = decide(s, t)
+        if decision is not None:
+            stats["local"] += 1
+            stats["agree"] += int(decision["can_answer"] == s["llm_can_answer"])
+
+    def summarize(stats):
+        return {
+            **stats,
+            "llm_skip_rate": round(stats["local"] / stats["total"], 4) if stats["total"] else 0.0,
+            "agreement": round(stats["agree"] / stats["local"], 4) if stats["local"] else 1.0,
+        }
+
+    overall = {"total": 0, "local": 0, "agree": 0}
+    for stats in by_intent.values():
+        for k in overall:
+            overall[k] += stats[k]
+    return {"overall": summarize(overall), "by_intent": {i: summarize(s) for i, s in by_intent.items()}}
+
+
+def fit(samples: List[Dict[str, Any]], min_agreement: float) -> Dict[str, Dict[str, float]]:
+    """按意图网格搜索 accept / reject 阈值与本地判定可回答所需的最少结果数 min_count
+
+    min_count 的候选取该意图样本中实际出现过的结果数，0 表示不限制。
+    """
+    grid = [round(x * 0.02, 2) for x in range(5, 46)]  # 0.10 ~ 0.90
+    fitted = {}
+    for intent in sorted({s["intent"] for s in samples}):
+        intent_samples = [s for s in samples if s["intent"] == intent]
+        count_grid = [0] + sorted({int(s["count"]) for s in intent_samples})
+        base = dict(THRESHOLDS.get(intent) or THRESHOLDS["general_qa"])
+        best, best_local = base, -1
+        for accept in grid:
+            for reject in (r for r in grid if r < accept):
+                for min_count in count_grid:
+                    t = {
+                        **base, "accept": accept, "reject": reject,
+                        "margin_accept": max(reject, accept - 0.05), "min_count": min_count,
+                    }
+                    stats = evaluate(intent_samples, {intent: t})["overall"]
+                    if stats["agreement"] >= min_agreement and stats["local"] > best_local:
+                        best, best_local = t, stats["local"]
+        fitted[intent] = best
+    return fitted
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    for intent, stats in [("overall", report["overall"]), *sorted(report["by_intent"].items())]:
+        print(
+            f"{intent:<18} 样本 {stats['total']:>5}  跳过LLM {stats['llm_skip_rate']:.1%}  "
+            f"与LLM一致 {stats['agreement']:.1%}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地相关性判断阈值校准")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_collect = sub.add_parser("collect")
+    p_collect.add_argument("--queries", required=True)
+    p_collect.add_argument("--output", default="relevance_features.jsonl")
+    p_fit = sub.add_parser("fit")
+    p_fit.add_argument("--features", required=True)
+    p_fit.add_argument("--output", default="relevance_thresholds.json")
+    p_fit.add_argument("--min-agreement", type=float, default=0.95)
+    p_report = sub.add_parser("report")
+    p_report.add_argument("--features", required=True)
+    args = parser.parse_args()
+
+    if args.command == "collect":
+        asyncio.run(collect(args.queries, args.output))
+    elif args.command == "fit":
+        samples = _load_jsonl(args.features)
+        thresholds = fit(samples, args.min_agreement)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(thresholds, f, ensure_ascii=False, indent=2)
+        _print_report(evaluate(samples, {**THRESHOLDS, **thresholds}))
+    else:
+        _print_report(evaluate(_load_jsonl(args.features), THRESHOLDS))
+
+
+if __name__ == "__main__":
+    main()
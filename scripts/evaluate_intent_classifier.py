@@ -0,0 +1,106 @@
+"""本地意图分类器的离线评估
+
+两步：
+    # 1. 采集：对样本问题分别执行本地预测与 LLM 分类，写入特征文件
+    python -m scripts.evaluate_intent_classifier collect --queries intent_queries.jsonl --output intent_eval.jsonl
+    # 2. 报告：按置信度阈值统计准确率、与 LLM 的一致率以及省下的 LLM 调用比例
+    python -m scripts.evaluate_intent_classifier report --samples intent_eval.jsonl
+
+intent_queries.jsonl 每行: {"query": "最近心情怎么样", "label": "recent_summary"}，label（人工标注）可省略。
+collect 加 --no-llm 时只做本地预测，报告中只有标注准确率。
+"""
+import argparse
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+
+from config import settings
+
+THRESHOLD_GRID = [round(0.5 + 0.05 * i, 2) for i in range(10)]  # 0.50 ~ 0.95
+
+
+def _load_jsonl(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def collect(queries_path: str, output_path: str, with_llm: bool) -> None:
+    from agents.langgraph.intent import predict_intent
+    from agents.langgraph.nodes import llm_classify_intent
+    from service.embedding_batcher import embedding_batcher
+
+    await embedding_batcher.start()
+    try:
+        with open(output_path, "w", encoding="utf-8") as out:
+            for sample in _load_jsonl(queries_path):
+                query = sample["query"]
+                prediction = await predict_intent(query) or {}
+                out.write(json.dumps({
+                    "query": query,
+                    "label": sample.get("label"),
+                    "local_label": prediction.get("label"),
+                    "confidence": prediction.get("confidence", 0.0),
+                    "source": prediction.get("source"),
+                    "llm_label": await llm_classify_intent(query) if with_llm else None,
+                }, ensure_ascii=False) + "\n")
+    finally:
+        await embedding_batcher.close()
+
+
+def _rate(numerator: int, denominator: int) -> Optional[float]:
+    return round(numerator / denominator, 4) if denominator else None
+
+
+def evaluate(samples: List[Dict[str, Any]], threshold: float) -> Dict[str, Any]:
+    """阈值以上用本地结果、以下交给 LLM 时的各项指标"""
+    def confident(s):
+        return bool(s["local_label"]) and s["confidence"] >= threshold
+
+    local = [s for s in samples if confident(s)]
+    labelled_local = [s for s in local if s.get("label")]
+    llm_local = [s for s in local if s.get("llm_label")]
+    # 组合后的最终标签：本地置信用本地，否则用 LLM
+    combined = [
+        (s["local_label"] if confident(s) else s.get("llm_label"), s["label"])
+        for s in samples if s.get("label")
+    ]
+    return {
+        "threshold": threshold,
+        "llm_calls_avoided": _rate(len(local), len(samples)),
+        "local_accuracy": _rate(sum(s["local_label"] == s["label"] for s in labelled_local), len(labelled_local)),
+        "local_llm_agreement": _rate(sum(s["local_label"] == s["llm_label"] for s in llm_local), len(llm_local)),
+        "combined_accuracy": _rate(
+            sum(pred == gold for pred, gold in combined if pred), sum(1 for pred, _ in combined if pred)
+        ),
+    }
+
+
+def report(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    labelled_llm = [s for s in samples if s.get("label") and s.get("llm_label")]
+    return {
+        "samples": len(samples),
+        "current_threshold": settings.intent_local_threshold,
+        "llm_accuracy": _rate(sum(s["llm_label"] == s["label"] for s in labelled_llm), len(labelled_llm)),
+        "by_source": {
+            source: sum(1 for s in samples if (s.get("source") or "none") == source)
+            for source in sorted({s.get("source") or "none" for s in samples})
+        },
+        "thresholds": [evaluate(samples, t) for t in sorted(set(THRESHOLD_GRID + [settings.intent_local_threshold]))],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地意图分类器评估")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_collect = sub.add_parser("collect")
+    p_collect.add_argument("--queries", required=True)
+    p_collect.add_argument("--output", required=True)
+    p_collect.add_argument("--no-llm", action="store_true", help="不调用 LLM，只评估标注准确率")
+    p_report = sub.add_parser("report")
+    p_report.add_argument("--samples", required=True)
+    args = parser.parse_args()
+
+    if args.command == "collect":
+        asyncio.run(collect(args.queries, args.output, not args.no_llm))
+    else:
+        print(json.dumps(report(_load_jsonl(args.samples)), ensure_ascii=False, indent=2))
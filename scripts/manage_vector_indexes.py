@@ -0,0 +1,108 @@
+"""按当前配置创建 / 切换 daily_records 的索引（不在启动时执行）
+
+用法：
+    python -m scripts.manage_vector_indexes --dry-run   # 只打印 SQL
+    python -m scripts.manage_vector_indexes
+
+以 VECTOR_INDEX_TYPE / VECTOR_STORAGE_MODE 决定需要的索引：
+- 缺少的索引用 CREATE INDEX CONCURRENTLY IF NOT EXISTS 建立，建索引期间不阻塞写入；
+- 不再需要的旧索引（默认 L2 算子类的旧索引、另一种索引类型、其它存储模式的紧凑索引）用
+  DROP INDEX CONCURRENTLY IF EXISTS 删除；
+- 上次并发建索引中断留下的无效索引（indisvalid = false）先删除再重建。
+CONCURRENTLY 不能在事务内执行，每条语句单独自动提交。
+分区表的父表不支持 CONCURRENTLY，此时退回普通 CREATE / DROP INDEX，执行期间会锁表。
+"""
+import argparse
+import asyncio
+from typing import Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from config import settings
+from database import async_engine
+from models.daily_record import COMPACT_STORAGE, DailyRecord
+from utils.logger import logger
+
+# 本脚本负责管理的全部向量索引名，不在当前配置中的会被删除
+MANAGED_INDEXES = (
+    "idx_daily_records_vector",
+    "idx_daily_records_vector_hnsw",
+    "idx_daily_records_vector_ivfflat",
+    *(f"idx_daily_records_{storage.column}" for storage in COMPACT_STORAGE.values()),
+)
+
+
+async def existing_indexes(conn) -> Dict[str, bool]:
+    """daily_records 上现有的索引名 -> 是否有效"""
+    result = await conn.execute(text("""
+        SELECT c.relname, i.indisvalid
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = 'daily_records'::regclass
+    """))
+    return {name: valid for name, valid in result.all()}
+
+
+async def is_partitioned(conn) -> bool:
+    result = await conn.execute(text("SELECT relkind FROM pg_class WHERE oid = 'daily_records'::regclass"))
+    return result.scalar() == "p"
+
+
+def _create_sql(index, concurrently: bool) -> str:
+    sql = str(CreateIndex(index, if_not_exists=True).compile(dialect=postgresql.dialect()))
+    return sql.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1) if concurrently else sql
+
+
+def _drop_sql(name: str, concurrently: bool) -> str:
+    return f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {name}"
+
+
+def build_statements(existing: Dict[str, bool], concurrently: bool) -> List[str]:
+    expected = {index.name: index for index in DailyRecord.__table__.indexes}
+    statements = [
+        _drop_sql(name, concurrently)
+        for name in MANAGED_INDEXES
+        if name in existing and name not in expected
+    ]
+    for name, index in sorted(expected.items()):
+        if existing.get(name) is False:
+            statements.append(_drop_sql(name, concurrently))
+        if not existing.get(name):
+            statements.append(_create_sql(index, concurrently))
+    return statements
+
+
+async def manage_indexes(dry_run: bool = False) -> None:
+    autocommit_engine = async_engine.execution_options(isolation_level="AUTOCOMMIT")
+    async with autocommit_engine.connect() as conn:
+        concurrently = not await is_partitioned(conn)
+        if not concurrently:
+            logger.warning("daily_records 是分区表，不支持 CONCURRENTLY，建 / 删索引期间会锁表")
+        statements = build_statements(await existing_indexes(conn), concurrently)
+        if not statements:
+            logger.info(
+                f"索引已与配置一致（VECTOR_INDEX_TYPE={settings.vector_index_type}, "
+                f"VECTOR_STORAGE_MODE={settings.vector_storage_mode}）"
+            )
+            return
+        if dry_run:
+            for sql in statements:
+                print(sql + ";")
+            return
+        for sql in statements:
+            logger.info(sql)
+            await conn.execute(text(sql))
+        await conn.execute(text("ANALYZE daily_records"))
+    logger.info(f"已执行 {len(statements)} 条索引变更")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按配置创建 / 切换 daily_records 的索引")
+    parser.add_argument("--dry-run", action="store_true", help="只打印将要执行的 SQL")
+    args = parser.parse_args()
+    asyncio.run(manage_indexes(args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
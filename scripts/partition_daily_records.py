@@ -0,0 +1,81 @@
+"""把 daily_records 改造为按 user_id 哈希分区的表（可选，适用于千万级记录）
+
+用法：
+    python -m scripts.partition_daily_records --partitions 16 --dry-run   # 只打印 SQL
+    python -m scripts.partition_daily_records --partitions 16
+
+每个分区只包含部分用户，按用户过滤的向量/日期检索只扫描一个分区及其索引。
+注意：分区表的主键必须包含分区键，主键变为 (id, user_id)，
+ai_summaries / ai_analysis_logs 指向 daily_records.id 的外键约束会被删除（ORM 关系不受影响）。
+原表重命名为 daily_records_unpartitioned 保留，确认无误后可手动删除。
+"""
+import argparse
+import asyncio
+from typing import List
+
+from sqlalchemy import text
+
+from database import async_engine
+from models.daily_record import DailyRecord
+from utils.logger import logger
+
+
+def build_statements(partitions: int) -> List[str]:
+    statements = [
+        "ALTER TABLE ai_summaries DROP CONSTRAINT IF EXISTS ai_summaries_daily_record_id_fkey",
+        "ALTER TABLE ai_analysis_logs DROP CONSTRAINT IF EXISTS ai_analysis_logs_daily_record_id_fkey",
+        "ALTER TABLE daily_records RENAME TO daily_records_unpartitioned",
+        "ALTER TABLE daily_records_unpartitioned RENAME CONSTRAINT daily_records_pkey TO daily_records_unpartitioned_pkey",
+    ]
+    # 索引名在 schema 内全局唯一，先删除旧表上的同名索引
+    statements += [f"DROP INDEX IF EXISTS {index.name}" for index in DailyRecord.__table__.indexes]
+    statements += [
+        "CREATE TABLE daily_records (LIKE daily_records_unpartitioned INCLUDING DEFAULTS INCLUDING COMMENTS) "
+        "PARTITION BY HASH (user_id)",
+        "ALTER TABLE daily_records ADD CONSTRAINT daily_records_pkey PRIMARY KEY (id, user_id)",
+        "ALTER TABLE daily_records ADD CONSTRAINT daily_records_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id)",
+    ]
+    statements += [
+        f"CREATE TABLE daily_records_p{i} PARTITION OF daily_records "
+        f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {i})"
+        for i in range(partitions)
+    ]
+    statements += [
+        "INSERT INTO daily_records SELECT * FROM daily_records_unpartitioned",
+        # id 序列归属新表，删除旧表时不会被级联删除
+        "ALTER SEQUENCE daily_records_id_seq OWNED BY daily_records.id",
+    ]
+    return statements
+
+
+def _create_indexes(sync_conn):
+    # 在分区父表上建索引会自动在每个分区上建立对应索引
+    for index in DailyRecord.__table__.indexes:
+        index.create(sync_conn)
+
+
+async def partition_daily_records(partitions: int, dry_run: bool = False) -> None:
+    statements = build_statements(partitions)
+    if dry_run:
+        for sql in statements:
+            print(sql + ";")
+        return
+    async with async_engine.begin() as conn:
+        for sql in statements:
+            logger.info(sql)
+            await conn.execute(text(sql))
+        await conn.run_sync(_create_indexes)
+        await conn.execute(text("ANALYZE daily_records"))
+    logger.info(f"daily_records 已改造为 {partitions} 个哈希分区")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="daily_records 按 user_id 哈希分区")
+    parser.add_argument("--partitions", type=int, default=16)
+    parser.add_argument("--dry-run", action="store_true", help="只打印将要执行的 SQL")
+    args = parser.parse_args()
+    asyncio.run(partition_daily_records(args.partitions, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import copy
+import itertools
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from utils.logger import logger
+
+
+@dataclass
+class _Entry:
+    user_id: int
+    query: str
+    vector: np.ndarray
+    result: Dict[str, Any]
+    version: int
+    day: str
+    created_at: float
+    tokens: int
+    scope: Optional[Tuple[Any, ...]] = None
+
+
+class AnswerCache:
+    """agent 回答的语义缓存
+
+    按用户存放 (查询向量, 回答)；同一用户相似度不低于阈值的问题直接返回缓存的回答。
+    条目在以下情况失效：
+    - 用户数据版本变化（DailyRecordCRUD 写入时递增）
+    - 超过 TTL
+    - 跨天（"今天""最近"等相对日期的含义变了）
+    向量相近的问题可能指向不同的时间（"今天心情怎么样"与"昨天心情怎么样"），
+    因此每个条目还带有问题的 scope（解析出的日期范围与意图），查询时必须完全一致才算命中。
+    总条目数与单用户条目数都有上限，按 LRU 淘汰。
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = 0.95,
+        ttl_seconds: float = 600,
+        max_entries: int = 5000,
+        max_entries_per_user: int = 50,
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_entries_per_user = max_entries_per_user
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._by_user: Dict[int, List[int]] = {}
+        self._versions: Dict[int, int] = {}
+        self._ids = itertools.count()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "stores": 0, "evictions": 0, "llm_tokens_saved": 0}
+
+    def version(self, user_id: int) -> int:
+        return self._versions.get(user_id, 0)
+
+    def bump_version(self, user_id: int) -> None:
+        """用户记录有写入：之前缓存的回答全部失效"""
+        self._versions[user_id] = self.version(user_id) + 1
+        for entry_id in self._by_user.pop(user_id, []):
+            self._entries.pop(entry_id, None)
+
+    def _valid(self, entry: _Entry, now: float, today: str) -> bool:
+        return (
+            entry.version == self.version(entry.user_id)
+            and now - entry.created_at <= self.ttl_seconds
+            and entry.day == today
+        )
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        ids = self._by_user.get(entry.user_id)
+        if ids and entry_id in ids:
+            ids.remove(entry_id)
+            if not ids:
+                del self._by_user[entry.user_id]
+
+    def lookup(
+        self, user_id: int, query_vector: Optional[List[float]], scope: Optional[Tuple[Any, ...]] = None
+    ) -> Optional[Dict[str, Any]]:
+        if query_vector is None:
+            return None
+        now, today = time.time(), date.today().isoformat()
+        vector = np.asarray(query_vector, dtype=np.float32)
+        best_id, best_similarity = None, self.similarity_threshold
+        for entry_id in list(self._by_user.get(user_id, [])):
+            entry = self._entries[entry_id]
+            if not self._valid(entry, now, today):
+                self._remove(entry_id)
+                self._stats["stale"] += 1
+                continue
+            if entry.scope != scope:
+                continue
+            similarity = float(entry.vector @ vector)
+            if similarity >= best_similarity:
+                best_id, best_similarity = entry_id, similarity
+        if best_id is None:
+            self._stats["misses"] += 1
+            return None
+        entry = self._entries[best_id]
+        self._entries.move_to_end(best_id)
+        self._stats["hits"] += 1
+        self._stats["llm_tokens_saved"] += entry.tokens
+        logger.info(f"回答缓存命中: user={user_id} 相似度 {best_similarity:.3f} (原问题: {entry.query})")
+        # 返回副本：调用方修改回答（如附加调试信息）不能影响缓存中的条目
+        return copy.deepcopy(entry.result)
+
+    def store(
+        self,
+        user_id: int,
+        query: str,
+        query_vector: Optional[List[float]],
+        result: Dict[str, Any],
+        version: int,
+        tokens: int = 0,
+        scope: Optional[Tuple[Any, ...]] = None,
+    ) -> None:
+        """version 为执行前读取的数据版本；执行期间有写入时不缓存"""
+        if query_vector is None or not result or version != self.version(user_id):
+            return
+        entry_id = next(self._ids)
+        self._entries[entry_id] = _Entry(
+            user_id=user_id,
+            query=query,
+            vector=np.asarray(query_vector, dtype=np.float32),
+            result=result,
+            version=version,
+            day=date.today().isoformat(),
+            created_at=time.time(),
+            tokens=tokens,
+            scope=scope,
+        )
+        ids = self._by_user.setdefault(user_id, [])
+        ids.append(entry_id)
+        self._stats["stores"] += 1
+        while len(ids) > self.max_entries_per_user:
+            self._remove(ids[0])
+            self._stats["evictions"] += 1
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "entries": len(self._entries),
+            "users": len(self._by_user),
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+
+answer_cache = AnswerCache(
+    similarity_threshold=settings.answer_cache_similarity,
+    ttl_seconds=settings.answer_cache_ttl_seconds,
+    max_entries=settings.answer_cache_max_entries,
+    max_entries_per_user=settings.answer_cache_max_entries_per_user,
+)
@@ -0,0 +1,194 @@
+from datetime import date
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+from config import settings
+from service.embedding_cache import normalize_text
+from utils.logger import logger
+
+ACTIVITY_FIELDS = (
+    "work_activities",
+    "personal_activities",
+    "learning_activities",
+    "health_activities",
+    "goals_achieved",
+    "challenges_faced",
+)
+
+# 单条记录截断后正文至少保留的 token 数，再少就不值得放进上下文
+MIN_CONTENT_TOKENS = 20
+
+
+@lru_cache(maxsize=None)
+def _encoding(model_name: str):
+    """模型对应的 tiktoken 编码；未知模型用 cl100k_base，编码文件不可用时返回 None（按字符估算）"""
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("未安装 tiktoken，token 数按字符估算")
+        return None
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        pass
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"加载 tiktoken 编码失败，token 数按字符估算: {e}")
+        return None
+
+
+def count_tokens(text: str, model_name: Optional[str] = None) -> int:
+    encoding = _encoding(model_name or settings.llm_model_name)
+    if encoding is None:
+        # 中文约一字一 token，按字符数估算偏保守
+        return len(text or "")
+    return len(encoding.encode(text or "", disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model_name: Optional[str] = None) -> str:
+    """截断到不超过 max_tokens 个 token，截断时末尾加省略号"""
+    text = text or ""
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding(model_name or settings.llm_model_name)
+    if encoding is None:
+        return text if len(text) <= max_tokens else text[: max_tokens - 1] + "…"
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[: max_tokens - 1]) + "…"
+
+
+def rank_records(
+    records: List[Dict[str, Any]], score_key: str = "score", recency_weight: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """按融合检索分数与时间新近程度排序（两者都归一化到 0~1 后加权）；没有分数时只按时间"""
+    if not records:
+        return []
+    recency_weight = settings.context_recency_weight if recency_weight is None else recency_weight
+    dates = sorted({r.get("record_date") or "" for r in records}, reverse=True)
+    date_rank = {d: i for i, d in enumerate(dates)}
+    max_score = max((r.get(score_key) or 0.0) for r in records)
+
+    def weight(r: Dict[str, Any]) -> float:
+        recency = 1.0 - date_rank[r.get("record_date") or ""] / max(len(dates) - 1, 1)
+        if max_score <= 0:
+            return recency
+        return (1 - recency_weight) * (r.get(score_key) or 0.0) / max_score + recency_weight * recency
+
+    return sorted(records, key=weight, reverse=True)
+
+
+def dedupe_activities(records: List[Dict[str, Any]], fields=ACTIVITY_FIELDS) -> List[Dict[str, Any]]:
+    """去掉重复出现的活动：按记录顺序保留首次出现，并标注出现次数；返回副本，不修改原记录"""
+    counts: Dict[str, int] = {}
+    for r in records:
+        for field in fields:
+            for activity in {normalize_text(a) for a in (r.get(field) or []) if a}:
+                counts[f"{field}:{activity}"] = counts.get(f"{field}:{activity}", 0) + 1
+
+    seen = set()
+    deduped = []
+    for r in records:
+        copy = dict(r)
+        for field in fields:
+            if not r.get(field):
+                continue
+            kept = []
+            for activity in r[field]:
+                key = f"{field}:{normalize_text(activity)}"
+                if not activity or key in seen:
+                    continue
+                seen.add(key)
+                kept.append(f"{activity}（共{counts[key]}次）" if counts[key] > 1 else activity)
+            copy[field] = kept
+        deduped.append(copy)
+    return deduped
+
+
+def _fit_text(record: Dict[str, Any], field: str, text: str, limit: int, render: Callable[[Dict[str, Any]], str]) -> None:
+    """把 record[field] 设为 text 截断后能放进 limit 的最长前缀（放不下时置空）"""
+    record[field] = ""
+    budget = limit - count_tokens(render(record))
+    while budget > 0:
+        record[field] = truncate_tokens(text, budget)
+        overshoot = count_tokens(render(record)) - limit
+        if overshoot <= 0:
+            return
+        # 字段标签、换行等渲染开销会让结果略超，按超出量收紧后重试
+        budget -= overshoot
+    record[field] = ""
+
+
+def _shrink_record(
+    r: Dict[str, Any], limit: int, render: Callable[[Dict[str, Any]], str]
+) -> Optional[Dict[str, Any]]:
+    """把记录压缩到 limit 个 token 以内；连日期、心情等固定部分都放不下时返回 None
+
+    正文先截断到可用预算的 60%（至少 MIN_CONTENT_TOKENS），再依次放入截断后的反思、
+    按原顺序能放下的活动，最后把剩余预算还给正文。
+    """
+    activity_fields = [f for f in ACTIVITY_FIELDS if r.get(f)]
+    shrunk = {**r, "content": "", **({"reflections": ""} if r.get("reflections") else {}), **{f: [] for f in activity_fields}}
+    available = limit - count_tokens(render(shrunk))
+    if available < MIN_CONTENT_TOKENS:
+        return None
+    content = r.get("content") or ""
+    if r.get("reflections") or activity_fields:
+        _fit_text(shrunk, "content", truncate_tokens(content, max(MIN_CONTENT_TOKENS, int(available * 0.6))), limit, render)
+    if r.get("reflections"):
+        _fit_text(shrunk, "reflections", r["reflections"], limit, render)
+    for field in activity_fields:
+        for activity in r[field]:
+            candidate = {**shrunk, field: shrunk[field] + [activity]}
+            if count_tokens(render(candidate)) > limit:
+                break
+            shrunk = candidate
+    _fit_text(shrunk, "content", content, limit, render)
+    return shrunk
+
+
+def pack_records(
+    records: List[Dict[str, Any]],
+    budget_tokens: int,
+    render: Callable[[Dict[str, Any]], str],
+    max_record_tokens: Optional[int] = None,
+    score_key: str = "score",
+    pin_newest: bool = False,
+) -> List[Dict[str, Any]]:
+    """在 token 预算内挑选并截断记录
+
+    按 rank_records 的顺序依次放入；pin_newest 为 True 时（每日总结，最新记录即当天记录）
+    最新的记录总是第一个放入，必要时放宽到整个剩余预算。
+    单条超过 max_record_tokens 或剩余预算时截断正文、反思与活动列表；
+    只有剩余预算连一条记录的固定部分都放不下时才跳过。返回的记录按日期升序，内容可能已被截断。
+    """
+    if not records:
+        return []
+    max_record_tokens = max_record_tokens or settings.context_record_max_tokens
+    ranked = rank_records(dedupe_activities(records), score_key)
+    newest = max(ranked, key=lambda r: r.get("record_date") or "") if pin_newest else None
+    if newest is not None:
+        ranked = [newest] + [r for r in ranked if r is not newest]
+    remaining = budget_tokens
+    packed = []
+    for r in ranked:
+        if remaining < MIN_CONTENT_TOKENS:
+            break
+        limit = min(max_record_tokens, remaining)
+        tokens = count_tokens(render(r))
+        if tokens > limit:
+            shrunk = _shrink_record(r, limit, render)
+            if shrunk is None and r is newest:
+                # 单条上限太小时，最新记录放宽到整个剩余预算
+                shrunk = _shrink_record(r, remaining, render)
+            if shrunk is None:
+                continue
+            r = shrunk
+            tokens = count_tokens(render(r))
+        packed.append(r)
+        remaining -= tokens
+    if len(packed) < len(records):
+        logger.info(f"上下文打包: {len(records)} 条记录中放入 {len(packed)} 条，预算 {budget_tokens} tokens")
+    return sorted(packed, key=lambda r: r.get("record_date") or date.min.isoformat())
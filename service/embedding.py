@@ -1,21 +1,153 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import psutil
 from sentence_transformers import SentenceTransformer
+from config import settings
 from utils.logger import logger
-def load_model_sentence_transformers():
-    """使用 sentence-transformers 加载模型"""
-    
-    logger.info("使用 sentence-transformers 加载模型...")
-    model = SentenceTransformer('BAAI/bge-small-zh-v1.5',local_files_only=True)
+
+
+def _rss_mb() -> float:
+    """当前进程常驻内存 (MB)"""
+    return psutil.Process(os.getpid()).memory_info().rss / 1024 / 1024
+
+
+EMBEDDING_BACKENDS = ("torch", "torch_int8", "onnx")
+
+
+def _load_sentence_transformer(model_name: str, backend: str) -> SentenceTransformer:
+    """按后端加载模型，各后端输出同维度的归一化向量，encode 接口一致"""
+    if backend == "onnx":
+        model_kwargs = {"file_name": settings.embedding_onnx_file} if settings.embedding_onnx_file else None
+        return SentenceTransformer(model_name, backend="onnx", model_kwargs=model_kwargs, local_files_only=True)
+    model = SentenceTransformer(model_name, local_files_only=True)
+    if backend == "torch_int8":
+        import torch
+        # 动态量化：Linear 层权重 int8，激活在推理时动态量化，只适用于 CPU
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
     return model
 
+
+def model_key(model_name: Optional[str] = None, backend: Optional[str] = None) -> str:
+    """模型 + 后端的唯一标识，也作为 embedding 缓存的命名空间"""
+    model_name = model_name or settings.embedding_model_name
+    backend = backend or settings.embedding_backend
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+class EmbeddingModelRegistry:
+    """进程级 embedding 模型注册表：每个模型只加载一次并常驻内存，CRUD 层和 LangGraph 智能体共享"""
+
+    def __init__(self):
+        self._models: Dict[str, SentenceTransformer] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name: Optional[str] = None, backend: Optional[str] = None) -> SentenceTransformer:
+        model_name = model_name or settings.embedding_model_name
+        backend = backend or settings.embedding_backend
+        key = model_key(model_name, backend)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        with self._lock:
+            # 双重检查，避免并发首次请求重复加载
+            model = self._models.get(key)
+            if model is None:
+                model = self._load(model_name, backend)
+                self._models[key] = model
+        return model
+
+    def _load(self, model_name: str, backend: str) -> SentenceTransformer:
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"不支持的 embedding 后端: {backend}，可选: {', '.join(EMBEDDING_BACKENDS)}")
+        key = model_key(model_name, backend)
+        logger.info(f"使用 sentence-transformers 加载模型 {key}...")
+        rss_before = _rss_mb()
+        start = time.perf_counter()
+        model = _load_sentence_transformer(model_name, backend)
+        load_seconds = time.perf_counter() - start
+        rss_after = _rss_mb()
+        self._stats[key] = {
+            "load_seconds": round(load_seconds, 3),
+            "rss_delta_mb": round(rss_after - rss_before, 1),
+            "rss_mb": round(rss_after, 1),
+            "dimension": model.get_sentence_embedding_dimension(),
+        }
+        logger.info(
+            f"模型 {key} 加载完成：耗时 {load_seconds:.2f}s，"
+            f"内存增加 {rss_after - rss_before:.1f}MB（进程 RSS {rss_after:.1f}MB）"
+        )
+        return model
+
+    def warmup(self, model_name: Optional[str] = None, backend: Optional[str] = None) -> None:
+        """加载模型并执行一次哑编码，提前完成首次推理的初始化开销"""
+        model = self.get(model_name, backend)
+        key = model_key(model_name, backend)
+        start = time.perf_counter()
+        model.encode("预热", normalize_embeddings=True)
+        warmup_seconds = time.perf_counter() - start
+        self._stats[key]["warmup_seconds"] = round(warmup_seconds, 3)
+        logger.info(f"模型 {key} 预热完成：耗时 {warmup_seconds:.2f}s")
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """各模型的加载耗时与内存占用"""
+        return {name: dict(s) for name, s in self._stats.items()}
+
+
+model_registry = EmbeddingModelRegistry()
+
+
+def model_stats() -> Dict[str, Dict[str, float]]:
+    """当前进程已加载模型的统计；模块级函数，可提交到进程池执行"""
+    return model_registry.stats()
+
+
+def configure_torch_threads(num_threads: int) -> None:
+    """设置 torch 算子内线程数，0 表示保持 torch 默认值"""
+    if num_threads <= 0:
+        return
+    import torch
+    torch.set_num_threads(num_threads)
+    logger.info(f"torch intra-op 线程数设置为 {num_threads}")
+
+
+def init_embedding_worker(num_threads: int, warmup: bool) -> None:
+    """embedding 执行器工作进程/线程的初始化：设置线程数并加载（预热）模型"""
+    configure_torch_threads(num_threads)
+    if warmup:
+        model_registry.warmup()
+    else:
+        model_registry.get()
+
+
+def load_model_sentence_transformers():
+    """使用 sentence-transformers 加载模型（进程内只加载一次）"""
+    return model_registry.get()
+
 def generate_embedding_sentence_transformers(model, text):
     """使用 sentence-transformers 生成 embedding"""
     if not text or text.strip() == "":
         return None
     embedding = model.encode(text, normalize_embeddings=True)
     return embedding.tolist()
-def generate_vectors(content):
-    """生成向量"""
-    model = load_model_sentence_transformers()
-    generate_embedding = lambda text: generate_embedding_sentence_transformers(model, text)
-    embedding = generate_embedding(content)
-    return embedding
+
+def generate_vectors_batch(
+    contents: List[str], model_name: Optional[str] = None, backend: Optional[str] = None
+) -> List[Optional[List[float]]]:
+    """批量生成向量，空文本对应位置返回 None"""
+    model = model_registry.get(model_name, backend)
+    indexed = [(i, c) for i, c in enumerate(contents) if c and c.strip() != ""]
+    vectors: List[Optional[List[float]]] = [None] * len(contents)
+    if not indexed:
+        return vectors
+    embeddings = model.encode(
+        [c for _, c in indexed],
+        batch_size=max(len(indexed), 1),
+        normalize_embeddings=True,
+    )
+    for (i, _), embedding in zip(indexed, embeddings):
+        vectors[i] = embedding.tolist()
+    return vectors
@@ -0,0 +1,237 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config import settings
+from service.embedding import generate_vectors_batch, init_embedding_worker, model_key, model_stats
+from service.embedding_cache import cache_key, embedding_cache
+from utils.logger import logger
+
+
+def _create_executor(kind: str, workers: int, torch_threads: int, warmup: bool) -> Executor:
+    """创建专用的 embedding 执行器，推理不占用 asyncio 事件循环"""
+    if kind == "process":
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_embedding_worker,
+            initargs=(torch_threads, warmup),
+        )
+    if kind != "thread":
+        logger.warning(f"未知的 embedding 执行器类型 {kind}，使用线程池")
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embedding")
+
+
+class EmbeddingBatcher:
+    """异步微批 embedding 前端
+
+    并发请求先进入队列，后台 worker 按最大批量或最大等待时间凑批，
+    在专用线程池/进程池中批量 encode，再把每条向量分发给各自的调用方。
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        executor_kind: str = "thread",
+        workers: int = 1,
+        torch_threads: int = 0,
+        warmup: bool = True,
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor_kind = executor_kind
+        self.workers = max(workers, 1)
+        self.torch_threads = torch_threads
+        self.warmup = warmup
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # 进行中的批次任务：保留引用避免被垃圾回收，关闭时等待它们完成
+        self._batch_tasks: Set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._in_flight = 0
+        self._stats = {
+            "requests": 0,
+            "batches": 0,
+            "encoded": 0,
+            "encode_seconds": 0.0,
+            "queue_wait_seconds": 0.0,
+            "max_queue_depth": 0,
+        }
+
+    async def start(self) -> None:
+        """创建执行器并预热模型（线程池在当前进程预热，进程池在每个子进程预热）"""
+        self._ensure_worker()
+        loop = asyncio.get_running_loop()
+        if self.executor_kind == "process":
+            # 进程池按需拉起子进程，提交与 worker 数相同的空任务让它们提前完成初始化
+            await asyncio.gather(*[
+                loop.run_in_executor(self._executor, generate_vectors_batch, [])
+                for _ in range(self.workers)
+            ])
+        else:
+            await loop.run_in_executor(self._executor, init_embedding_worker, self.torch_threads, self.warmup)
+
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._executor is None:
+            self._executor = _create_executor(
+                self.executor_kind, self.workers, self.torch_threads, self.warmup
+            )
+            logger.info(f"embedding 执行器: {self.executor_kind} x {self.workers}")
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.workers)
+            self._loop = loop
+            self._worker = loop.create_task(self._run())
+
+    async def embed(self, text: str) -> Optional[List[float]]:
+        """提交单条文本，等待所在批次完成后返回向量"""
+        if not text or text.strip() == "":
+            return None
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self._stats["requests"] += 1
+        await self._queue.put((text, future, time.perf_counter()))
+        depth = self._queue.qsize()
+        if depth > self._stats["max_queue_depth"]:
+            self._stats["max_queue_depth"] = depth
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # 执行器满载时在此等待，新请求继续在队列中积累成更大的批次
+            await self._slots.acquire()
+            self._in_flight += 1
+            task = self._loop.create_task(self._encode_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _encode_batch(self, batch: List[Tuple[str, asyncio.Future, float]]) -> None:
+        texts = [text for text, _, _ in batch]
+        start = time.perf_counter()
+        try:
+            vectors = await self._loop.run_in_executor(self._executor, generate_vectors_batch, texts)
+        except Exception as e:
+            logger.error(f"批量生成向量失败: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+        self._stats["batches"] += 1
+        self._stats["encoded"] += len(batch)
+        self._stats["encode_seconds"] += time.perf_counter() - start
+        self._stats["queue_wait_seconds"] += sum(start - enqueued for _, _, enqueued in batch)
+        for (_, future, _), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    async def run(self, fn, *args):
+        """在 embedding 执行器中直接运行函数（不经过微批队列）"""
+        self._ensure_worker()
+        return await self._loop.run_in_executor(self._executor, fn, *args)
+
+    def stats(self) -> Dict[str, Any]:
+        batches = self._stats["batches"]
+        encoded = self._stats["encoded"]
+        return {
+            **self._stats,
+            "executor": self.executor_kind,
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight_batches": self._in_flight,
+            "avg_batch_size": round(encoded / batches, 2) if batches else 0.0,
+            "avg_queue_wait_ms": round(self._stats["queue_wait_seconds"] / encoded * 1000, 2) if encoded else 0.0,
+        }
+
+    async def model_stats(self) -> Dict[str, Dict[str, float]]:
+        """执行器中已加载模型的加载耗时与内存占用；进程池时为其中一个子进程的统计"""
+        if self.executor_kind != "process" or self._executor is None:
+            return model_stats()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, model_stats)
+
+    async def close(self) -> None:
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+        if self._batch_tasks:
+            # 已取出的批次照常完成，等待它们的请求拿到结果
+            await asyncio.gather(*self._batch_tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+embedding_batcher = EmbeddingBatcher(
+    max_batch_size=settings.embedding_batch_max_size,
+    max_wait_ms=settings.embedding_batch_max_wait_ms,
+    executor_kind=settings.embedding_executor,
+    workers=settings.embedding_executor_workers,
+    torch_threads=settings.embedding_torch_threads,
+    warmup=settings.embedding_warmup,
+)
+
+
+# 进行中的 embedding 请求：同一文本并发请求（如意图分类与推测预取）只 encode 一次
+_inflight: Dict[str, "asyncio.Task"] = {}
+
+
+async def _load_or_embed(key: str, content: str) -> List[float]:
+    if embedding_cache.has_disk:
+        vector = await asyncio.to_thread(embedding_cache.get_disk, key)
+    else:
+        vector = embedding_cache.get_disk(key)
+    if vector is not None:
+        return vector
+
+    vector = await embedding_batcher.embed(content)
+    if embedding_cache.has_disk:
+        await asyncio.to_thread(embedding_cache.put, key, vector)
+    else:
+        embedding_cache.put(key, vector)
+    return vector
+
+
+async def generate_vectors_async(content: str) -> Optional[List[float]]:
+    """异步生成向量：先查 embedding 缓存，未命中再经微批队列在专用执行器中 encode"""
+    if not content or content.strip() == "":
+        return None
+    key = cache_key(model_key(), content)
+    vector = embedding_cache.get_memory(key)
+    if vector is not None:
+        return vector
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_load_or_embed(key, content))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # shield：某个调用方被取消时不影响其他等待同一结果的调用方
+    return await asyncio.shield(task)
+
+
+async def generate_vectors_for_model(contents: List[str], model_name: Optional[str] = None) -> List[Optional[List[float]]]:
+    """用指定模型批量生成向量（模型迁移双写、回填使用，不经缓存）"""
+    return await embedding_batcher.run(generate_vectors_batch, contents, model_name)
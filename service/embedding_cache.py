@@ -0,0 +1,116 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from config import settings
+from utils.logger import logger
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：全半角统一、去首尾空白、压缩连续空白、小写"""
+    text = unicodedata.normalize("NFKC", text or "")
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+def cache_key(model_name: str, text: str) -> str:
+    """缓存键 = 模型名 + 规范化文本的哈希"""
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model_name}:{digest}"
+
+
+class EmbeddingCache:
+    """embedding 缓存：内存 LRU + 可选的 SQLite 磁盘层"""
+
+    def __init__(self, max_entries: int = 10000, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.path = path or None
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def _disk(self) -> Optional[sqlite3.Connection]:
+        if not self.path:
+            return None
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._conn.commit()
+            logger.info(f"embedding 磁盘缓存: {self.path}")
+        return self._conn
+
+    def get_memory(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+            return vector
+
+    def get_disk(self, key: str) -> Optional[List[float]]:
+        """查询磁盘层，命中后回填内存层；未命中计为 miss"""
+        with self._lock:
+            conn = self._disk()
+            row = conn.execute("SELECT vector FROM embedding_cache WHERE key = ?", (key,)).fetchone() if conn else None
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+        vector = array("f", row[0]).tolist()
+        self._put_memory(key, vector)
+        return vector
+
+    def get(self, key: str) -> Optional[List[float]]:
+        vector = self.get_memory(key)
+        if vector is not None:
+            return vector
+        return self.get_disk(key)
+
+    def _put_memory(self, key: str, vector: List[float]) -> None:
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def put(self, key: str, vector: Optional[List[float]]) -> None:
+        if vector is None:
+            return
+        self._put_memory(key, vector)
+        with self._lock:
+            conn = self._disk()
+            if conn is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO embedding_cache (key, vector) VALUES (?, ?)",
+                    (key, array("f", vector).tobytes()),
+                )
+                conn.commit()
+
+    @property
+    def has_disk(self) -> bool:
+        return bool(self.path)
+
+    def stats(self) -> Dict[str, float]:
+        hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+        total = hits + self._stats["misses"]
+        return {
+            **self._stats,
+            "size": len(self._memory),
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+        }
+
+
+embedding_cache = EmbeddingCache(
+    max_entries=settings.embedding_cache_size,
+    path=settings.embedding_cache_path,
+)
@@ -1,19 +1,46 @@
 # ai_service.py
 from typing import List
 from click import prompt
-from openai import AsyncOpenAI
 import json
 from typing import Dict, Any
 from config import settings
 from schemas.record import DailyRecordCreate
 from utils.logger import logger
+from service.llm_dispatcher import Priority, llm_dispatcher
+from service.context_packer import ACTIVITY_FIELDS, pack_records
 from datetime import date
+
+
+def _render_summary_record(record: Dict[str, Any]) -> str:
+    """估算单条记录在总结提示中占用的 token 时使用的渲染方式"""
+    lines = [f"{record.get('record_date')} 心情{record.get('mood_score')}: {record.get('content') or ''}"]
+    if record.get('reflections'):
+        lines.append(f"反思: {record['reflections']}")
+    for field in ACTIVITY_FIELDS:
+        if record.get(field):
+            lines.append(', '.join(record[field]))
+    return "\n".join(lines)
+
+
+def _is_json_response(text: str) -> bool:
+    """回答能否解析为 JSON（允许 ```json 代码块）；解析失败的回答不写入 LLM 缓存"""
+    cleaned = (text or "").strip()
+    if cleaned.startswith("```json"):
+        cleaned = cleaned[len("```json"):].strip()
+    if cleaned.endswith("```"):
+        cleaned = cleaned[:-3].strip()
+    try:
+        json.loads(cleaned)
+    except json.JSONDecodeError:
+        return False
+    return True
+
+
 class AIService:
     def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.llm_api_key, base_url=settings.llm_base_url)
         self.model = settings.llm_model_name
     
-    async def analyze_daily_content(self, content: str) -> DailyRecordCreate:
+    async def analyze_daily_content(self, content: str, bypass_cache: bool = False) -> DailyRecordCreate:
         prompt = f"""
 你是一个信息抽取助手。你的任务是从输入文本（content）中提取信息，填充到 DailyRecordCreate 类型的 JSON 对象中。
 
@@ -55,17 +82,20 @@ content: "今天心情7分，上午写了一份报告，晚上和朋友去看电
     """
 
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
+            content_response = await llm_dispatcher.chat_completion(
                 messages=[
                     {"role": "system", "content": "你是一个专业的信息提取助手，请从提供的文本中提取结构化信息，并以JSON格式返回。只返回有信息的字段。"},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.2, # 降低温度，以获得更准确的提取结果
-                max_tokens=800
+                max_tokens=800,
+                priority=Priority.INTERACTIVE,
+                # 同一段文本的抽取结果不变
+                cache_ttl=settings.llm_cache_analyze_ttl_seconds,
+                bypass_cache=bypass_cache,
+                cacheable=_is_json_response,
             )
             
-            content_response = response.choices[0].message.content
             try:
                 cleaned = content_response.strip()
                 if cleaned.startswith("```json"):
@@ -92,17 +122,16 @@ content: "今天心情7分，上午写了一份报告，晚上和朋友去看电
         prompt = self._build_summary_prompt(daily_record)
         
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
+            content = await llm_dispatcher.chat_completion(
                 messages=[
                     {"role": "system", "content": "你是一个专业的生活助手，帮助用户分析每日活动并提供明日建议。请用中文回复，格式要求为JSON。"},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.7,
-                max_tokens=1500
+                max_tokens=1500,
+                priority=Priority.BACKGROUND,
             )
             
-            content = response.choices[0].message.content
             
 
             try:
@@ -183,22 +212,26 @@ content: "今天心情7分，上午写了一份报告，晚上和朋友去看电
         return prompt
     
     # 在 ai_service 中新增方法
-    async def generate_daily_summary_with_history(self, records_data: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """基于历史记录生成AI总结"""
+    async def generate_daily_summary_with_history(
+        self, records_data: List[Dict[str, Any]], bypass_cache: bool = False
+    ) -> Dict[str, Any]:
+        """基于历史记录生成AI总结；记录窗口未变化时提示相同，直接使用缓存的回答"""
         prompt = self._build_summary_prompt_with_history(records_data)
         
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
+            content = await llm_dispatcher.chat_completion(
                 messages=[
                     {"role": "system", "content": "你是一个专业的生活助手，帮助用户分析多日活动趋势并提供个性化建议。请用中文回复，格式要求为JSON。"},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.7,
-                max_tokens=2000  # 增加token限制，因为要处理更多数据
+                max_tokens=2000,  # 增加token限制，因为要处理更多数据
+                priority=Priority.BACKGROUND,
+                cache_ttl=settings.llm_cache_summary_ttl_seconds,
+                bypass_cache=bypass_cache,
+                cacheable=_is_json_response,
             )
             
-            content = response.choices[0].message.content
             
             try:
                 cleaned = content.strip()
@@ -237,6 +270,11 @@ content: "今天心情7分，上午写了一份报告，晚上和朋友去看电
         
         if not records_data:
             return self._build_summary_prompt({})
+
+        # 按预算挑选、截断记录并合并重复活动，提示长度不再随记录长度无限增长
+        records_data = pack_records(
+            records_data, settings.context_budget_summary_tokens, _render_summary_record, pin_newest=True
+        )
         
         # ===== 新增：按日期分组聚合记录 =====
         daily_aggregated = {}
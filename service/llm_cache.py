@@ -0,0 +1,136 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from config import settings
+from utils.logger import logger
+
+
+@dataclass
+class _Entry:
+    text: str
+    tokens: int
+    expires_at: float
+
+
+class LLMResponseCache:
+    """LLM 回答缓存：内存 LRU + 可选的 SQLite 磁盘层，按 (模型, 提示哈希, 温度) 取键
+
+    只用于对同一输入结果确定的调用（内容抽取、未变化记录窗口的总结、意图分类），
+    由调用方显式开启；每条记录带各自的过期时间，过期后视为未命中并删除。
+    """
+
+    def __init__(self, max_entries: int = 2000, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.path = path or None
+        self._memory: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._stats = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0,
+            "stores": 0, "bypassed": 0, "evictions": 0, "tokens_saved": 0,
+        }
+
+    def _disk(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_response_cache ("
+                "key TEXT PRIMARY KEY, text TEXT NOT NULL, tokens INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+            logger.info(f"LLM 回答磁盘缓存: {self.path}")
+        return self._conn
+
+    # 磁盘层的读写在线程中执行（asyncio.to_thread），不阻塞事件循环
+    def _disk_get(self, key: str) -> Optional[Tuple[str, int, float]]:
+        with self._disk_lock:
+            return self._disk().execute(
+                "SELECT text, tokens, expires_at FROM llm_response_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+    def _disk_delete(self, key: str) -> None:
+        with self._disk_lock:
+            conn = self._disk()
+            conn.execute("DELETE FROM llm_response_cache WHERE key = ?", (key,))
+            conn.commit()
+
+    def _disk_put(self, key: str, entry: _Entry) -> None:
+        with self._disk_lock:
+            conn = self._disk()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_response_cache (key, text, tokens, expires_at) VALUES (?, ?, ?, ?)",
+                (key, entry.text, entry.tokens, entry.expires_at),
+            )
+            conn.commit()
+
+    def _put_memory(self, key: str, entry: _Entry) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _hit(self, entry: _Entry, tier: str) -> str:
+        self._stats[f"{tier}_hits"] += 1
+        self._stats["tokens_saved"] += entry.tokens
+        return entry.text
+
+    async def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry.expires_at > now:
+                self._memory.move_to_end(key)
+                return self._hit(entry, "memory")
+            expired = entry is not None
+            if expired:
+                del self._memory[key]
+        if self.path:
+            row = await asyncio.to_thread(self._disk_get, key)
+            if row is not None and row[2] > now:
+                entry = _Entry(*row)
+                with self._lock:
+                    self._put_memory(key, entry)
+                    return self._hit(entry, "disk")
+            if row is not None:
+                expired = True
+                await asyncio.to_thread(self._disk_delete, key)
+        with self._lock:
+            if expired:
+                self._stats["expired"] += 1
+            self._stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, text: str, tokens: int, ttl_seconds: float) -> None:
+        if not text or ttl_seconds <= 0:
+            return
+        entry = _Entry(text=text, tokens=tokens, expires_at=time.time() + ttl_seconds)
+        with self._lock:
+            self._put_memory(key, entry)
+            self._stats["stores"] += 1
+        if self.path:
+            await asyncio.to_thread(self._disk_put, key, entry)
+
+    def record_bypass(self) -> None:
+        self._stats["bypassed"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+        lookups = hits + self._stats["misses"]
+        return {
+            **self._stats,
+            "size": len(self._memory),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+llm_cache = LLMResponseCache(
+    max_entries=settings.llm_cache_size,
+    path=settings.llm_cache_path,
+)
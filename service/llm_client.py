@@ -0,0 +1,85 @@
+from typing import Dict, Optional
+
+import httpx
+from langchain_openai import ChatOpenAI
+from openai import AsyncOpenAI
+
+from config import settings
+from utils.logger import logger
+
+
+class LLMClientFactory:
+    """进程内共用的 LLM 客户端
+
+    所有 LLM 调用（agent 节点的 ChatOpenAI 与 AIService 的 AsyncOpenAI）共用同一个 httpx 连接池：
+    keep-alive 复用 TCP/TLS 连接，服务端支持时走 HTTP/2 多路复用，避免每次调用重新握手。
+    """
+
+    def __init__(self):
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._openai_client: Optional[AsyncOpenAI] = None
+        self._chat_models: Dict[float, ChatOpenAI] = {}
+
+    @staticmethod
+    def _http2_available() -> bool:
+        if not settings.llm_http2:
+            return False
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("未安装 h2，LLM 客户端使用 HTTP/1.1")
+            return False
+        return True
+
+    def http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                http2=self._http2_available(),
+                limits=httpx.Limits(
+                    max_connections=settings.llm_max_connections,
+                    max_keepalive_connections=settings.llm_max_keepalive_connections,
+                    keepalive_expiry=settings.llm_keepalive_expiry_seconds,
+                ),
+                timeout=httpx.Timeout(settings.llm_timeout_seconds, connect=settings.llm_connect_timeout_seconds),
+            )
+            # 底层连接池变了，基于旧连接池的客户端一并重建
+            self._openai_client = None
+            self._chat_models.clear()
+        return self._http_client
+
+    def openai_client(self) -> AsyncOpenAI:
+        http_client = self.http_client()
+        if self._openai_client is None:
+            self._openai_client = AsyncOpenAI(
+                api_key=settings.llm_api_key,
+                base_url=settings.llm_base_url,
+                http_client=http_client,
+                max_retries=0,  # 重试由 LLMDispatcher 统一处理
+            )
+        return self._openai_client
+
+    def chat_model(self, temperature: float = 0.7) -> ChatOpenAI:
+        """ChatOpenAI 按温度缓存；实例本身无状态，可在并发请求间共用"""
+        http_client = self.http_client()
+        model = self._chat_models.get(temperature)
+        if model is None:
+            model = ChatOpenAI(
+                api_key=settings.llm_api_key,
+                base_url=settings.llm_base_url,
+                model=settings.llm_model_name,
+                temperature=temperature,
+                http_async_client=http_client,
+                max_retries=0,
+            )
+            self._chat_models[temperature] = model
+        return model
+
+    async def close(self) -> None:
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        self._http_client = None
+        self._openai_client = None
+        self._chat_models.clear()
+
+
+llm_client_factory = LLMClientFactory()
@@ -0,0 +1,336 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import random
+import time
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+import httpx
+import openai
+
+from config import settings
+from service.context_packer import count_tokens
+from service.llm_cache import llm_cache
+from service.llm_client import llm_client_factory
+from utils.logger import logger
+from utils.tracing import record_openai_usage
+
+T = TypeVar("T")
+
+# 可重试的错误：限流、超时、连接失败、服务端 5xx
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    httpx.TimeoutException,
+)
+
+
+class Priority(IntEnum):
+    """数值越小越先获得并发槽位"""
+    INTERACTIVE = 0  # /ai 查询、创建记录时的内容抽取等用户在等待的调用
+    BACKGROUND = 1  # 后台生成总结
+
+
+def prompt_key(model: str, temperature: float, payload: Any) -> str:
+    """(模型, 温度, 提示内容) 的哈希，用于合并相同的进行中调用及回答缓存"""
+    raw = json.dumps([model, temperature, payload], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class PrioritySemaphore:
+    """带优先级的信号量：槽位释放时交给优先级最高（同优先级先到先得）的等待者"""
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters: List[Any] = []
+        self._seq = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    async def acquire(self, priority: int) -> None:
+        if self._value > 0 and not self.waiting:
+            self._value -= 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # 槽位已经交给了本等待者但它被取消：转交给下一个
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._value += 1
+
+
+class TokenBucket:
+    """令牌桶：每分钟补充 rate_per_minute 个令牌，容量为一分钟的量；rate 为 0 时不限流
+
+    令牌不足时排队，与 PrioritySemaphore 一样按优先级（同优先级先到先得）依次放行，
+    排在队首的等待者攒够令牌前后来者不会插队。
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.updated = time.monotonic()
+        self._waiters: List[Any] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _wake(self) -> None:
+        """按优先级放行令牌足够的等待者，并为新的队首安排下一次检查"""
+        self._refill()
+        while self._waiters:
+            _, _, amount, fut = self._waiters[0]
+            if fut.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.tokens < amount:
+                break
+            heapq.heappop(self._waiters)
+            self.tokens -= amount
+            fut.set_result(None)
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._waiters:
+            delay = (self._waiters[0][2] - self.tokens) / self.rate
+            self._timer = asyncio.get_running_loop().call_later(delay, self._wake)
+
+    async def acquire(self, amount: float = 1.0, priority: int = Priority.INTERACTIVE) -> float:
+        """取走 amount 个令牌，返回等待的秒数；单次需求超过容量时按容量计"""
+        if self.rate <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        self._refill()
+        if not self._waiters and self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        started = time.monotonic()
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), amount, fut))
+        self._wake()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # 令牌已经分给本等待者但它被取消：退回令牌，交给下一个
+            if fut.done() and not fut.cancelled():
+                self.tokens += amount
+            self._wake()
+            raise
+        return time.monotonic() - started
+
+
+class LLMDispatcher:
+    """所有 LLM 调用的统一出口
+
+    - 全局与按模型的并发上限，交互请求优先于后台任务获得槽位
+    - 按模型的请求数 / token 数令牌桶限流
+    - 限流、超时与 5xx 按指数退避加随机抖动重试，优先使用服务端给出的 Retry-After
+    - 相同提示的进行中调用只发一次请求，结果共享
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        max_concurrency_per_model: int = 4,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_retries: int = 3,
+        retry_base_delay: float = 1.0,
+        retry_max_delay: float = 20.0,
+    ):
+        self.max_concurrency_per_model = max_concurrency_per_model
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._global = PrioritySemaphore(max_concurrency)
+        self._models: Dict[str, PrioritySemaphore] = {}
+        self._request_buckets: Dict[str, TokenBucket] = {}
+        self._token_buckets: Dict[str, TokenBucket] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._stats = {"calls": 0, "coalesced": 0, "retries": 0, "rate_limited": 0, "failures": 0, "throttle_wait_s": 0.0}
+
+    def _model_semaphore(self, model: str) -> PrioritySemaphore:
+        if model not in self._models:
+            self._models[model] = PrioritySemaphore(self.max_concurrency_per_model)
+            self._request_buckets[model] = TokenBucket(self.requests_per_minute)
+            self._token_buckets[model] = TokenBucket(self.tokens_per_minute)
+        return self._models[model]
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        try:
+            return max(delay, min(float(retry_after), self.retry_max_delay)) if retry_after else delay
+        except ValueError:
+            return delay
+
+    async def _dispatch(
+        self, call: Callable[[], Awaitable[T]], model: str, estimated_tokens: int, priority: int
+    ) -> T:
+        model_semaphore = self._model_semaphore(model)
+        attempt = 0
+        while True:
+            # 先取限流令牌再占并发槽位：等待令牌期间不占槽位，其它模型的调用不受影响
+            self._stats["throttle_wait_s"] += await self._request_buckets[model].acquire(1, priority)
+            self._stats["throttle_wait_s"] += await self._token_buckets[model].acquire(estimated_tokens, priority)
+            # 先全局后按模型，顺序固定避免互相等待
+            await self._global.acquire(priority)
+            try:
+                await model_semaphore.acquire(priority)
+                try:
+                    self._stats["calls"] += 1
+                    return await call()
+                except RETRYABLE_ERRORS as e:
+                    if isinstance(e, openai.RateLimitError):
+                        self._stats["rate_limited"] += 1
+                    if attempt >= self.max_retries:
+                        self._stats["failures"] += 1
+                        raise
+                    error, delay = e, self._retry_delay(attempt, e)
+                finally:
+                    model_semaphore.release()
+            finally:
+                self._global.release()
+            # 退避期间不占用并发槽位
+            attempt += 1
+            self._stats["retries"] += 1
+            logger.warning(f"LLM 调用失败，{delay:.2f}s 后第 {attempt} 次重试: {type(error).__name__}: {error}")
+            await asyncio.sleep(delay)
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        *,
+        model: Optional[str] = None,
+        key: Optional[str] = None,
+        estimated_tokens: int = 0,
+        priority: int = Priority.INTERACTIVE,
+    ) -> T:
+        """经限流、重试执行一次 LLM 调用；给出 key 时与相同 key 的进行中调用合并"""
+        model = model or settings.llm_model_name
+        if key is None:
+            return await self._dispatch(call, model, estimated_tokens, priority)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._dispatch(call, model, estimated_tokens, priority))
+            self._inflight[key] = task
+
+            def _done(t: asyncio.Task) -> None:
+                if self._inflight.get(key) is t:
+                    del self._inflight[key]
+                if not t.cancelled():
+                    t.exception()  # 所有等待者都已取消时避免 "exception was never retrieved"
+
+            task.add_done_callback(_done)
+        else:
+            self._stats["coalesced"] += 1
+        # shield：某个等待者被取消不影响其他共享同一结果的调用方
+        return await asyncio.shield(task)
+
+    async def run_cached(
+        self,
+        call: Callable[[], Awaitable[Tuple[str, int]]],
+        *,
+        key: str,
+        cache_ttl: Optional[float],
+        bypass_cache: bool = False,
+        cacheable: Optional[Callable[[str], bool]] = None,
+        **run_kwargs,
+    ) -> str:
+        """带回答缓存的 run：call 返回 (回答文本, 消耗的 token 数)
+
+        cache_ttl 为 None 或未启用缓存时直接调用；bypass_cache 跳过查询但仍写入新结果；
+        cacheable 返回 False 的回答（如无法解析的 JSON）不写入缓存。
+        """
+        if cache_ttl is None or not settings.llm_cache_enabled:
+            text, _ = await self.run(call, key=key, **run_kwargs)
+            return text
+        if bypass_cache:
+            llm_cache.record_bypass()
+        else:
+            cached = await llm_cache.get(key)
+            if cached is not None:
+                return cached
+        # 与不走缓存的同一提示区分合并键：两者返回值类型不同
+        text, tokens = await self.run(call, key=f"cached:{key}", **run_kwargs)
+        if cacheable is None or cacheable(text):
+            await llm_cache.put(key, text, tokens, cache_ttl)
+        return text
+
+    async def chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        *,
+        temperature: float,
+        max_tokens: int,
+        priority: int = Priority.INTERACTIVE,
+        model: Optional[str] = None,
+        cache_ttl: Optional[float] = None,
+        bypass_cache: bool = False,
+        cacheable: Optional[Callable[[str], bool]] = None,
+    ) -> str:
+        """openai SDK 的 chat.completions.create，经调度层执行，返回回答文本"""
+        model = model or settings.llm_model_name
+
+        async def call() -> Tuple[str, int]:
+            response = await llm_client_factory.openai_client().chat.completions.create(
+                model=model, messages=messages, temperature=temperature, max_tokens=max_tokens
+            )
+            record_openai_usage(model, response.usage)
+            return response.choices[0].message.content or "", response.usage.total_tokens if response.usage else 0
+
+        return await self.run_cached(
+            call,
+            key=prompt_key(model, temperature, [messages, max_tokens]),
+            cache_ttl=cache_ttl,
+            bypass_cache=bypass_cache,
+            cacheable=cacheable,
+            model=model,
+            estimated_tokens=count_tokens("".join(m["content"] for m in messages)) + max_tokens,
+            priority=priority,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "throttle_wait_s": round(self._stats["throttle_wait_s"], 3),
+            "inflight": len(self._inflight),
+            "waiting": self._global.waiting + sum(s.waiting for s in self._models.values()),
+        }
+
+
+llm_dispatcher = LLMDispatcher(
+    max_concurrency=settings.llm_max_concurrency,
+    max_concurrency_per_model=settings.llm_max_concurrency_per_model,
+    requests_per_minute=settings.llm_requests_per_minute,
+    tokens_per_minute=settings.llm_tokens_per_minute,
+    max_retries=settings.llm_max_retries,
+    retry_base_delay=settings.llm_retry_base_delay_seconds,
+    retry_max_delay=settings.llm_retry_max_delay_seconds,
+)
@@ -0,0 +1,30 @@
+import re
+import unicodedata
+from typing import List, Optional
+
+# 中日韩统一表意文字连续片段 / 字母数字单词
+_TOKEN_PATTERN = re.compile(r"([㐀-䶿一-鿿豈-﫿]+)|([a-z0-9_]+)")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """全文检索分词：中文按字二元组（单字片段保留单字），英文数字按单词"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    tokens = []
+    for cjk, word in _TOKEN_PATTERN.findall(text):
+        if word:
+            tokens.append(word)
+        elif len(cjk) == 1:
+            tokens.append(cjk)
+        else:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+    return tokens
+
+
+def to_search_document(*texts: Optional[str]) -> str:
+    """写入时生成检索文档：空格分隔的 token 串，交给 to_tsvector('simple', ...)"""
+    return " ".join(token for t in texts for token in tokenize(t))
+
+
+def to_search_query(query: Optional[str]) -> str:
+    """查询时生成 to_tsquery('simple', ...) 表达式，任一 token 命中即可，按命中程度排序；无 token 时返回空串"""
+    return " | ".join(dict.fromkeys(tokenize(query)))
@@ -0,0 +1,249 @@
+import asyncio
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from models.daily_record import DailyRecord
+from utils.logger import logger
+
+
+class UserVectorIndex:
+    """单个用户的内存向量索引：连续 float32 矩阵 + 平行的记录 id / 日期数组，暴力点积检索"""
+
+    def __init__(self, ids: np.ndarray, dates: np.ndarray, matrix: np.ndarray, version: Dict):
+        self.ids = ids
+        self.dates = dates
+        self.matrix = matrix
+        self.version = version
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes + self.dates.nbytes + self.matrix.nbytes
+
+    def search(
+        self, qv: List[float], start_date: Optional[str], end_date: Optional[str], top_k: int
+    ) -> List[Tuple[int, float]]:
+        """返回时间窗内余弦相似度最高的 (record_id, similarity)，向量均已归一化，点积即余弦"""
+        mask = np.ones(len(self.ids), dtype=bool)
+        if start_date:
+            mask &= self.dates >= start_date
+        if end_date:
+            mask &= self.dates <= end_date
+        candidates = np.flatnonzero(mask)
+        if candidates.size == 0:
+            return []
+        scores = self.matrix[candidates] @ np.asarray(qv, dtype=np.float32)
+        k = min(top_k, candidates.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ids[candidates[i]]), float(scores[i])) for i in top]
+
+    def upsert(self, record_id: int, record_date: str, vector: Optional[List[float]]) -> None:
+        self.remove(record_id)
+        if vector is None:
+            return
+        # 快照以只读 mmap 方式加载，增量更新时会复制为内存数组
+        self.ids = np.append(self.ids, np.int64(record_id))
+        self.dates = np.append(self.dates, np.asarray([record_date], dtype=self.dates.dtype))
+        self.matrix = np.vstack([self.matrix, np.asarray(vector, dtype=np.float32)[None, :]])
+
+    def remove(self, record_id: int) -> None:
+        keep = self.ids != record_id
+        if keep.all():
+            return
+        self.ids, self.dates, self.matrix = self.ids[keep], self.dates[keep], self.matrix[keep]
+
+
+class UserVectorIndexCache:
+    """按用户懒加载的内存向量索引集合，按内存预算 LRU 淘汰，可选磁盘快照（mmap 加载，用于热重启）"""
+
+    def __init__(self, budget_mb: int, max_records: int, snapshot_dir: Optional[str] = None):
+        self.budget_bytes = budget_mb * 1024 * 1024
+        self.max_records = max_records
+        self.snapshot_dir = snapshot_dir or None
+        self._indexes: "OrderedDict[int, UserVectorIndex]" = OrderedDict()
+        self._too_large: set = set()
+        self._load_locks: Dict[int, asyncio.Lock] = {}
+        # 正在加载的用户 -> 加载期间发生的写入次数；有写入时加载结果可能缺少这些写入，不能使用
+        self._loading_writes: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "loads": 0, "snapshot_loads": 0, "evictions": 0, "skipped": 0, "discarded": 0}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(index.nbytes for index in self._indexes.values())
+
+    async def get(self, session: AsyncSession, user_id: int) -> Optional[UserVectorIndex]:
+        """获取用户索引，未加载时从快照或数据库加载；记录数超过上限的用户返回 None（走 pgvector）"""
+        index = self._indexes.get(user_id)
+        if index is not None:
+            self._indexes.move_to_end(user_id)
+            self._stats["hits"] += 1
+            return index
+        if user_id in self._too_large:
+            self._stats["skipped"] += 1
+            return None
+        lock = self._load_locks.setdefault(user_id, asyncio.Lock())
+        try:
+            async with lock:
+                index = self._indexes.get(user_id)
+                if index is None:
+                    self._loading_writes[user_id] = 0
+                    try:
+                        index = await self._load(session, user_id)
+                    finally:
+                        writes = self._loading_writes.pop(user_id)
+                    if index is not None and writes:
+                        # 本次请求走 pgvector，下次访问重新加载
+                        logger.info(f"用户 {user_id} 内存向量索引加载期间有 {writes} 次写入，丢弃加载结果")
+                        self._stats["discarded"] += 1
+                        index = None
+                    elif index is not None:
+                        await self._put(user_id, index)
+                        logger.info(f"用户 {user_id} 内存向量索引已加载: {len(index.ids)} 条")
+        finally:
+            # 加载结束后索引已在 _indexes 中（或用户已记入 _too_large、加载结果已丢弃），锁不再需要；
+            # 仍在等待这把锁的请求持有它的引用，照常依次执行
+            if self._load_locks.get(user_id) is lock:
+                del self._load_locks[user_id]
+        return index
+
+    async def _load(self, session: AsyncSession, user_id: int) -> Optional[UserVectorIndex]:
+        result = await session.execute(
+            text("""
+                SELECT count(*) AS n, max(id) AS max_id, max(updated_at) AS max_updated_at
+                FROM daily_records
+                WHERE user_id = :user_id AND vector IS NOT NULL
+            """),
+            {"user_id": user_id},
+        )
+        row = result.one()
+        if row.n > self.max_records:
+            self._too_large.add(user_id)
+            return None
+        version = {
+            "n": row.n,
+            "max_id": row.max_id,
+            "max_updated_at": row.max_updated_at.isoformat() if row.max_updated_at else None,
+        }
+
+        index = self._load_snapshot(user_id, version)
+        if index is not None:
+            self._stats["snapshot_loads"] += 1
+            return index
+
+        result = await session.execute(
+            select(DailyRecord.id, DailyRecord.record_date, DailyRecord.vector)
+            .where(DailyRecord.user_id == user_id, DailyRecord.vector.isnot(None))
+        )
+        rows = result.fetchall()
+        self._stats["loads"] += 1
+        if not rows:
+            return UserVectorIndex(
+                np.empty(0, dtype=np.int64), np.empty(0, dtype="U10"),
+                np.empty((0, 0), dtype=np.float32), version,
+            )
+        return UserVectorIndex(
+            np.fromiter((r.id for r in rows), dtype=np.int64, count=len(rows)),
+            np.asarray([r.record_date for r in rows], dtype="U10"),
+            np.ascontiguousarray(np.stack([np.asarray(r.vector, dtype=np.float32) for r in rows])),
+            version,
+        )
+
+    async def _put(self, user_id: int, index: UserVectorIndex) -> None:
+        evicted = []
+        with self._lock:
+            self._indexes[user_id] = index
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > 1 and self.nbytes > self.budget_bytes:
+                evicted.append(self._indexes.popitem(last=False))
+                self._stats["evictions"] += 1
+        # 写快照是磁盘 IO，放到线程中，不阻塞事件循环
+        for evicted_id, evicted_index in evicted:
+            await asyncio.to_thread(self._save_snapshot, evicted_id, evicted_index)
+
+    def on_upsert(self, user_id: int, record_id: int, record_date: str, vector: Optional[List[float]]) -> None:
+        """DailyRecordCRUD 写入后增量更新（只更新已加载的用户）"""
+        # 记录数变了，超过上限的用户下次访问时重新判断
+        self._too_large.discard(user_id)
+        if user_id in self._loading_writes:
+            self._loading_writes[user_id] += 1
+        index = self._indexes.get(user_id)
+        if index is None:
+            return
+        if index.matrix.shape[1] == 0 and vector is not None:
+            index.matrix = np.empty((0, len(vector)), dtype=np.float32)
+        index.upsert(record_id, record_date, vector)
+        index.version = None
+
+    def on_delete(self, user_id: int, record_id: int) -> None:
+        self._too_large.discard(user_id)
+        if user_id in self._loading_writes:
+            self._loading_writes[user_id] += 1
+        index = self._indexes.get(user_id)
+        if index is not None:
+            index.remove(record_id)
+            index.version = None
+
+    def _snapshot_paths(self, user_id: int) -> Dict[str, str]:
+        base = os.path.join(self.snapshot_dir, str(user_id))
+        return {name: f"{base}.{name}.npy" for name in ("ids", "dates", "matrix")} | {"meta": f"{base}.meta.json"}
+
+    def _load_snapshot(self, user_id: int, version: Dict) -> Optional[UserVectorIndex]:
+        if not self.snapshot_dir:
+            return None
+        paths = self._snapshot_paths(user_id)
+        if not os.path.exists(paths["meta"]):
+            return None
+        with open(paths["meta"], "r", encoding="utf-8") as f:
+            if json.load(f) != version:
+                return None
+        return UserVectorIndex(
+            np.load(paths["ids"], mmap_mode="r"),
+            np.load(paths["dates"], mmap_mode="r"),
+            np.load(paths["matrix"], mmap_mode="r"),
+            version,
+        )
+
+    def _save_snapshot(self, user_id: int, index: UserVectorIndex) -> None:
+        # 增量更新过的索引版本未知，不写快照，下次从数据库重新加载
+        if not self.snapshot_dir or index.version is None:
+            return
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        paths = self._snapshot_paths(user_id)
+        # 先写临时文件再替换：旧快照可能正被 mmap 引用，不能原地覆盖
+        for name in ("ids", "dates", "matrix"):
+            tmp_path = paths[name] + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, getattr(index, name))
+            os.replace(tmp_path, paths[name])
+        tmp_path = paths["meta"] + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index.version, f)
+        os.replace(tmp_path, paths["meta"])
+
+    def save_all(self) -> None:
+        """关闭时把已加载的索引写入快照"""
+        for user_id, index in list(self._indexes.items()):
+            self._save_snapshot(user_id, index)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            **self._stats,
+            "users": len(self._indexes),
+            "memory_mb": round(self.nbytes / 1024 / 1024, 2),
+        }
+
+
+user_vector_index = UserVectorIndexCache(
+    budget_mb=settings.user_vector_index_budget_mb,
+    max_records=settings.user_vector_index_max_records,
+    snapshot_dir=settings.user_vector_index_snapshot_dir,
+)
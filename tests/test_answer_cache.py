@@ -0,0 +1,63 @@
+import asyncio
+
+from agents.langgraph import graph
+from config import settings
+from service.answer_cache import AnswerCache
+
+
+def test_lookup_requires_same_scope_and_returns_a_copy():
+    cache = AnswerCache(similarity_threshold=0.9)
+    today = (("2026-10-17", "2026-10-17"), "today_summary")
+    cache.store(1, "今天心情怎么样", [1.0, 0.0], {"data": {"answer": "不错"}}, version=0, scope=today)
+
+    assert cache.lookup(1, [1.0, 0.0], (("2026-10-16", "2026-10-16"), "today_summary")) is None
+    hit = cache.lookup(1, [1.0, 0.0], today)
+    hit["data"]["answer"] = "被调用方修改"
+    assert cache.lookup(1, [1.0, 0.0], today) == {"data": {"answer": "不错"}}
+
+
+class FakeGraph:
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.cancelled = False
+
+    async def ainvoke(self, state, config):
+        self.started.set()
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return {"result": {"data": {"answer": "新回答", "confidence": "高"}}}
+
+
+def run_respond(monkeypatch, cache):
+    fake = FakeGraph()
+
+    async def fake_embed(text):
+        await asyncio.sleep(0.01)
+        return [1.0, 0.0]
+
+    monkeypatch.setattr(settings, "answer_cache_enabled", True)
+    monkeypatch.setattr(graph, "answer_cache", cache)
+    monkeypatch.setattr(graph, "agent_graph", fake)
+    monkeypatch.setattr(graph, "generate_vectors_async", fake_embed)
+    result = asyncio.run(graph.respond(1, "帮我总结一下我的读书记录", session=None))
+    return result, fake
+
+
+def test_graph_runs_concurrently_with_lookup_on_miss(monkeypatch):
+    cache = AnswerCache(similarity_threshold=0.9)
+    result, fake = run_respond(monkeypatch, cache)
+    assert result["data"]["answer"] == "新回答"
+    assert not fake.cancelled
+    assert cache.stats()["stores"] == 1
+
+
+def test_cache_hit_cancels_the_running_graph(monkeypatch):
+    cache = AnswerCache(similarity_threshold=0.9)
+    scope = graph._answer_scope("帮我总结一下我的读书记录")
+    cache.store(1, "帮我总结一下读书记录", [1.0, 0.0], {"data": {"answer": "缓存回答"}}, version=0, scope=scope)
+    result, fake = run_respond(monkeypatch, cache)
+    assert result == {"data": {"answer": "缓存回答"}}
+    assert fake.cancelled
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from agents.langgraph.graph import AnswerFieldStream
+
+OUTPUT = json.dumps(
+    {"answer": "最近心情不错 \"开心\"\n第二行\\结束 😀", "evidence": ["不应下发"], "confidence": "高"},
+    ensure_ascii=False,
+)
+
+
+def feed_all(chunks):
+    stream = AnswerFieldStream()
+    return "".join(stream.feed(chunk) for chunk in chunks)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, len(OUTPUT)])
+def test_only_answer_field_is_streamed(size):
+    chunks = [OUTPUT[i:i + size] for i in range(0, len(OUTPUT), size)]
+    assert feed_all(chunks) == json.loads(OUTPUT)["answer"]
+
+
+@pytest.mark.parametrize("size", [1, 5])
+def test_unicode_escapes_split_across_chunks(size):
+    output = json.dumps({"answer": "心情 😀 好"})  # ensure_ascii：中文与代理对都写成 \uXXXX
+    chunks = [output[i:i + size] for i in range(0, len(output), size)]
+    assert feed_all(chunks) == "心情 😀 好"
+
+
+def test_nothing_before_answer_key_or_after_closing_quote():
+    stream = AnswerFieldStream()
+    assert stream.feed('```json\n{"confidence": "高", ') == ""
+    assert stream.feed('"answer" : "好') == "好"
+    assert stream.feed('的", "sources": ["x"]}') == "的"
+    assert stream.feed('"answer": "再来"') == ""
@@ -0,0 +1,65 @@
+from service.context_packer import count_tokens, pack_records
+
+FIELDS = ("work_activities", "personal_activities", "learning_activities", "health_activities")
+
+
+def render(record):
+    """与总结提示相同的渲染方式：正文之外还有反思与活动列表"""
+    lines = [f"{record.get('record_date')} 心情{record.get('mood_score')}: {record.get('content') or ''}"]
+    if record.get("reflections"):
+        lines.append(f"反思: {record['reflections']}")
+    for field in FIELDS:
+        if record.get(field):
+            lines.append(", ".join(record[field]))
+    return "\n".join(lines)
+
+
+def make_record(record_date, content="今天写了报告，开了两个会。", **extra):
+    return {"record_date": record_date, "content": content, "mood_score": 7, **extra}
+
+
+def test_long_reflections_are_truncated_not_dropped():
+    record = make_record(
+        "2026-10-17",
+        content="上午整理了季度数据，下午和团队讨论方案。" * 20,
+        reflections="今天的反思很长，需要认真想一想接下来怎么安排时间。" * 40,
+        work_activities=[f"任务{i}" for i in range(50)],
+    )
+    assert count_tokens(render(record)) > 300
+
+    packed = pack_records([record], budget_tokens=3000, render=render, max_record_tokens=300)
+
+    assert len(packed) == 1
+    assert count_tokens(render(packed[0])) <= 300
+    assert packed[0]["content"]
+    assert packed[0]["reflections"]
+
+
+def _old_and_newest():
+    older = [make_record(f"2026-10-0{i}", content="很长的旧记录内容。" * 30, score=1.0) for i in range(1, 8)]
+    newest = make_record("2026-10-17", content="当天的记录。" * 30, score=0.0)
+    return older + [newest]
+
+
+def test_pinned_newest_record_is_always_kept():
+    packed = pack_records(_old_and_newest(), budget_tokens=200, render=render, max_record_tokens=150, pin_newest=True)
+
+    assert packed[-1]["record_date"] == "2026-10-17"
+    assert sum(count_tokens(render(r)) for r in packed) <= 200
+
+
+def test_unpinned_packing_follows_rank_order():
+    # RAG 上下文：融合分数最高的记录优先，最新但不相关的记录不占预算
+    packed = pack_records(_old_and_newest(), budget_tokens=200, render=render, max_record_tokens=150)
+
+    assert "2026-10-17" not in [r["record_date"] for r in packed]
+    assert packed[0]["score"] == 1.0
+
+
+def test_records_within_budget_are_untouched_and_sorted():
+    records = [make_record("2026-10-03"), make_record("2026-10-01"), make_record("2026-10-02")]
+
+    packed = pack_records(records, budget_tokens=3000, render=render, max_record_tokens=300)
+
+    assert [r["record_date"] for r in packed] == ["2026-10-01", "2026-10-02", "2026-10-03"]
+    assert [r["content"] for r in packed] == [r["content"] for r in records]
@@ -0,0 +1,44 @@
+from datetime import date
+
+import pytest
+
+from agents.langgraph.date_parser import parse_date_range
+
+TODAY = date(2026, 10, 17)  # 周六
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("今天心情怎么样", ("2026-10-17", "2026-10-17")),
+        ("昨天做了什么", ("2026-10-16", "2026-10-16")),
+        ("3天前", ("2026-10-14", "2026-10-14")),
+        ("上周三干了啥", ("2026-10-07", "2026-10-07")),
+        ("上个月的运动情况", ("2026-09-01", "2026-09-30")),
+        ("3月5日", ("2026-03-05", "2026-03-05")),
+        ("去年12月", ("2025-12-01", "2025-12-31")),
+        ("最近一周", ("2026-10-10", "2026-10-17")),
+        # 多个日期表达：取覆盖全部表达的范围
+        ("这个月和上个月比怎么样", ("2026-09-01", "2026-10-17")),
+        ("从上周到今天的变化", ("2026-10-05", "2026-10-17")),
+        ("今天和上周比心情怎么样", ("2026-10-05", "2026-10-17")),
+        # 周X到周Y 在同一周
+        ("我这周一到周三", ("2026-10-12", "2026-10-14")),
+        ("上周五到周日", ("2026-10-09", "2026-10-11")),
+        # "两月"是时长，不是二月
+        ("最近两月", ("2026-08-18", "2026-10-17")),
+        ("近3月的睡眠", ("2026-07-19", "2026-10-17")),
+    ],
+)
+def test_parse_date_range(query, expected):
+    assert parse_date_range(query, today=TODAY) == expected
+
+
+@pytest.mark.parametrize("query", ["一月一次", "每月跑步几次", "心情怎么样", ""])
+def test_no_date_expression(query):
+    assert parse_date_range(query, today=TODAY) is None
+
+
+def test_end_date_clamped_to_today():
+    assert parse_date_range("这周", today=TODAY) == ("2026-10-12", "2026-10-17")
+    assert parse_date_range("10月", today=TODAY) == ("2026-10-01", "2026-10-17")
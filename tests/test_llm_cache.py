@@ -0,0 +1,78 @@
+import asyncio
+import types
+
+import pytest
+
+from config import settings
+from service import llm_cache as llm_cache_module
+from service import llm_dispatcher as llm_dispatcher_module
+from service.llm_cache import LLMResponseCache
+from service.llm_dispatcher import LLMDispatcher
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache_module, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = LLMResponseCache(max_entries=10)
+    asyncio.run(cache.put("k", "回答", 30, ttl_seconds=60))
+    assert asyncio.run(cache.get("k")) == "回答"
+    clock[0] += 61
+    assert asyncio.run(cache.get("k")) is None
+    stats = cache.stats()
+    assert stats["expired"] == 1 and stats["memory_hits"] == 1 and stats["tokens_saved"] == 30
+
+
+def test_lookup_promotes_entry_in_lru(clock):
+    cache = LLMResponseCache(max_entries=2)
+
+    async def scenario():
+        await cache.put("a", "A", 1, 60)
+        await cache.put("b", "B", 1, 60)
+        assert await cache.get("a") == "A"  # a 变为最近使用，c 写入时淘汰 b
+        await cache.put("c", "C", 1, 60)
+        return await cache.get("a"), await cache.get("b"), await cache.get("c")
+
+    assert asyncio.run(scenario()) == ("A", None, "C")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_tier_survives_restart_and_drops_expired_rows(clock, tmp_path):
+    path = str(tmp_path / "llm_cache.db")
+    asyncio.run(LLMResponseCache(path=path).put("k", "回答", 5, 60))
+
+    restarted = LLMResponseCache(path=path)
+    assert asyncio.run(restarted.get("k")) == "回答"
+    assert restarted.stats()["disk_hits"] == 1
+
+    clock[0] += 61
+    fresh = LLMResponseCache(path=path)
+    assert asyncio.run(fresh.get("k")) is None
+    assert fresh._disk_get("k") is None
+
+
+def test_run_cached_skips_uncacheable_answers(monkeypatch, clock):
+    cache = LLMResponseCache()
+    monkeypatch.setattr(llm_dispatcher_module, "llm_cache", cache)
+    monkeypatch.setattr(settings, "llm_cache_enabled", True)
+    dispatcher = LLMDispatcher()
+    answers = iter(["不是JSON", '{"ok": true}', "不应调用"])
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return next(answers), 10
+
+    async def run():
+        return await dispatcher.run_cached(
+            call, key="k", cache_ttl=60, cacheable=lambda text: text.startswith("{"), model="m"
+        )
+
+    assert asyncio.run(run()) == "不是JSON"
+    assert asyncio.run(run()) == '{"ok": true}'
+    assert asyncio.run(run()) == '{"ok": true}'
+    assert len(calls) == 2
@@ -0,0 +1,116 @@
+import asyncio
+import types
+
+import pytest
+
+from service.llm_dispatcher import LLMDispatcher, Priority, PrioritySemaphore, TokenBucket
+
+
+def test_priority_semaphore_wakes_highest_priority_first():
+    async def scenario():
+        sem = PrioritySemaphore(1)
+        await sem.acquire(Priority.BACKGROUND)
+        order = []
+
+        async def waiter(name, priority):
+            await sem.acquire(priority)
+            order.append(name)
+            sem.release()
+
+        tasks = [asyncio.create_task(waiter("bg1", Priority.BACKGROUND))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(waiter("bg2", Priority.BACKGROUND)))
+        tasks.append(asyncio.create_task(waiter("interactive", Priority.INTERACTIVE)))
+        await asyncio.sleep(0)
+        sem.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["interactive", "bg1", "bg2"]
+
+
+def test_cancelled_granted_waiter_hands_slot_to_next():
+    async def scenario():
+        sem = PrioritySemaphore(1)
+        await sem.acquire(Priority.INTERACTIVE)
+        first = asyncio.create_task(sem.acquire(Priority.INTERACTIVE))
+        second = asyncio.create_task(sem.acquire(Priority.BACKGROUND))
+        await asyncio.sleep(0)
+        sem.release()  # 槽位交给 first，但它在恢复执行前被取消
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await asyncio.wait_for(second, timeout=1)
+        return sem._value, sem.waiting
+
+    assert asyncio.run(scenario()) == (0, 0)
+
+
+def test_token_bucket_serves_waiters_by_priority():
+    async def scenario():
+        bucket = TokenBucket(600)  # 每秒 10 个
+        bucket.tokens = 0
+        order = []
+
+        async def waiter(name, priority):
+            await bucket.acquire(1, priority)
+            order.append(name)
+
+        tasks = [asyncio.create_task(waiter("bg", Priority.BACKGROUND))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(waiter("interactive", Priority.INTERACTIVE)))
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["interactive", "bg"]
+
+
+def test_token_bucket_refunds_tokens_granted_to_cancelled_waiter():
+    async def scenario():
+        bucket = TokenBucket(60)  # 每秒 1 个，测试期间补充可以忽略
+        bucket.tokens = 0
+        task = asyncio.create_task(bucket.acquire(5))
+        await asyncio.sleep(0)
+        bucket.tokens = 10
+        bucket._wake()  # 令牌分给等待者，但它在恢复执行前被取消
+        assert bucket.tokens < 6
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return bucket.tokens
+
+    assert asyncio.run(scenario()) == pytest.approx(10, abs=0.5)
+
+
+def _rate_limit_error(retry_after):
+    return types.SimpleNamespace(response=types.SimpleNamespace(headers={"retry-after": retry_after}))
+
+
+def test_retry_delay_honours_retry_after_within_cap():
+    dispatcher = LLMDispatcher(retry_base_delay=0.01, retry_max_delay=20)
+    assert dispatcher._retry_delay(0, _rate_limit_error("7")) == pytest.approx(7)
+    assert dispatcher._retry_delay(0, _rate_limit_error("120")) == pytest.approx(20)
+    # 无法解析或没有 Retry-After 时只用指数退避加抖动
+    assert dispatcher._retry_delay(0, _rate_limit_error("soon")) <= 0.01
+    assert dispatcher._retry_delay(3, RuntimeError("boom")) <= 0.08
+
+
+def test_run_with_key_shares_one_call_across_callers():
+    async def scenario():
+        dispatcher = LLMDispatcher()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "回答"
+
+        callers = [asyncio.create_task(dispatcher.run(call, model="m", key="same")) for _ in range(3)]
+        await asyncio.sleep(0)
+        callers[0].cancel()  # 一个调用方取消不影响其他共享结果的调用方
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        return results, len(calls), dispatcher.stats()
+
+    results, call_count, stats = asyncio.run(scenario())
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert results[1:] == ["回答", "回答"]
+    assert call_count == 1
+    assert stats["coalesced"] == 2 and stats["inflight"] == 0
@@ -0,0 +1,168 @@
+import asyncio
+import random
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+from agents.langgraph import nodes
+from config import settings
+
+TODAY = date.today()
+CONFIG = {"min_results_for_llm_check": 2, "time_expansion_steps": [7, 14, 30, 60], "max_attempts": 3, "max_time_range": 60}
+ORIGINAL = ((TODAY - timedelta(days=7)).isoformat(), TODAY.isoformat())
+
+# 与 _ranked_hits_ctes 相同的两路排序（组内 ROW_NUMBER），换成 SQLite 可执行的写法；
+# 融合、排序与取行部分直接使用 _hybrid_search_sql 的原始 SQL
+SQLITE_HITS_CTES = """
+    vector_hits AS (
+        SELECT id, similarity, ROW_NUMBER() OVER (ORDER BY similarity DESC) AS rn
+        FROM (SELECT id, similarity FROM daily_records WHERE {where} AND similarity IS NOT NULL
+              ORDER BY similarity DESC LIMIT :top_k)
+    ),
+    fts_hits AS (
+        SELECT id, fts_score, ROW_NUMBER() OVER (ORDER BY fts_score DESC) AS rn
+        FROM (SELECT id, fts_score FROM daily_records WHERE {where} AND fts_score IS NOT NULL
+              ORDER BY fts_score DESC LIMIT :top_k)
+    )"""
+
+
+def make_rows(n=120, seed=7):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(1, n + 1):
+        rows.append({
+            "id": i,
+            "user_id": 1,
+            "record_date": (TODAY - timedelta(days=rng.randrange(0, 75))).isoformat(),
+            "content": f"记录{i}",
+            "mood_score": 5,
+            "reflections": None,
+            "similarity": rng.random() if rng.random() < 0.8 else None,
+            "fts_score": rng.random() if rng.random() < 0.5 else None,
+        })
+    return rows
+
+
+class SqlReference:
+    """在 SQLite 中执行 _hybrid_search_sql 的融合部分，作为内存 RRF 的对照"""
+
+    def __init__(self, rows, monkeypatch):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.row_factory = sqlite3.Row
+        # PostgreSQL 的 LEAST 忽略 NULL
+        self.conn.create_function("LEAST", 2, lambda a, b: min(x for x in (a, b) if x is not None))
+        self.conn.execute(
+            "CREATE TABLE daily_records (id INTEGER PRIMARY KEY, user_id INTEGER, record_date TEXT, content TEXT, "
+            "mood_score INTEGER, reflections TEXT, similarity REAL, fts_score REAL)"
+        )
+        self.conn.executemany(
+            "INSERT INTO daily_records VALUES (:id, :user_id, :record_date, :content, :mood_score, :reflections, "
+            ":similarity, :fts_score)",
+            rows,
+        )
+        monkeypatch.setattr(
+            nodes, "_ranked_hits_ctes",
+            lambda where_sql, with_fts, memory_vectors=False: SQLITE_HITS_CTES.format(where=where_sql),
+        )
+
+    def search(self, start_date, end_date, top_k=10):
+        where_sql, params, _ = nodes._search_params([0.0], "", 1, start_date, end_date, top_k)
+        params.pop("qv")
+        params["rrf_k"] = nodes.RRF_K
+        rows = self.conn.execute(nodes._hybrid_search_sql(where_sql, True), params).fetchall()
+        return [{"id": r["id"], "score": r["rrf_score"]} for r in rows]
+
+
+def assert_same_ranking(memory, reference):
+    # 分数相同的记录在 SQL 中顺序不确定，按分数逐位比较，同分内比较集合
+    assert [r["score"] for r in memory] == pytest.approx([r["score"] for r in reference])
+    key = lambda r: (-round(r["score"], 12), r["id"])  # noqa: E731
+    assert [r["id"] for r in sorted(memory, key=key)] == [r["id"] for r in sorted(reference, key=key)]
+
+
+def test_in_memory_rrf_matches_sql_for_each_window(monkeypatch):
+    rows = make_rows()
+    reference = SqlReference(rows, monkeypatch)
+    candidates = nodes.RankedCandidates(rows, limit=1000)
+    windows = nodes._expansion_windows(*ORIGINAL, CONFIG)
+    assert len(windows) == 3
+    for start_date, end_date in windows:
+        memory = candidates.search(start_date, end_date)
+        assert memory is not None
+        assert_same_ranking(memory, reference.search(start_date, end_date))
+
+
+def test_top_ranked_hit_scores_one_over_rrf_k():
+    rows = [
+        {"id": 1, "record_date": TODAY.isoformat(), "similarity": 0.9, "fts_score": 0.5},
+        {"id": 2, "record_date": TODAY.isoformat(), "similarity": 0.8, "fts_score": None},
+    ]
+    ranked = nodes.RankedCandidates(rows, limit=100).search(None, None)
+    assert ranked[0]["id"] == 1
+    assert ranked[0]["score"] == pytest.approx(2 / nodes.RRF_K)
+    assert ranked[1]["score"] == pytest.approx(1 / (nodes.RRF_K + 1))
+
+
+def test_truncated_candidates_fall_back_when_window_is_short(monkeypatch):
+    rows = make_rows()
+    reference = SqlReference(rows, monkeypatch)
+    # 按 limit 截断两路候选，模拟 _fetch_ranked_candidates 的 LIMIT
+    vector_ids = {r["id"] for r in sorted(rows, key=lambda r: -(r["similarity"] or -1))[:15]}
+    fts_ids = {r["id"] for r in sorted(rows, key=lambda r: -(r["fts_score"] or -1))[:15]}
+    truncated = [
+        {**r, "similarity": r["similarity"] if r["id"] in vector_ids else None,
+         "fts_score": r["fts_score"] if r["id"] in fts_ids else None}
+        for r in rows if r["id"] in vector_ids | fts_ids
+    ]
+    candidates = nodes.RankedCandidates(truncated, limit=15)
+    assert candidates.vector_truncated and candidates.fts_truncated
+
+    # 窗口内截断后的候选不足 top_k：无法保证与 SQL 一致
+    assert candidates.search(*ORIGINAL) is None
+    # 不限时间窗时截断后的前 top_k 与全量一致
+    assert_same_ranking(candidates.search(None, None), reference.search(None, None))
+
+
+def run_retrieve(monkeypatch, rows, mode, judge):
+    reference = SqlReference(rows, monkeypatch)
+    llm_calls = []
+
+    async def fake_search(session, qv, query, user_id, start_date, end_date, top_k=10):
+        ids = [r["id"] for r in reference.search(start_date, end_date, top_k)]
+        by_id = {r["id"]: r for r in rows}
+        return [dict(by_id[i]) for i in ids]
+
+    async def fake_fetch(session, qv, query, user_id, start_date, end_date, limit):
+        return nodes.RankedCandidates([dict(r) for r in rows], limit)
+
+    async def fake_llm(query, records):
+        llm_calls.append(len(records))
+        return judge(len(llm_calls))
+
+    monkeypatch.setattr(settings, "retrieval_expansion_mode", mode)
+    monkeypatch.setattr(settings, "relevance_gate_enabled", False)
+    monkeypatch.setattr(nodes, "_get_retrieval_config", lambda intent: CONFIG)
+    monkeypatch.setattr(nodes, "_search_in_time_range", fake_search)
+    monkeypatch.setattr(nodes, "_fetch_ranked_candidates", fake_fetch)
+    monkeypatch.setattr(nodes, "llm_check_relevance", fake_llm)
+    state = {
+        "user_id": 1, "query": "最近心情", "query_vector": [0.0], "intent": "recent_summary",
+        "original_start_date": ORIGINAL[0], "original_end_date": ORIGINAL[1],
+    }
+    result = asyncio.run(nodes.retrieve_node(state, {"configurable": {"session": None}}))
+    return result, llm_calls
+
+
+@pytest.mark.parametrize("accept_on", [1, 2, 3, None])
+def test_single_fetch_matches_iterative_after_llm_rejections(monkeypatch, accept_on):
+    def judge(call):
+        can_answer = call == accept_on
+        return {"can_answer": can_answer, "confidence": "中", "reason": f"第 {call} 次"}
+
+    rows = make_rows()
+    iterative, iterative_calls = run_retrieve(monkeypatch, rows, "iterative", judge)
+    single, single_calls = run_retrieve(monkeypatch, rows, "single_fetch", judge)
+    assert single_calls == iterative_calls
+    assert [r["id"] for r in single["retrieved"]] == [r["id"] for r in iterative["retrieved"]]
+    assert single["search_logs"] == iterative["search_logs"]
@@ -0,0 +1,40 @@
+from agents.langgraph.relevance import DEFAULT_THRESHOLDS, decide, relevance_features
+
+T = DEFAULT_THRESHOLDS["general_qa"]  # accept 0.60, reject 0.35, margin_accept 0.55, min_margin 0.10, high 0.70
+
+
+def features(*similarities):
+    return relevance_features([{"similarity": s} for s in similarities])
+
+
+def test_rejects_below_reject_threshold():
+    result = decide(features(0.30, 0.20), T)
+    assert result["can_answer"] is False
+    assert result["confidence"] == "低"
+
+
+def test_accepts_above_accept_threshold():
+    assert decide(features(0.65, 0.64), T)["confidence"] == "中"
+    assert decide(features(0.75, 0.74), T)["confidence"] == "高"
+
+
+def test_accepts_on_margin_below_accept_threshold():
+    result = decide(features(0.57, 0.40), T)
+    assert result["can_answer"] is True
+
+
+def test_ambiguous_band_defers_to_llm():
+    assert decide(features(0.50, 0.45), T) is None
+    # 超过 margin_accept 但领先不足
+    assert decide(features(0.57, 0.52), T) is None
+
+
+def test_unscored_results_defer_to_llm():
+    assert decide(relevance_features([{"similarity": None}]), T) is None
+
+
+def test_min_count_defers_acceptance_but_not_rejection():
+    t = {**T, "min_count": 3}
+    assert decide(features(0.80, 0.70), t) is None
+    assert decide(features(0.80, 0.70, 0.60), t)["can_answer"] is True
+    assert decide(features(0.20), t)["can_answer"] is False
@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from agents.langgraph import nodes
+from config import settings
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+
+    async def fake_vectors(query):
+        calls.append(("embed", query))
+        return [0.0]
+
+    async def fake_prefilter(session, user_id, start_date, end_date):
+        calls.append(("prefilter", start_date, end_date))
+        return []
+
+    monkeypatch.setattr(settings, "agent_speculative_prefetch", True)
+    monkeypatch.setattr(nodes, "generate_vectors_async", fake_vectors)
+    monkeypatch.setattr(nodes, "_prefilter_candidates", fake_prefilter)
+    return calls
+
+
+def speculate(query):
+    state = {"user_id": 1, "query": query}
+    return asyncio.run(nodes.speculate_node(state, {"configurable": {"session": None}}))
+
+
+@pytest.mark.parametrize("query", ["最近几天心情怎么样", "这个月的睡眠趋势"])
+def test_rag_queries_are_speculated(calls, query):
+    result = speculate(query)
+    assert result["speculative_vector"] == [0.0]
+    assert [c[0] for c in calls] == ["embed", "prefilter"]
+
+
+@pytest.mark.parametrize("query", ["帮我总结一下今天", "我喜欢吃什么", "今天和上周比怎么样"])
+def test_other_queries_skip_speculation(calls, query):
+    assert speculate(query) == {}
+    assert calls == []
@@ -0,0 +1,43 @@
+import re
+
+import pytest
+
+from service.text_search import to_search_document, to_search_query, tokenize
+
+
+def test_mixed_cjk_and_ascii():
+    assert tokenize("今天跑步5km，心情OK") == ["今天", "天跑", "跑步", "5km", "心情", "ok"]
+
+
+def test_single_character_cjk_runs_are_kept():
+    assert tokenize("猫 and 狗") == ["猫", "and", "狗"]
+    assert tokenize("读书、写字。看") == ["读书", "写字", "看"]
+
+
+def test_full_width_input_is_nfkc_normalized():
+    assert tokenize("ＧＰＴ４　ｔｅｓｔ") == ["gpt4", "test"]
+    assert tokenize("ＡＢＣ") == tokenize("abc")
+
+
+@pytest.mark.parametrize("query", [None, "", "   ", "，。！？", "!!! & | :*"])
+def test_empty_queries(query):
+    assert tokenize(query) == []
+    assert to_search_query(query) == ""
+    assert to_search_document(query) == ""
+
+
+def test_query_deduplicates_and_ors_tokens():
+    assert to_search_query("心情心情 run run") == "心情 | 情心 | run"
+
+
+@pytest.mark.parametrize("text", ["最近心情怎么样", "Ｒｕｎ 5km 跑步", "猫", "上周和 today 比 mood 如何"])
+def test_query_tokens_match_document_tokens(text):
+    document_tokens = set(to_search_document(text).split())
+    query_tokens = to_search_query(text).split(" | ")
+    assert query_tokens and set(query_tokens) <= document_tokens
+    # tsquery 的运算符与引号不会出现在 token 中
+    assert all(re.fullmatch(r"[^\s&|!:*()'\\]+", t) for t in query_tokens)
+
+
+def test_document_joins_all_fields():
+    assert to_search_document("今天", None, "ok") == "今天 ok"
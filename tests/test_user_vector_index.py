@@ -0,0 +1,51 @@
+import asyncio
+
+import numpy as np
+
+from service.user_vector_index import UserVectorIndex, UserVectorIndexCache
+
+
+def make_index(ids, dim=4):
+    return UserVectorIndex(
+        np.asarray(ids, dtype=np.int64),
+        np.asarray(["2026-10-01"] * len(ids), dtype="U10"),
+        np.ones((len(ids), dim), dtype=np.float32),
+        {"n": len(ids)},
+    )
+
+
+def test_write_during_load_discards_the_loaded_index(monkeypatch):
+    cache = UserVectorIndexCache(budget_mb=16, max_records=100)
+
+    async def scenario():
+        loading = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_load(session, user_id):
+            loading.set()
+            await release.wait()
+            return make_index([1, 2])
+
+        monkeypatch.setattr(cache, "_load", slow_load)
+        task = asyncio.create_task(cache.get(None, 7))
+        await loading.wait()
+        cache.on_upsert(7, 3, "2026-10-02", [1.0, 0.0, 0.0, 0.0])
+        release.set()
+        assert await task is None
+
+        # 下次访问重新加载，得到包含新记录的索引
+        monkeypatch.setattr(cache, "_load", lambda session, user_id: asyncio.sleep(0, make_index([1, 2, 3])))
+        index = await cache.get(None, 7)
+        assert list(index.ids) == [1, 2, 3]
+
+    asyncio.run(scenario())
+    assert cache.stats()["discarded"] == 1
+    assert not cache._load_locks and not cache._loading_writes
+
+
+def test_writes_clear_too_large_flag():
+    cache = UserVectorIndexCache(budget_mb=16, max_records=100)
+    cache._too_large.update({1, 2})
+    cache.on_upsert(1, 10, "2026-10-02", None)
+    cache.on_delete(2, 11)
+    assert not cache._too_large
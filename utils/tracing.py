@@ -0,0 +1,237 @@
+"""请求级追踪与进程内指标
+
+- span：agent 图的每个节点、每次检索尝试各一个，记录墙钟时间、数据库时间、LLM 调用次数与 token 数
+- trace：一次请求内所有 span 的集合，可作为调试字段附加到响应
+- metrics：按 span 聚合的直方图与计数器，以 Prometheus 文本格式导出
+
+当前 trace / span 放在 contextvars 中：LangGraph 并行节点各自在复制了上下文的 task 中运行，
+子 span 互不干扰，同时共享同一个 trace 对象。
+"""
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+@dataclass
+class Span:
+    name: str
+    kind: str
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    parent: Optional["Span"] = None
+    started_at: float = 0.0
+    wall_ms: float = 0.0
+    db_ms: float = 0.0
+    db_queries: int = 0
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            **self.attrs,
+            "wall_ms": round(self.wall_ms, 2),
+            "db_ms": round(self.db_ms, 2),
+            "db_queries": self.db_queries,
+            "llm_calls": self.llm_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+class Trace:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.spans: List[Span] = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        # 合计只统计顶层 span（节点、回答缓存），内层检索 span 的用量已累加到所属节点
+        nodes = [s for s in self.spans if s.parent is None]
+        return {
+            "total_ms": round((time.perf_counter() - self.started_at) * 1000, 2),
+            "db_ms": round(sum(s.db_ms for s in nodes), 2),
+            "llm_calls": sum(s.llm_calls for s in nodes),
+            "prompt_tokens": sum(s.prompt_tokens for s in nodes),
+            "completion_tokens": sum(s.completion_tokens for s in nodes),
+            "spans": [s.to_dict() for s in sorted(self.spans, key=lambda s: s.started_at)],
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(BUCKETS_MS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """按 (kind, name) 聚合的 span 耗时直方图与 LLM 计数器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wall: Dict[Tuple[str, str], _Histogram] = {}
+        self._db: Dict[Tuple[str, str], _Histogram] = {}
+        self._llm_calls: Dict[str, int] = {}
+        self._tokens: Dict[Tuple[str, str], int] = {}
+
+    def observe_span(self, span: Span) -> None:
+        key = (span.kind, span.name)
+        with self._lock:
+            self._wall.setdefault(key, _Histogram()).observe(span.wall_ms)
+            self._db.setdefault(key, _Histogram()).observe(span.db_ms)
+
+    def observe_llm(self, model: str, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            self._llm_calls[model] = self._llm_calls.get(model, 0) + 1
+            for kind, value in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+                self._tokens[(model, kind)] = self._tokens.get((model, kind), 0) + value
+
+    @staticmethod
+    def _render_histogram(lines: List[str], metric: str, histograms: Dict[Tuple[str, str], _Histogram]) -> None:
+        lines.append(f"# TYPE {metric} histogram")
+        for (kind, name), h in sorted(histograms.items()):
+            labels = f'kind="{kind}",span="{name}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS_MS, h.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {h.count}')
+            lines.append(f"{metric}_sum{{{labels}}} {h.sum:.3f}")
+            lines.append(f"{metric}_count{{{labels}}} {h.count}")
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            self._render_histogram(lines, "agent_span_wall_ms", self._wall)
+            self._render_histogram(lines, "agent_span_db_ms", self._db)
+            lines.append("# TYPE llm_calls_total counter")
+            for model, count in sorted(self._llm_calls.items()):
+                lines.append(f'llm_calls_total{{model="{model}"}} {count}')
+            lines.append("# TYPE llm_tokens_total counter")
+            for (model, kind), count in sorted(self._tokens.items()):
+                lines.append(f'llm_tokens_total{{model="{model}",type="{kind}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def start_trace() -> Iterator[Trace]:
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # 流式响应的异步生成器可能在另一个上下文中被关闭
+            pass
+
+
+@contextmanager
+def trace_span(name: str, kind: str = "node", **attrs) -> Iterator[Span]:
+    """记录一个 span；没有活动 trace 时同样计入指标"""
+    span = Span(name=name, kind=kind, attrs=attrs, parent=_current_span.get(), started_at=time.perf_counter())
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(token)
+        span.wall_ms = (time.perf_counter() - span.started_at) * 1000
+        metrics.observe_span(span)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append(span)
+
+
+def traced_node(name: str, fn):
+    """包装 LangGraph 节点；functools.wraps 保留签名，LangGraph 仍能注入 config"""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        with trace_span(name):
+            return await fn(*args, **kwargs)
+    return wrapper
+
+
+def record_db(duration_ms: float) -> None:
+    span = _current_span.get()
+    while span is not None:
+        span.db_ms += duration_ms
+        span.db_queries += 1
+        span = span.parent
+
+
+def record_llm(model: str, prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+    metrics.observe_llm(model, prompt_tokens, completion_tokens)
+    span = _current_span.get()
+    while span is not None:
+        span.llm_calls += 1
+        span.prompt_tokens += prompt_tokens
+        span.completion_tokens += completion_tokens
+        span = span.parent
+
+
+def record_openai_usage(model: str, usage) -> None:
+    """记录 openai SDK 响应中的 usage（AIService 直接调用 SDK，不经过 LangChain 回调）"""
+    record_llm(model, getattr(usage, "prompt_tokens", None) or 0, getattr(usage, "completion_tokens", None) or 0)
+
+
+class LLMTracingCallback(AsyncCallbackHandler):
+    """LangChain 回调：每次 LLM 调用结束时把 token 用量记到当前 span"""
+
+    async def on_llm_end(self, response, **kwargs: Any) -> None:
+        prompt_tokens = completion_tokens = 0
+        model = "unknown"
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+                model = (getattr(message, "response_metadata", None) or {}).get("model_name", model)
+        if not prompt_tokens and not completion_tokens:
+            token_usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = token_usage.get("prompt_tokens", 0)
+            completion_tokens = token_usage.get("completion_tokens", 0)
+            model = (response.llm_output or {}).get("model_name", model)
+        record_llm(model, prompt_tokens, completion_tokens)
+
+
+def instrument_engine(sync_engine) -> None:
+    """在 SQLAlchemy 引擎上注册游标事件，把每条语句的执行时间记到当前 span"""
+    from sqlalchemy import event
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("trace_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("trace_query_start")
+        if starts:
+            record_db((time.perf_counter() - starts.pop()) * 1000)